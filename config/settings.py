@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -45,6 +46,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'crm.instrumentation.RequestMetricsMiddleware',
+    'crm.cache.ChangeTokenMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -86,6 +89,123 @@ DATABASES = {
     }
 }
 
+# Read replica (crm.routers): the list, detail and export pages read from
+# CRM_REPLICA_ALIAS, except for a user who wrote something the replica does
+# not have yet, who reads from the primary to see their own writes.
+# Off unless CRM_REPLICA_PATH names the replica's SQLite file; refresh that
+# file from the primary with `manage.py sync_replica`. Tests use the primary
+# as the replica.
+CRM_REPLICA_PATH = os.environ.get('CRM_REPLICA_PATH')
+DATABASES['replica'] = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': CRM_REPLICA_PATH or DATABASES['default']['NAME'],
+    'TEST': {'MIRROR': 'default'},
+}
+DATABASE_ROUTERS = ['crm.routers.ReplicaRouter']
+CRM_REPLICA_ALIAS = 'replica' if CRM_REPLICA_PATH else None
+# Where sync_replica records the time of its last copy; users who wrote since
+# then read from the primary. None means the replica replicates continuously
+# and a write reaches it within CRM_REPLICA_LAG seconds.
+CRM_REPLICA_SYNCED_PATH = f'{CRM_REPLICA_PATH}.synced' if CRM_REPLICA_PATH else None
+CRM_REPLICA_LAG = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# The per-user aggregate cache in crm/cache.py uses this. Its keys embed the
+# user's change token, which lives in the database, so a per-process cache is
+# never stale; a shared backend (file-based, Memcached, Redis) lets several
+# processes reuse each other's entries.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+CRM_CACHE_TIMEOUT = 300
+
+# SQLite connection tuning (crm.sqlite): PRAGMAs applied to every new
+# connection, and how often (in seconds) persistent connections run
+# PRAGMA optimize. Left at SQLite's defaults here; config.settings_production
+# turns them on.
+CRM_SQLITE_PRAGMAS = {}
+CRM_SQLITE_OPTIMIZE_INTERVAL = None
+
+# Prefix of each user's invoice numbers (crm.numbering) until they pick their
+# own; {user_id} keeps the globally unique numbers of different users apart.
+CRM_INVOICE_NUMBER_PREFIX = 'INV-{user_id}-'
+
+# Admin changelists sized for large tables (crm.admin.PerformanceModeAdmin):
+# estimated page counts, autocomplete foreign-key filters and full-text
+# search. config.settings_production turns it on.
+CRM_ADMIN_PERFORMANCE_MODE = False
+
+# Background jobs (crm.jobs), run by manage.py run_worker in
+# CRM_JOB_CONCURRENCY local processes. A running job's lease lasts
+# CRM_JOB_VISIBILITY_TIMEOUT seconds and is renewed while its worker lives;
+# a failed job is retried up to CRM_JOB_MAX_ATTEMPTS times in all, after
+# CRM_JOB_RETRY_DELAY seconds, doubling with each attempt. Uploads waiting to
+# be imported and finished exports are kept in CRM_JOB_FILES_DIR; the worker
+# deletes exports CRM_JOB_FILE_TTL seconds after they were written.
+CRM_JOB_CONCURRENCY = 2
+CRM_JOB_VISIBILITY_TIMEOUT = 300
+CRM_JOB_MAX_ATTEMPTS = 3
+CRM_JOB_RETRY_DELAY = 30
+CRM_JOB_FILES_DIR = BASE_DIR / 'job_files'
+CRM_JOB_FILE_TTL = 24 * 60 * 60
+
+# Serve the list and detail pages from crm.async_views. Turn on when running
+# under ASGI (config.asgi); under WSGI every async view pays for its own event loop.
+CRM_ASYNC_VIEWS = False
+
+# Request metrics (crm.instrumentation): samples kept per URL name for /stats/,
+# and the most SQL queries each URL name may run per request, session and
+# user lookups included. Over-budget requests are logged, or raise when
+# CRM_QUERY_BUDGETS_STRICT is set, as the test suite does. Budgets cover the
+# POST as well as the GET; client and project deletes cascade, so their cost
+# grows with the data and they have none. Search loads each kind of hit with
+# its own query, so it allows for all four. An invoice create left unnumbered
+# takes its number in a transaction of its own, creating the user's sequence
+# row the first time; an invoice update that moves it to another month or
+# owner marks the snapshot it left stale (crm.snapshots). Cached and
+# conditional pages read the user's change token (crm.cache) once per
+# request, and writes replace it.
+CRM_METRICS_WINDOW = 500
+CRM_QUERY_BUDGETS = {
+    'home': 8,
+    'search': 7,
+    'reports': 6,
+    'client-list': 4,
+    'client-detail': 4,
+    'client-projects': 5,
+    'client-invoices': 5,
+    'client-contact-logs': 5,
+    'client-create': 10,
+    'client-update': 6,
+    'project-list': 4,
+    'project-detail': 5,
+    'project-create': 9,
+    'project-update': 10,
+    'project-bulk': 14,
+    'invoice-list': 4,
+    'invoice-detail': 4,
+    'invoice-create': 16,
+    'invoice-update': 14,
+    'invoice-delete': 7,
+    'invoice-bulk': 10,
+    'contactlog-create': 11,
+    'job-list': 3,
+    'job-download': 3,
+    'api-list': 4,
+    'api-detail': 4,
+    'api-search': 7,
+}
+if CRM_ASYNC_VIEWS:
+    # The async client detail renders the first page of its three sections inline.
+    CRM_QUERY_BUDGETS['client-detail'] += 3
+CRM_QUERY_BUDGETS_STRICT = False
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -131,5 +251,5 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_URL = 'login'
-LOGIN_REDIRECT_URL = 'client-list'
+LOGIN_REDIRECT_URL = 'home'
 LOGOUT_REDIRECT_URL = 'login'
@@ -1,7 +1,14 @@
 from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin.views.main import PAGE_VAR
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.db.models import Q
+from django.db.models.constants import LOOKUP_SEP
 
-from .models import Client, ContactLog, Invoice, Project
+from . import search
+from .bulk import INVOICE_ACTIONS, PROJECT_ACTIONS, delete_invoices, delete_projects
+from .models import Client, ContactLog, Invoice, InvoiceSequence, Job, Project
+from .pagination import EstimatedCountPaginator
 
 
 admin.site.site_header = f"Freelancer CRM — {settings.PROJECT_AUTHOR}"
@@ -9,36 +16,205 @@ admin.site.site_title = f"Freelancer CRM | {settings.PROJECT_AUTHOR}"
 admin.site.index_title = f"Created by {settings.PROJECT_AUTHOR} — {settings.PROJECT_SITE_URL}"
 
 
+def bulk_admin_actions(actions, noun):
+    """
+    Admin actions wrapping the set-based ``crm.bulk`` actions, except delete:
+    ``delete_selected`` keeps its confirmation page and reaches the set-based
+    delete through ``delete_queryset``.
+    """
+
+    def make(bulk_action):
+        def apply(modeladmin, request, queryset):
+            count = bulk_action.apply(queryset)
+            modeladmin.message_user(request, bulk_action.message.format(count=count))
+
+        apply.__name__ = f"bulk_{bulk_action.name.replace('-', '_')}"
+        return admin.action(description=f"{bulk_action.label} — selected {noun}")(apply)
+
+    return [make(action) for name, action in actions.items() if name != "delete"]
+
+
+def performance_mode():
+    return getattr(settings, "CRM_ADMIN_PERFORMANCE_MODE", False)
+
+
+class AutocompleteListFilter(admin.FieldListFilter):
+    """
+    Filter on a foreign key through the admin's autocomplete widget, which
+    looks up matching rows as you type, instead of a link for every row of
+    the related table.
+    """
+
+    template = "admin/crm/autocomplete_filter.html"
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = f"{field_path}__{field.target_field.name}__exact"
+        self.lookup_val = params.get(self.lookup_kwarg)
+        super().__init__(field, request, params, model, model_admin, field_path)
+        form_field = field.formfield(
+            widget=AutocompleteSelect(field, model_admin.admin_site), required=False
+        )
+        self.widget = form_field.widget.render(self.lookup_kwarg, self.lookup_val)
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def choices(self, changelist):
+        yield {
+            "hidden": [
+                (name, value)
+                for name, value in changelist.params.items()
+                if name not in (self.lookup_kwarg, PAGE_VAR)
+            ],
+            "reset_query_string": changelist.get_query_string(remove=[self.lookup_kwarg]),
+        }
+
+
+class PerformanceModeAdmin(admin.ModelAdmin):
+    """
+    With ``CRM_ADMIN_PERFORMANCE_MODE`` on, changelists avoid the work that
+    grows with the table:
+
+    - page counts of unfiltered lists come from the database statistics, and
+      the "N total" count is not run at all;
+    - foreign-key filters such as ``user`` use autocomplete instead of
+      listing every related row;
+    - the default order is ``-pk``, which needs no sort;
+    - searches go through the ``crm.search`` full-text index when it is
+      available: ``search_index`` maps a ``crm.search`` kind to the field
+      holding its ids, ``"pk"`` for the model's own kind, which is matched
+      on title and body; related kinds are matched on title only. Unlike
+      ``search_fields``, every word has to match the same indexed row, and
+      words match as prefixes rather than substrings.
+    """
+
+    search_index = {}
+
+    @property
+    def show_full_result_count(self):
+        return not performance_mode()
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        if not performance_mode():
+            return super().get_paginator(
+                request, queryset, per_page, orphans, allow_empty_first_page
+            )
+        return EstimatedCountPaginator(queryset, per_page, orphans, allow_empty_first_page)
+
+    def get_list_filter(self, request):
+        list_filter = super().get_list_filter(request)
+        if not performance_mode():
+            return list_filter
+        return [
+            (name, AutocompleteListFilter) if self._foreign_key(name) else name
+            for name in list_filter
+        ]
+
+    def get_ordering(self, request):
+        ordering = super().get_ordering(request)
+        if performance_mode():
+            return ordering or ["-pk"]
+        return ordering
+
+    def get_search_results(self, request, queryset, search_term):
+        if not (performance_mode() and self.search_index and search.enabled()):
+            return super().get_search_results(request, queryset, search_term)
+        condition = Q()
+        for kind, field in self.search_index.items():
+            columns = ("title", "body") if field == "pk" else ("title",)
+            ids = search.matching_ids(kind, search_term, columns)
+            if ids is None:
+                return queryset, False
+            condition |= Q(**{f"{field}__in": ids})
+        return queryset.filter(condition), False
+
+    @property
+    def media(self):
+        media = super().media
+        if performance_mode():
+            for name in self.list_filter:
+                field = self._foreign_key(name)
+                if field is not None:
+                    media += AutocompleteSelect(field, self.admin_site).media
+        return media
+
+    def _foreign_key(self, list_filter_item):
+        if isinstance(list_filter_item, str) and LOOKUP_SEP not in list_filter_item:
+            field = self.model._meta.get_field(list_filter_item)
+            if field.many_to_one:
+                return field
+        return None
+
+
 @admin.register(Client)
-class ClientAdmin(admin.ModelAdmin):
+class ClientAdmin(PerformanceModeAdmin):
     list_display = ("name", "email", "phone", "company", "user")
     search_fields = ("name", "email", "company", "phone")
     list_filter = ("user",)
     readonly_fields = ("created_at",)
+    list_select_related = ("user",)
+    search_index = {"client": "pk"}
 
 
 @admin.register(Project)
-class ProjectAdmin(admin.ModelAdmin):
+class ProjectAdmin(PerformanceModeAdmin):
     list_display = ("name", "client", "status", "amount", "start_date", "end_date", "user")
     list_filter = ("status", "user")
     search_fields = ("name", "client__name")
     readonly_fields = ("created_at",)
-    list_select_related = ("client",)
+    list_select_related = ("client", "user")
+    search_index = {"project": "pk", "client": "client"}
+    actions = bulk_admin_actions(PROJECT_ACTIONS, "projects")
+
+    def delete_queryset(self, request, queryset):
+        delete_projects(queryset)
 
 
 @admin.register(Invoice)
-class InvoiceAdmin(admin.ModelAdmin):
+class InvoiceAdmin(PerformanceModeAdmin):
     list_display = ("number", "project", "amount", "payment_status", "issue_date", "due_date")
     list_filter = ("payment_status",)
     search_fields = ("number", "project__name", "project__client__name")
     list_select_related = ("project", "project__client")
+    search_index = {"invoice": "pk", "project": "project", "client": "project__client"}
     readonly_fields = ("created_at",)
+    actions = bulk_admin_actions(INVOICE_ACTIONS, "invoices")
+
+    def delete_queryset(self, request, queryset):
+        delete_invoices(queryset)
+
+
+@admin.register(InvoiceSequence)
+class InvoiceSequenceAdmin(admin.ModelAdmin):
+    list_display = ("user", "prefix", "number_format", "last_number")
+    search_fields = ("user__username", "prefix")
+    list_select_related = ("user",)
+    # Moved only by crm.numbering, inside the transactions that use it.
+    readonly_fields = ("last_number",)
 
 
 @admin.register(ContactLog)
-class ContactLogAdmin(admin.ModelAdmin):
+class ContactLogAdmin(PerformanceModeAdmin):
     list_display = ("client", "project", "contact_type", "contacted_at", "user")
     list_filter = ("contact_type", "user")
     search_fields = ("client__name", "project__name", "notes")
     date_hierarchy = "contacted_at"
-    list_select_related = ("client", "project")
+    list_select_related = ("client", "project__client", "user")
+    search_index = {"contact_log": "pk", "client": "client", "project": "project"}
+
+
+@admin.register(Job)
+class JobAdmin(PerformanceModeAdmin):
+    list_display = ("kind", "user", "status", "attempts", "run_after", "created_at", "finished_at")
+    list_filter = ("status", "kind", "user")
+    list_select_related = ("user",)
+    # Moved only by the worker (crm.jobs), under its lease.
+    readonly_fields = (
+        "attempts",
+        "locked_until",
+        "progress",
+        "result",
+        "created_at",
+        "started_at",
+        "finished_at",
+    )
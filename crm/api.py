@@ -0,0 +1,185 @@
+"""
+Read-only JSON API over the user's CRM data.
+
+Rows are read with ``values()`` so no model instances are built, ``fields=``
+narrows the selected columns, lists use the same keyset cursors and filters as
+the HTML views, and every response carries validators derived from the user's
+change token.
+"""
+
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import Http404, JsonResponse
+from django.views.generic import View
+
+from . import search
+from .conditional import ConditionalGetMixin
+from .filters import filter_clients, filter_contact_logs, filter_invoices, filter_projects
+from .models import Client, ContactLog, Invoice, Project
+from .pagination import decode_cursor, encode_cursor, keyset_filter
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+class Resource:
+    def __init__(self, model, fields, filter_func, ordering):
+        self.model = model
+        self.fields = fields
+        self.filter_func = filter_func
+        self.ordering = ordering
+
+    def queryset(self, user):
+        return self.model.objects.filter(user=user)
+
+
+RESOURCES = {
+    "clients": Resource(
+        Client,
+        ["id", "name", "email", "phone", "company", "notes", "created_at"],
+        filter_clients,
+        ["name", "id"],
+    ),
+    "projects": Resource(
+        Project,
+        [
+            "id",
+            "client_id",
+            "name",
+            "description",
+            "status",
+            "amount",
+            "start_date",
+            "end_date",
+            "created_at",
+        ],
+        filter_projects,
+        ["-created_at", "-id"],
+    ),
+    "invoices": Resource(
+        Invoice,
+        [
+            "id",
+            "number",
+            "project_id",
+            "amount",
+            "payment_status",
+            "issue_date",
+            "due_date",
+            "created_at",
+        ],
+        filter_invoices,
+        ["-issue_date", "-id"],
+    ),
+    "contact_logs": Resource(
+        ContactLog,
+        ["id", "client_id", "project_id", "contact_type", "notes", "contacted_at"],
+        filter_contact_logs,
+        ["-contacted_at", "-id"],
+    ),
+}
+
+
+def error(message, status=400):
+    return JsonResponse({"error": message}, status=status)
+
+
+class ApiView(LoginRequiredMixin, ConditionalGetMixin, View):
+    raise_exception = True
+    http_method_names = ["get", "head", "options"]
+
+    def get_resource(self):
+        """
+        The resource named in the URL, or ``None`` if there is no such resource.
+        """
+        return RESOURCES.get(self.kwargs["resource"])
+
+    def get_fields(self, resource):
+        """
+        The requested ``fields=`` subset, or ``None`` if it names an unknown field.
+        """
+        requested = self.request.GET.get("fields")
+        if not requested:
+            return resource.fields
+        fields = [field.strip() for field in requested.split(",") if field.strip()]
+        if any(field not in resource.fields for field in fields):
+            return None
+        return fields
+
+
+class ApiListView(ApiView):
+    def get(self, request, resource):
+        resource = self.get_resource()
+        if resource is None:
+            return error("Unknown resource.", status=404)
+        fields = self.get_fields(resource)
+        if fields is None:
+            return error(f"Unknown field. Choose from: {', '.join(resource.fields)}.")
+        try:
+            limit = min(int(request.GET.get("limit", DEFAULT_LIMIT)), MAX_LIMIT)
+        except ValueError:
+            return error("limit must be an integer.")
+        if limit < 1:
+            return error("limit must be positive.")
+
+        ordering = resource.ordering
+        keys = [term.lstrip("-") for term in ordering]
+        queryset = resource.filter_func(resource.queryset(request.user), request.GET)
+        after = request.GET.get("after")
+        if after:
+            opts = resource.model._meta
+            try:
+                values = decode_cursor(after, [opts.get_field(key) for key in keys])
+            except Http404:
+                return error("Invalid page cursor.")
+            queryset = queryset.filter(keyset_filter(ordering, values))
+        selected = list(dict.fromkeys([*fields, *keys]))
+        rows = list(queryset.order_by(*ordering).values(*selected)[: limit + 1])
+
+        next_url = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            params = request.GET.copy()
+            params["after"] = encode_cursor([rows[-1][key] for key in keys])
+            next_url = request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
+        results = [{field: row[field] for field in fields} for row in rows]
+        return JsonResponse({"results": results, "next": next_url})
+
+
+class ApiDetailView(ApiView):
+    def get(self, request, resource, pk):
+        resource = self.get_resource()
+        if resource is None:
+            return error("Unknown resource.", status=404)
+        fields = self.get_fields(resource)
+        if fields is None:
+            return error(f"Unknown field. Choose from: {', '.join(resource.fields)}.")
+        row = resource.queryset(request.user).filter(pk=pk).values(*fields).first()
+        if row is None:
+            return error("No such object.", status=404)
+        return JsonResponse(row)
+
+
+class ApiSearchView(ApiView):
+    def get(self, request):
+        query = request.GET.get("q", "").strip()
+        if not query:
+            return error("q is required.")
+        try:
+            limit = min(int(request.GET.get("limit", search.DEFAULT_LIMIT)), MAX_LIMIT)
+        except ValueError:
+            return error("limit must be an integer.")
+        if limit < 1:
+            return error("limit must be positive.")
+        kind = request.GET.get("kind")
+        hits = search.search(request.user, query, kinds=[kind] if kind else None, limit=limit)
+        results = [
+            {
+                "kind": hit.kind,
+                "id": hit.object.pk,
+                "title": hit.title,
+                "snippet": hit.snippet,
+                "url": request.build_absolute_uri(hit.url),
+            }
+            for hit in hits
+        ]
+        return JsonResponse({"results": results})
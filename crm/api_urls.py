@@ -0,0 +1,9 @@
+from django.urls import path
+
+from . import api
+
+urlpatterns = [
+    path("search/", api.ApiSearchView.as_view(), name="api-search"),
+    path("<str:resource>/", api.ApiListView.as_view(), name="api-list"),
+    path("<str:resource>/<int:pk>/", api.ApiDetailView.as_view(), name="api-detail"),
+]
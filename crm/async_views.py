@@ -0,0 +1,230 @@
+"""
+Async-native versions of the list and detail pages, for ASGI deployments.
+
+``crm.urls`` serves these instead of their sync counterparts in ``crm.views``
+when ``CRM_ASYNC_VIEWS`` is on. Single-object lookups and list pages use the
+async ORM. Django 4.2 runs every async ORM call on the request's one sync
+thread, though, so gathering them would not overlap any work; the client
+detail sections therefore each run on a worker thread with its own database
+connection, and the page waits for the slowest section rather than the sum.
+"""
+
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.db import close_old_connections
+from django.db.models.functions import Coalesce
+from django.http import Http404
+from django.template.response import TemplateResponse
+from django.urls import reverse
+from django.views.generic import View
+
+from .bulk import INVOICE_ACTIONS, PROJECT_ACTIONS
+from .cache import acached_for_user
+from .conditional import ConditionalGetMixin
+from .filters import filter_clients, filter_invoices, filter_projects
+from .models import Client, Invoice, Project
+from .pagination import KeysetPaginationMixin
+from .routers import ReplicaReadMixin
+from .views import ClientContactLogsView, ClientInvoicesView, ClientProjectsView
+
+
+async def authenticated_user(request):
+    """
+    Resolve ``request.user`` off the event loop; ``None`` when anonymous.
+    """
+
+    def load():
+        return request.user if request.user.is_authenticated else None
+
+    return await sync_to_async(load)()
+
+
+def in_worker_thread(func):
+    """
+    Wrap ``func`` to run on its own worker thread, releasing that thread's
+    connection afterwards according to ``CONN_MAX_AGE``.
+    """
+
+    def run(*args):
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(run, thread_sensitive=False)
+
+
+async def aget_or_404(queryset, **lookup):
+    try:
+        return await queryset.aget(**lookup)
+    except queryset.model.DoesNotExist:
+        raise Http404(f"No {queryset.model._meta.verbose_name} found matching the query.")
+
+
+class AsyncPageView(ConditionalGetMixin, ReplicaReadMixin, View):
+    template_name = None
+
+    async def get(self, request, *args, **kwargs):
+        user = await authenticated_user(request)
+        if user is None:
+            return redirect_to_login(request.get_full_path())
+        context = await self.get_context(user, **kwargs)
+        return TemplateResponse(request, self.template_name, {"view": self, **context})
+
+    async def get_context(self, user, **kwargs):
+        raise NotImplementedError
+
+
+class AsyncKeysetListView(KeysetPaginationMixin, AsyncPageView):
+    context_object_name = None
+
+    def get_queryset(self, user):
+        raise NotImplementedError
+
+    def get_extra_context(self):
+        return {}
+
+    async def paginate(self, user, queryset):
+        return await self.apaginate_queryset(queryset, self.paginate_by)
+
+    async def get_context(self, user, **kwargs):
+        _, page, rows, is_paginated = await self.paginate(user, self.get_queryset(user))
+        return {
+            self.context_object_name: rows,
+            "object_list": rows,
+            "page_obj": page,
+            "is_paginated": is_paginated,
+            **self.get_extra_context(),
+        }
+
+
+class AsyncClientListView(AsyncKeysetListView):
+    template_name = "crm/client_list.html"
+    context_object_name = "clients"
+    keyset_ordering = ("name", "pk")
+
+    def get_queryset(self, user):
+        queryset = filter_clients(Client.objects.filter(user=user), self.request.GET)
+        return queryset.annotate(
+            project_count=Coalesce("summary__project_count", 0),
+            invoice_count=Coalesce("summary__invoice_count", 0),
+        )
+
+    async def paginate(self, user, queryset):
+        # Shares its cache entries with the sync ClientListView.
+        return await acached_for_user(
+            user.pk,
+            "client-list",
+            lambda: self.apaginate_queryset(queryset, self.paginate_by),
+            self.request.GET.urlencode(),
+            self.paginate_by,
+        )
+
+    def get_extra_context(self):
+        return {
+            "statuses": Project.Status.choices,
+            "query_params": {
+                "q": self.request.GET.get("q", ""),
+                "email": self.request.GET.get("email", ""),
+                "status": self.request.GET.get("status", ""),
+            },
+        }
+
+
+class AsyncProjectListView(AsyncKeysetListView):
+    template_name = "crm/project_list.html"
+    context_object_name = "projects"
+    keyset_ordering = ("-created_at", "-pk")
+
+    def get_queryset(self, user):
+        queryset = Project.objects.filter(user=user).select_related("client")
+        return filter_projects(queryset, self.request.GET)
+
+    def get_extra_context(self):
+        return {
+            "statuses": Project.Status.choices,
+            "selected_status": self.request.GET.get("status", ""),
+            "bulk_actions": PROJECT_ACTIONS.values(),
+        }
+
+
+class AsyncInvoiceListView(AsyncKeysetListView):
+    template_name = "crm/invoice_list.html"
+    context_object_name = "invoices"
+    keyset_ordering = ("-issue_date", "-pk")
+
+    def get_queryset(self, user):
+        queryset = Invoice.objects.filter(user=user).select_related("project", "project__client")
+        return filter_invoices(queryset, self.request.GET)
+
+    def get_extra_context(self):
+        return {
+            "payment_statuses": Invoice.PaymentStatus.choices,
+            "selected_status": self.request.GET.get("payment_status", ""),
+            "bulk_actions": INVOICE_ACTIONS.values(),
+        }
+
+
+class AsyncClientDetailView(AsyncPageView):
+    """
+    The client header plus the first page of each section, rendered inline.
+    """
+
+    template_name = "crm/client_detail.html"
+    sections = {
+        "projects": ClientProjectsView,
+        "invoices": ClientInvoicesView,
+        "contact_logs": ClientContactLogsView,
+    }
+
+    def load_section(self, view_class, pk):
+        view = view_class()
+        view.setup(self.request, pk=pk)
+        _, page, rows, is_paginated = view.paginate_queryset(
+            view.get_queryset(), view.paginate_by
+        )
+        return {
+            "object_list": rows,
+            "page_obj": page,
+            "is_paginated": is_paginated,
+            # Pages after the first come from the section's own view.
+            "url": reverse(view_class.url_name, args=[pk]),
+        }
+
+    async def get_context(self, user, pk):
+        client, *sections = await asyncio.gather(
+            aget_or_404(Client.objects.filter(user=user).select_related("summary"), pk=pk),
+            *(
+                in_worker_thread(self.load_section)(view_class, pk)
+                for view_class in self.sections.values()
+            ),
+        )
+        return {
+            "client": client,
+            "object": client,
+            "sections": dict(zip(self.sections, sections)),
+        }
+
+
+class AsyncProjectDetailView(AsyncPageView):
+    template_name = "crm/project_detail.html"
+
+    async def get_context(self, user, pk):
+        project, invoices = await asyncio.gather(
+            aget_or_404(Project.objects.filter(user=user).select_related("client"), pk=pk),
+            in_worker_thread(list)(Invoice.objects.filter(user=user, project_id=pk)),
+        )
+        return {"project": project, "object": project, "invoices": invoices}
+
+
+class AsyncInvoiceDetailView(AsyncPageView):
+    template_name = "crm/invoice_detail.html"
+
+    async def get_context(self, user, pk):
+        invoice = await aget_or_404(
+            Invoice.objects.filter(user=user).select_related("project", "project__client"),
+            pk=pk,
+        )
+        return {"invoice": invoice, "object": invoice}
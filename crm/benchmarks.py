@@ -0,0 +1,421 @@
+"""
+Synthetic data and a timing harness for every CRM view.
+
+``seed`` fills the database with skewed data: account sizes fall off with a
+power law, so the first ("whale") user has ``max_invoices`` invoices and a
+long contact history while most users are small. ``run`` requests every
+named URL in ``crm.urls`` as the whale and as a typical user, plus the admin
+changelists as a superuser, and records query counts, latency percentiles
+and peak Python memory. ``compare`` flags results that got slower or
+started running more queries than a stored baseline. ``load_test`` drives a
+mix of page views and writes from concurrent sessions and reports the
+throughput, which is what the database and connection settings change.
+"""
+
+import random
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.test import Client as TestClient
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.utils import timezone
+
+from . import search, snapshots
+from .cache import touch_user
+from .instrumentation import percentile
+from .models import Client, ContactLog, Invoice, Project
+from .summaries import create_client_summaries
+
+USER_PREFIX = "bench-user-"
+ADMIN_USERNAME = "bench-admin"
+BATCH_SIZE = 5000
+# URL names that are not timed: the request stats are staff-only diagnostics
+# about the process running the benchmark, the bulk actions are POST-only
+# writes (covered by the query budgets instead), and job downloads serve a
+# file written by the worker.
+SKIPPED_URLS = {"request-stats", "invoice-bulk", "project-bulk", "job-download"}
+
+PAYMENT_WEIGHTS = {
+    Invoice.PaymentStatus.PAID: 60,
+    Invoice.PaymentStatus.PENDING: 25,
+    Invoice.PaymentStatus.OVERDUE: 10,
+    Invoice.PaymentStatus.CANCELLED: 5,
+}
+COMPANY_SUFFIXES = ["Ltd", "LLC", "GmbH", "Inc"]
+WORDS = (
+    "call follow up invoice proposal scope budget meeting design launch review "
+    "contract renewal feedback deadline estimate kickoff milestone payment"
+).split()
+
+
+def account_sizes(users, max_invoices, skew=1.1, minimum=5):
+    """
+    Invoice counts per user, largest first: user ``n`` gets ``max / n**skew``.
+    """
+    return [max(minimum, int(max_invoices / rank**skew)) for rank in range(1, users + 1)]
+
+
+def _sentence(rng, words=8):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _moment(today, rng):
+    day = today - timedelta(days=rng.randrange(0, 5 * 365))
+    moment = datetime.combine(day, datetime.min.time()) + timedelta(minutes=rng.randrange(1440))
+    return timezone.make_aware(moment) if settings.USE_TZ else moment
+
+
+def _bulk_create(model, objects):
+    return model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+
+
+def seed_user(user, invoices, rng, today, contact_ratio=0.3):
+    """
+    Create clients, projects, invoices and contact logs for ``user`` with
+    roughly ``invoices`` invoices.
+    """
+    client_count = max(1, invoices // 40)
+    clients = _bulk_create(
+        Client,
+        [
+            Client(
+                user=user,
+                name=f"Client {index:05}",
+                email=f"{user.username}-{index}@example.com",
+                company=f"{rng.choice(WORDS).title()} {rng.choice(COMPANY_SUFFIXES)}",
+                notes=_sentence(rng),
+            )
+            for index in range(client_count)
+        ],
+    )
+    statuses = list(Project.Status.values)
+    projects = _bulk_create(
+        Project,
+        [
+            Project(
+                user=user,
+                client=client,
+                name=f"{rng.choice(WORDS).title()} project {index}",
+                description=_sentence(rng, 12),
+                status=rng.choice(statuses),
+                amount=Decimal(rng.randrange(500, 50000)),
+                start_date=today - timedelta(days=rng.randrange(0, 5 * 365)),
+            )
+            for client in clients
+            for index in range(rng.randint(1, 5))
+        ],
+    )
+
+    payment_statuses, weights = zip(*PAYMENT_WEIGHTS.items())
+    invoice_objects = []
+    for number in range(invoices):
+        project = rng.choice(projects)
+        issued = today - timedelta(days=rng.randrange(0, 5 * 365))
+        invoice_objects.append(
+            Invoice(
+                user=user,
+                project=project,
+                number=f"{user.username}-{number:06}",
+                amount=Decimal(rng.randrange(100, 20000)),
+                payment_status=rng.choices(payment_statuses, weights)[0],
+                issue_date=issued,
+                due_date=issued + timedelta(days=30),
+            )
+        )
+    _bulk_create(Invoice, invoice_objects)
+
+    contact_types = list(ContactLog.ContactType.values)
+    _bulk_create(
+        ContactLog,
+        [
+            ContactLog(
+                user=user,
+                client=rng.choice(clients),
+                contact_type=rng.choice(contact_types),
+                notes=_sentence(rng, 16),
+                contacted_at=_moment(today, rng),
+            )
+            for _ in range(int(invoices * contact_ratio))
+        ],
+    )
+    create_client_summaries(clients)
+    touch_user(user.pk)
+    return {
+        "clients": len(clients),
+        "projects": len(projects),
+        "invoices": invoices,
+        "contact_logs": int(invoices * contact_ratio),
+    }
+
+
+def seed(users=50, max_invoices=100_000, seed_value=0, today=None, stdout=None):
+    """
+    Create ``users`` benchmark users plus a superuser and return per-user counts.
+    """
+    rng = random.Random(seed_value)
+    today = today or date.today()
+    User = get_user_model()
+    totals = {}
+    for rank, invoices in enumerate(account_sizes(users, max_invoices), start=1):
+        with transaction.atomic():
+            user = User.objects.create_user(username=f"{USER_PREFIX}{rank:03}")
+            totals[user.username] = seed_user(user, invoices, rng, today)
+        if stdout:
+            stdout.write(f"{user.username}: {totals[user.username]}")
+    if not User.objects.filter(username=ADMIN_USERNAME).exists():
+        User.objects.create_superuser(ADMIN_USERNAME, f"{ADMIN_USERNAME}@example.com", None)
+    search.rebuild()
+    snapshots.refresh_snapshots(as_of=today, full=True)
+    return totals
+
+
+def _named_patterns(resolver):
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver):
+            yield from _named_patterns(pattern)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            yield pattern.name
+
+
+def crm_url_names():
+    return set(_named_patterns(get_resolver("crm.urls"))) - SKIPPED_URLS
+
+
+def url_cases(user):
+    """
+    ``{label: url}`` for every CRM page, using a sample of ``user``'s rows.
+    """
+    client_obj = Client.objects.filter(user=user).order_by("pk").first()
+    project = Project.objects.filter(user=user).order_by("pk").first()
+    invoice = Invoice.objects.filter(user=user).order_by("pk").first()
+    cases = {
+        "home": reverse("home"),
+        "reports": reverse("reports"),
+        "search": reverse("search") + "?q=invoice+budget",
+        "import": reverse("import"),
+        "job-list": reverse("job-list"),
+        "client-list": reverse("client-list"),
+        "client-create": reverse("client-create"),
+        "client-detail": reverse("client-detail", args=[client_obj.pk]),
+        "client-projects": reverse("client-projects", args=[client_obj.pk]),
+        "client-invoices": reverse("client-invoices", args=[client_obj.pk]),
+        "client-contact-logs": reverse("client-contact-logs", args=[client_obj.pk]),
+        "client-update": reverse("client-update", args=[client_obj.pk]),
+        "client-delete": reverse("client-delete", args=[client_obj.pk]),
+        "contactlog-create": reverse("contactlog-create", args=[client_obj.pk]),
+        "project-list": reverse("project-list"),
+        "project-create": reverse("project-create"),
+        "project-detail": reverse("project-detail", args=[project.pk]),
+        "project-update": reverse("project-update", args=[project.pk]),
+        "project-delete": reverse("project-delete", args=[project.pk]),
+        "invoice-list": reverse("invoice-list"),
+        "invoice-list?paid": reverse("invoice-list") + "?payment_status=paid",
+        "invoice-create": reverse("invoice-create"),
+        "invoice-detail": reverse("invoice-detail", args=[invoice.pk]),
+        "invoice-update": reverse("invoice-update", args=[invoice.pk]),
+        "invoice-delete": reverse("invoice-delete", args=[invoice.pk]),
+        "export": reverse("export", args=["invoices"]),
+        "api-list": reverse("api-list", args=["invoices"]),
+        "api-detail": reverse("api-detail", args=["invoices", invoice.pk]),
+        "api-search": reverse("api-search") + "?q=budget",
+    }
+    return cases
+
+
+def admin_cases():
+    return {
+        f"admin:{model._meta.model_name}": reverse(
+            f"admin:{model._meta.app_label}_{model._meta.model_name}_changelist"
+        )
+        for model in admin.site._registry
+        if model._meta.app_label == "crm"
+    }
+
+
+def _client_for(user):
+    host = next((host for host in settings.ALLOWED_HOSTS if "*" not in host), "localhost")
+    client = TestClient(HTTP_HOST=host.lstrip("."))
+    client.force_login(user)
+    return client
+
+
+def _request(client, url, warm_cache):
+    if not warm_cache:
+        cache.clear()
+    start = time.perf_counter()
+    response = client.get(url)
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    elapsed = (time.perf_counter() - start) * 1000
+    metrics = getattr(response.wsgi_request, "crm_metrics", None)
+    return response.status_code, elapsed, metrics.queries if metrics else None
+
+
+def measure(client, url, iterations=10, warm_cache=False):
+    status, _, queries = _request(client, url, warm_cache)  # warm-up
+    timings = sorted(_request(client, url, warm_cache)[1] for _ in range(iterations))
+    tracemalloc.start()
+    try:
+        _request(client, url, warm_cache)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        "url": url,
+        "status": status,
+        "queries": queries,
+        "p50_ms": round(percentile(timings, 50), 2),
+        "p95_ms": round(percentile(timings, 95), 2),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def run(iterations=10, warm_cache=False, stdout=None):
+    """
+    Time every case and return a JSON-serialisable report.
+    """
+    User = get_user_model()
+    bench_users = list(User.objects.filter(username__startswith=USER_PREFIX).order_by("username"))
+    if not bench_users:
+        raise ValueError("No benchmark users; run seed_benchmark first.")
+    profiles = {"whale": bench_users[0], "typical": bench_users[len(bench_users) // 2]}
+
+    results = {}
+    covered = set()
+    for profile, user in profiles.items():
+        client = _client_for(user)
+        for label, url in url_cases(user).items():
+            covered.add(label.split("?")[0])
+            results[f"{profile}/{label}"] = measure(client, url, iterations, warm_cache)
+            if stdout:
+                stdout.write(f"{profile}/{label}: {results[f'{profile}/{label}']}")
+    admin_user = User.objects.filter(username=ADMIN_USERNAME).first()
+    if admin_user:
+        client = _client_for(admin_user)
+        for label, url in admin_cases().items():
+            results[label] = measure(client, url, iterations, warm_cache)
+            if stdout:
+                stdout.write(f"{label}: {results[label]}")
+    return {
+        "meta": {
+            "iterations": iterations,
+            "warm_cache": warm_cache,
+            "users": {profile: user.username for profile, user in profiles.items()},
+            "invoices": {
+                profile: Invoice.objects.filter(user=user).count()
+                for profile, user in profiles.items()
+            },
+            "uncovered_urls": sorted(crm_url_names() - covered),
+        },
+        "results": results,
+    }
+
+
+def compare(report, baseline, tolerance=0.2, floor_ms=1.0):
+    """
+    List the cases that regressed against ``baseline``: more queries, or a
+    p95 more than ``tolerance`` (and ``floor_ms``) slower.
+    """
+    regressions = []
+    for name, result in report["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if before is None:
+            continue
+        if (result["queries"] or 0) > (before["queries"] or 0):
+            regressions.append(f"{name}: {before['queries']} -> {result['queries']} queries")
+        slower = result["p95_ms"] - before["p95_ms"]
+        if slower > floor_ms and result["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['p95_ms']} -> {result['p95_ms']} ms")
+    return regressions
+
+
+READ_CASES = ("home", "client-list", "client-detail", "project-list", "invoice-list", "invoice-detail")
+
+
+def _load_worker(user, deadline, write_ratio, rng, timings, errors):
+    client = _client_for(user)
+    cases = url_cases(user)
+    reads = [cases[label] for label in READ_CASES]
+    client_pk = Client.objects.filter(user=user).order_by("pk").values_list("pk", flat=True)[0]
+    write_url = reverse("contactlog-create", args=[client_pk])
+    try:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                if rng.random() < write_ratio:
+                    response = client.post(
+                        write_url,
+                        {
+                            "client": client_pk,
+                            "contact_type": ContactLog.ContactType.EMAIL,
+                            "notes": _sentence(rng),
+                            "contacted_at": "2024-01-01T09:00",
+                        },
+                    )
+                else:
+                    response = client.get(rng.choice(reads))
+            except Exception as error:  # Counted and reported, e.g. "database is locked".
+                errors[f"{type(error).__name__}: {error}"] += 1
+                continue
+            if response.status_code >= 400:
+                errors[f"HTTP {response.status_code}"] += 1
+            else:
+                timings.append((time.perf_counter() - start) * 1000)
+    finally:
+        connections.close_all()
+
+
+def load_test(threads=8, duration=10.0, write_ratio=0.1, seed_value=0):
+    """
+    Run ``threads`` concurrent sessions, each a different benchmark user,
+    for ``duration`` seconds. Each request is a page view or, with
+    probability ``write_ratio``, a new contact log. Returns the throughput,
+    latency percentiles and errors by message.
+    """
+    bench_users = list(
+        get_user_model().objects.filter(username__startswith=USER_PREFIX).order_by("username")
+    )
+    if not bench_users:
+        raise ValueError("No benchmark users; run seed_benchmark first.")
+    connections.close_all()  # Each worker opens its own, under the settings being tested.
+    timings, errors = [], Counter()
+    deadline = time.perf_counter() + duration
+    workers = [
+        threading.Thread(
+            target=_load_worker,
+            args=(
+                bench_users[index % len(bench_users)],
+                deadline,
+                write_ratio,
+                random.Random(seed_value + index),
+                timings,
+                errors,
+            ),
+        )
+        for index in range(threads)
+    ]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    timings.sort()
+    return {
+        "threads": threads,
+        "requests": len(timings),
+        "rps": round(len(timings) / elapsed, 1),
+        "p50_ms": round(percentile(timings, 50), 2) if timings else None,
+        "p95_ms": round(percentile(timings, 95), 2) if timings else None,
+        "errors": dict(errors),
+    }
@@ -0,0 +1,332 @@
+"""
+Set-based write operations that bypass per-row ``save()`` and ``delete()``.
+
+``QuerySet.update()`` and raw deletes send no signals, so each operation here
+keeps the denormalized data (client summaries, per-user cache tokens, the
+search index, the monthly snapshots) consistent itself.
+"""
+
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+
+from . import search, snapshots
+from .cache import touch_user
+from .models import Client, ClientSummary, ContactLog, Invoice, Project
+from .summaries import REFRESH_CHUNK_SIZE, refresh_client_summaries
+
+
+def mark_overdue_invoices(as_of=None, chunk_size=5000):
+    """
+    Mark every pending invoice due before ``as_of`` as overdue.
+
+    Walks the table in primary-key ranges of ``chunk_size`` ids. Each range is
+    one grouped ``COUNT`` (for the per-user report) and one ``UPDATE`` in its
+    own short transaction, so SQLite never holds the write lock for long.
+    Returns a ``Counter`` of updated invoices per user id.
+
+    Pending and overdue invoices both count as outstanding, so the client
+    summaries do not change.
+    """
+    as_of = as_of or timezone.localdate()
+    pending = Invoice.objects.filter(
+        payment_status=Invoice.PaymentStatus.PENDING, due_date__lt=as_of
+    ).order_by()
+    bounds = pending.aggregate(low=Min("pk"), high=Max("pk"))
+    per_user = Counter()
+    if bounds["low"] is None:
+        return per_user
+    for start in range(bounds["low"], bounds["high"] + 1, chunk_size):
+        chunk = pending.filter(pk__gte=start, pk__lt=start + chunk_size)
+        with transaction.atomic():
+            counts = dict(
+                chunk.values("user_id").annotate(total=Count("pk")).values_list("user_id", "total")
+            )
+            if counts:
+                chunk.update(
+                    payment_status=Invoice.PaymentStatus.OVERDUE, updated_at=timezone.now()
+                )
+        per_user.update(counts)
+    for user_id in per_user:
+        touch_user(user_id)
+    return per_user
+
+
+class BulkAction:
+    """
+    One entry of the bulk-action menus on the list pages: ``apply`` takes a
+    queryset and returns the number of rows it changed.
+    """
+
+    def __init__(self, name, label, message, apply):
+        self.name = name
+        self.label = label
+        self.message = message
+        self.apply = apply
+
+
+def _owners(queryset, client_field):
+    return set(queryset.order_by().values_list("user_id", client_field).distinct())
+
+
+def _refresh_owners(owners):
+    refresh_client_summaries(client_id for _, client_id in owners)
+    for user_id in {user_id for user_id, _ in owners}:
+        touch_user(user_id)
+
+
+def _chunks(values):
+    values = list(values)
+    for start in range(0, len(values), REFRESH_CHUNK_SIZE):
+        yield values[start : start + REFRESH_CHUNK_SIZE]
+
+
+def _raw_delete(queryset):
+    # What ``QuerySet.delete()`` does once the collector has decided that no
+    # signals or cascades are involved: a single ``DELETE ... WHERE``.
+    queryset = queryset.order_by().select_related(None)
+    return queryset._raw_delete(queryset.db)
+
+
+def _handles_relations(model, handled):
+    """
+    True when every relation pointing at ``model`` is one of ``handled``; a
+    relation added later makes the deletes fall back to ``QuerySet.delete()``.
+    """
+    return {relation.related_model for relation in model._meta.related_objects} <= set(handled)
+
+
+def update_invoice_status(invoices, status):
+    """
+    Set ``payment_status`` on ``invoices`` with one ``UPDATE`` and return the
+    number of invoices that changed.
+    """
+    invoices = invoices.exclude(payment_status=status)
+    with transaction.atomic():
+        owners = _owners(invoices, "project__client_id")
+        updated = invoices.update(payment_status=status, updated_at=timezone.now())
+        _refresh_owners(owners)
+    return updated
+
+
+def update_project_status(projects, status):
+    """
+    Set ``status`` on ``projects`` with one ``UPDATE``. Project status is not
+    part of the client summaries, so only the owners' caches are invalidated.
+    """
+    projects = projects.exclude(status=status)
+    with transaction.atomic():
+        user_ids = set(projects.order_by().values_list("user_id", flat=True).distinct())
+        updated = projects.update(status=status)
+        for user_id in user_ids:
+            touch_user(user_id)
+    return updated
+
+
+def delete_invoices(invoices):
+    """
+    Delete ``invoices`` with one ``DELETE`` and return how many were deleted.
+    """
+    if not _handles_relations(Invoice, []):
+        return invoices.delete()[1].get(Invoice._meta.label, 0)
+    with transaction.atomic():
+        rows = list(invoices.order_by().values_list("pk", "user_id", "project__client_id"))
+        if not rows:
+            return 0
+        snapshots.mark_invoices_stale(invoices)
+        deleted = _raw_delete(invoices)
+        search.remove_objects(Invoice, [pk for pk, _, _ in rows])
+        _refresh_owners({(user_id, client_id) for _, user_id, client_id in rows})
+    return deleted
+
+
+def delete_projects(projects):
+    """
+    Delete ``projects`` and their invoices, and detach their contact logs,
+    with one statement per table (per chunk of project ids for the related
+    rows). Returns the number of projects deleted.
+    """
+    if not _handles_relations(Project, [Invoice, ContactLog]):
+        return projects.delete()[1].get(Project._meta.label, 0)
+    deleted = 0
+    with transaction.atomic():
+        rows = list(projects.order_by().values_list("pk", "user_id", "client_id"))
+        for chunk in _chunks(pk for pk, _, _ in rows):
+            invoices = Invoice.objects.filter(project_id__in=chunk)
+            search.remove_objects(Invoice, list(invoices.values_list("pk", flat=True)))
+            snapshots.mark_invoices_stale(invoices)
+            _raw_delete(invoices)
+            ContactLog.objects.filter(project_id__in=chunk).update(project=None)
+            deleted += _raw_delete(Project.objects.filter(pk__in=chunk))
+            search.remove_objects(Project, chunk)
+        _refresh_owners({(user_id, client_id) for _, user_id, client_id in rows})
+    return deleted
+
+
+DELETE_CHUNK_SIZE = 1000
+
+
+def more_than_a_chunk(*querysets, chunk_size=DELETE_CHUNK_SIZE):
+    """
+    True when ``querysets`` have more than ``chunk_size`` rows between them,
+    counting no further than that.
+    """
+    remaining = chunk_size
+    for queryset in querysets:
+        remaining -= queryset.order_by()[: remaining + 1].count()
+        if remaining < 0:
+            return True
+    return False
+
+
+def _pk_chunks(queryset, chunk_size):
+    """
+    Yield lists of up to ``chunk_size`` primary keys of ``queryset`` in order,
+    one query per list, so the rows can be deleted in between.
+    """
+    queryset = queryset.order_by("pk")
+    last = None
+    while True:
+        window = queryset if last is None else queryset.filter(pk__gt=last)
+        pks = list(window.values_list("pk", flat=True)[:chunk_size])
+        if not pks:
+            return
+        yield pks
+        last = pks[-1]
+
+
+def _delete_chunks(queryset, chunk_size, deleted, progress, before=None):
+    """
+    Delete ``queryset``'s rows ``chunk_size`` at a time, each chunk in its own
+    short transaction that first runs ``before(chunk, pks)``. Counts go into
+    the ``deleted`` counter, and ``progress(label, deleted_so_far)`` is called
+    after every chunk.
+    """
+    model = queryset.model
+    label = model._meta.label
+    for pks in _pk_chunks(queryset, chunk_size):
+        chunk = model.objects.filter(pk__in=pks)
+        with transaction.atomic():
+            if before:
+                before(chunk, pks)
+            deleted[label] += _raw_delete(chunk)
+        if progress:
+            progress(label, deleted[label])
+
+
+def _before_invoices(chunk, pks):
+    snapshots.mark_invoices_stale(chunk)
+    search.remove_objects(Invoice, pks)
+
+
+def _before_contact_logs(chunk, pks):
+    search.remove_objects(ContactLog, pks)
+
+
+def _before_projects(chunk, pks):
+    ContactLog.objects.filter(project_id__in=pks).update(project=None)
+    search.remove_objects(Project, pks)
+
+
+def _delete_project_invoices(project_id, chunk_size, deleted, progress):
+    # One project at a time: filtering on the foreign key alone walks its
+    # index in primary-key order, where a join would sort on every chunk.
+    _delete_chunks(
+        Invoice.objects.filter(project_id=project_id),
+        chunk_size,
+        deleted,
+        progress,
+        _before_invoices,
+    )
+
+
+def delete_project(project, chunk_size=DELETE_CHUNK_SIZE, progress=None):
+    """
+    Delete ``project`` and its invoices, and detach its contact logs, in
+    chunks of ``chunk_size`` rows per transaction instead of one collector
+    pass that loads every related row. Returns a ``Counter`` of deleted rows
+    per model label; ``progress(label, deleted_so_far)`` is called after
+    each chunk.
+
+    If interrupted, the project is left with fewer invoices; running it
+    again finishes the job.
+    """
+    if not _handles_relations(Project, [Invoice, ContactLog]):
+        return Counter(project.delete()[1])
+    deleted = Counter()
+    _delete_project_invoices(project.pk, chunk_size, deleted, progress)
+    _delete_chunks(
+        Project.objects.filter(pk=project.pk), chunk_size, deleted, progress, _before_projects
+    )
+    _refresh_owners({(project.user_id, project.client_id)})
+    return deleted
+
+
+def delete_client(client, chunk_size=DELETE_CHUNK_SIZE, progress=None):
+    """
+    ``delete_project`` for a whole client: the invoices of each of its
+    projects, its contact logs and its projects go chunk by chunk, then the
+    client itself with its summary.
+    """
+    if not _handles_relations(Client, [Project, ContactLog, ClientSummary]):
+        return Counter(client.delete()[1])
+    deleted = Counter()
+    projects = Project.objects.filter(client=client)
+    for project_ids in _pk_chunks(projects, chunk_size):
+        for project_id in project_ids:
+            _delete_project_invoices(project_id, chunk_size, deleted, progress)
+    _delete_chunks(
+        ContactLog.objects.filter(client=client),
+        chunk_size,
+        deleted,
+        progress,
+        _before_contact_logs,
+    )
+    _delete_chunks(projects, chunk_size, deleted, progress, _before_projects)
+    with transaction.atomic():
+        _raw_delete(ClientSummary.objects.filter(client=client))
+        search.remove_objects(Client, [client.pk])
+        deleted[Client._meta.label] += _raw_delete(Client.objects.filter(pk=client.pk))
+    if progress:
+        progress(Client._meta.label, deleted[Client._meta.label])
+    touch_user(client.user_id)
+    return deleted
+
+
+def _invoice_status_action(status):
+    return BulkAction(
+        status.value,
+        f"Mark {status.label.lower()}",
+        f"Marked {{count}} invoice(s) as {status.label.lower()}.",
+        lambda invoices: update_invoice_status(invoices, status),
+    )
+
+
+def _project_status_action(status):
+    return BulkAction(
+        f"status-{status.value}",
+        f"Set status: {status.label}",
+        f"Set {{count}} project(s) to {status.label}.",
+        lambda projects: update_project_status(projects, status),
+    )
+
+
+INVOICE_ACTIONS = {
+    action.name: action
+    for action in [
+        _invoice_status_action(Invoice.PaymentStatus.PAID),
+        _invoice_status_action(Invoice.PaymentStatus.OVERDUE),
+        _invoice_status_action(Invoice.PaymentStatus.CANCELLED),
+        BulkAction("delete", "Delete", "Deleted {count} invoice(s).", delete_invoices),
+    ]
+}
+
+PROJECT_ACTIONS = {
+    action.name: action
+    for action in [
+        *(_project_status_action(status) for status in Project.Status),
+        BulkAction("delete", "Delete", "Deleted {count} project(s).", delete_projects),
+    ]
+}
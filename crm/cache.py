@@ -0,0 +1,181 @@
+"""
+Per-user caching for aggregates and list pages.
+
+Every cache key embeds the user's current *change token*. Any write to one of
+the user's rows replaces the token, which orphans that user's entries at once
+without touching anyone else's; orphaned entries simply expire. This works on
+any Django cache backend, including the local-memory and file-based ones,
+because it never needs to enumerate or pattern-delete keys.
+
+The token itself is a ``ChangeToken`` row, not a cache entry: it is replaced
+in the same transaction as the write, from whichever process makes it, and
+read from the primary database, so a web process sees writes made by
+management commands and job workers as soon as they commit.
+"""
+
+import hashlib
+import secrets
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import ChangeToken
+
+# The token of a user with no ChangeToken row yet.
+INITIAL_TOKEN = "0.0"
+
+# Tokens already read in the current request, by user id.
+_request_tokens = ContextVar("crm_request_tokens", default=None)
+
+
+def get_cache():
+    return caches[getattr(settings, "CRM_CACHE_ALIAS", "default")]
+
+
+def _new_token():
+    return f"{time.time_ns()}.{secrets.token_hex(4)}"
+
+
+def token_timestamp(token):
+    """
+    Seconds since the epoch at which ``token`` was issued.
+    """
+    return int(token.split(".", 1)[0]) / 1e9
+
+
+def _tokens():
+    # Always the primary: the replica may not have the latest token yet.
+    return ChangeToken.objects.using(DEFAULT_DB_ALIAS)
+
+
+@contextmanager
+def remembering_tokens():
+    """
+    Read each user's token at most once inside the block. A remembered token
+    can only be older than the current one, which costs cache misses, never
+    stale hits: whatever is cached under it was read after it.
+    """
+    reset_token = _request_tokens.set({})
+    try:
+        yield
+    finally:
+        _request_tokens.reset(reset_token)
+
+
+def user_token(user_id):
+    """
+    The user's current change token: the nanosecond timestamp of the user's
+    last write, plus a random suffix. Users who have not written since the
+    tokens were introduced share ``INITIAL_TOKEN``.
+    """
+    remembered = _request_tokens.get()
+    if remembered is not None and user_id in remembered:
+        return remembered[user_id]
+    token = _tokens().filter(user_id=user_id).values_list("token", flat=True).first()
+    token = token or INITIAL_TOKEN
+    if remembered is not None:
+        remembered[user_id] = token
+    return token
+
+
+async def auser_token(user_id):
+    remembered = _request_tokens.get()
+    if remembered is not None and user_id in remembered:
+        return remembered[user_id]
+    token = await _tokens().filter(user_id=user_id).values_list("token", flat=True).afirst()
+    token = token or INITIAL_TOKEN
+    if remembered is not None:
+        remembered[user_id] = token
+    return token
+
+
+def touch_user(user_id):
+    """
+    Invalidate everything cached for ``user_id``.
+
+    Call it after the write, inside the write's transaction when there is
+    one: the new token then commits together with the data, so a reader
+    that caches what it read under the token it saw can never file old data
+    under the new token.
+    """
+    if not user_id:
+        return
+    remembered = _request_tokens.get()
+    if remembered is not None:
+        remembered.pop(user_id, None)
+    token = _new_token()
+    if not _tokens().filter(user_id=user_id).update(token=token):
+        _tokens().bulk_create([ChangeToken(user_id=user_id, token=token)], ignore_conflicts=True)
+        # Another writer may have created the row first.
+        _tokens().filter(user_id=user_id).update(token=token)
+
+
+class ChangeTokenMiddleware:
+    """
+    Read each user's change token once per request, however many cached
+    values and validators the request builds from it.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with remembering_tokens():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with remembering_tokens():
+            return await self.get_response(request)
+
+
+def _key(user_id, token, name, parts):
+    digest = hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest()
+    return f"crm:user:{user_id}:{token}:{name}:{digest}"
+
+
+def user_cache_key(user_id, name, *parts):
+    return _key(user_id, user_token(user_id), name, parts)
+
+
+def cached_for_user(user_id, name, compute, *parts, timeout=None):
+    """
+    Return ``compute()`` for ``(user_id, name, *parts)``, caching the result
+    until the user's next write or ``timeout`` seconds, whichever comes first.
+    """
+    if timeout is None:
+        timeout = getattr(settings, "CRM_CACHE_TIMEOUT", 300)
+    cache = get_cache()
+    key = user_cache_key(user_id, name, *parts)
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, timeout)
+    return value
+
+
+async def acached_for_user(user_id, name, compute, *parts, timeout=None):
+    """
+    ``cached_for_user`` for async views; ``compute`` is a coroutine function.
+    """
+    if timeout is None:
+        timeout = getattr(settings, "CRM_CACHE_TIMEOUT", 300)
+    cache = get_cache()
+    key = _key(user_id, await auser_token(user_id), name, parts)
+    value = await cache.aget(key)
+    if value is None:
+        value = await compute()
+        await cache.aset(key, value, timeout)
+    return value
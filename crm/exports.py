@@ -0,0 +1,145 @@
+"""
+Streaming exports of a user's CRM data.
+
+Rows are read with ``values_list()`` and ``iterator(chunk_size=...)`` and
+written one line at a time, so memory use does not grow with the row count.
+"""
+
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .filters import (
+    filter_clients,
+    filter_contact_logs,
+    filter_invoices,
+    filter_projects,
+    filter_snapshots,
+)
+from .models import Client, ContactLog, Invoice, MonthlySnapshot, Project
+
+CHUNK_SIZE = 2000
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+}
+
+
+class Export:
+    def __init__(self, model, fields, filter_func, ordering=("pk",)):
+        self.model = model
+        self.fields = fields
+        self.filter_func = filter_func
+        self.ordering = ordering
+
+    def headers(self):
+        return [field.replace("__", "_") for field in self.fields]
+
+    def rows(self, user, params=None, using=None):
+        queryset = self.model.objects.using(using).filter(user=user)
+        queryset = self.filter_func(queryset, params or {})
+        return queryset.order_by(*self.ordering).values_list(*self.fields).iterator(chunk_size=CHUNK_SIZE)
+
+
+EXPORTS = {
+    "clients": Export(
+        Client,
+        ["id", "name", "email", "phone", "company", "notes", "created_at"],
+        filter_clients,
+    ),
+    "projects": Export(
+        Project,
+        [
+            "id",
+            "client_id",
+            "client__name",
+            "name",
+            "description",
+            "status",
+            "amount",
+            "start_date",
+            "end_date",
+            "created_at",
+        ],
+        filter_projects,
+    ),
+    "invoices": Export(
+        Invoice,
+        [
+            "id",
+            "number",
+            "project_id",
+            "project__name",
+            "project__client__name",
+            "amount",
+            "payment_status",
+            "issue_date",
+            "due_date",
+            "created_at",
+        ],
+        filter_invoices,
+    ),
+    "contact_logs": Export(
+        ContactLog,
+        ["id", "client_id", "client__name", "project_id", "contact_type", "notes", "contacted_at"],
+        filter_contact_logs,
+    ),
+    # Read from the snapshot table that the accounting report shows.
+    "monthly_revenue": Export(
+        MonthlySnapshot,
+        [
+            "month",
+            "invoice_count",
+            "billed",
+            "paid",
+            "outstanding",
+            "aging_0_30",
+            "aging_31_60",
+            "aging_61_90",
+            "aging_over_90",
+            "as_of",
+        ],
+        filter_snapshots,
+        ordering=("month",),
+    ),
+}
+
+
+class Echo:
+    """
+    File-like object whose ``write`` hands the line back instead of storing it.
+    """
+
+    def write(self, value):
+        return value
+
+
+def _iso(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def csv_lines(export, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(export.headers())
+    for row in rows:
+        yield writer.writerow([_iso(value) for value in row])
+
+
+def jsonl_lines(export, rows):
+    headers = export.headers()
+    for row in rows:
+        yield json.dumps(dict(zip(headers, row)), cls=DjangoJSONEncoder) + "\n"
+
+
+def export_lines(kind, user, fmt="csv", params=None, using=None):
+    """
+    Yield the text lines of ``kind`` exported for ``user`` in ``fmt``, read
+    from the ``using`` database alias (by default, wherever the router says).
+    """
+    export = EXPORTS[kind]
+    rows = export.rows(user, params, using)
+    if fmt == "jsonl":
+        return jsonl_lines(export, rows)
+    return csv_lines(export, rows)
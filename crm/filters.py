@@ -0,0 +1,54 @@
+"""
+Query-string filters shared by the HTML lists, exports and the API, so the
+same ``?status=...`` means the same thing everywhere.
+"""
+
+from django.db.models import Exists, OuterRef, Q
+
+from .models import Project
+
+
+def filter_clients(queryset, params):
+    query = params.get("q")
+    email = params.get("email")
+    status = params.get("status")
+    if query:
+        queryset = queryset.filter(Q(name__icontains=query) | Q(company__icontains=query))
+    if email:
+        queryset = queryset.filter(email__icontains=email)
+    if status:
+        queryset = queryset.filter(
+            Exists(Project.objects.filter(client=OuterRef("pk"), status=status))
+        )
+    return queryset
+
+
+def filter_projects(queryset, params):
+    status = params.get("status")
+    if status:
+        queryset = queryset.filter(status=status)
+    return queryset
+
+
+def filter_invoices(queryset, params):
+    status = params.get("payment_status")
+    if status:
+        queryset = queryset.filter(payment_status=status)
+    return queryset
+
+
+def filter_contact_logs(queryset, params):
+    client = params.get("client")
+    contact_type = params.get("contact_type")
+    if client and client.isdigit():
+        queryset = queryset.filter(client_id=client)
+    if contact_type:
+        queryset = queryset.filter(contact_type=contact_type)
+    return queryset
+
+
+def filter_snapshots(queryset, params):
+    year = params.get("year")
+    if year and year.isdigit():
+        queryset = queryset.filter(month__year=int(year))
+    return queryset
@@ -1,8 +1,41 @@
 from django import forms
 
+from .cache import cached_for_user
+from .imports import COLUMNS
 from .models import Client, ContactLog, Invoice, Project
 
 
+def client_choices(user):
+    return cached_for_user(
+        user.pk,
+        "client-choices",
+        lambda: list(Client.objects.filter(user=user).values_list("pk", "name")),
+    )
+
+
+def project_choices(user):
+    """
+    ``(pk, label)`` pairs matching ``Project.__str__``, built from one joined
+    query instead of loading each project's client for its label.
+    """
+
+    def compute():
+        rows = Project.objects.filter(user=user).values_list("pk", "name", "client__name")
+        return [(pk, f"{name} ({client_name})") for pk, name, client_name in rows]
+
+    return cached_for_user(user.pk, "project-choices", compute)
+
+
+def limit_choices(field, queryset, load_choices, user):
+    """
+    Validate against ``queryset`` but render the options from
+    ``load_choices(user)``, which only runs if the field is actually rendered.
+    """
+    field.queryset = queryset
+    empty = [("", field.empty_label)] if field.empty_label is not None else []
+    field.choices = lambda: empty + load_choices(user)
+
+
 class ClientForm(forms.ModelForm):
     class Meta:
         model = Client
@@ -29,7 +62,9 @@ class ProjectForm(forms.ModelForm):
     def __init__(self, *args, user=None, **kwargs):
         super().__init__(*args, **kwargs)
         if user is not None:
-            self.fields["client"].queryset = Client.objects.filter(user=user)
+            limit_choices(
+                self.fields["client"], Client.objects.filter(user=user), client_choices, user
+            )
 
 
 class InvoiceForm(forms.ModelForm):
@@ -50,8 +85,14 @@ class InvoiceForm(forms.ModelForm):
 
     def __init__(self, *args, user=None, **kwargs):
         super().__init__(*args, **kwargs)
+        if self.instance._state.adding:
+            # Left blank, Invoice.save() takes the next number in the user's sequence.
+            self.fields["number"].required = False
+            self.fields["number"].widget.attrs["placeholder"] = "Next in your sequence"
         if user is not None:
-            self.fields["project"].queryset = Project.objects.filter(user=user)
+            limit_choices(
+                self.fields["project"], Project.objects.filter(user=user), project_choices, user
+            )
 
 
 class ContactLogForm(forms.ModelForm):
@@ -65,5 +106,56 @@ class ContactLogForm(forms.ModelForm):
     def __init__(self, *args, user=None, **kwargs):
         super().__init__(*args, **kwargs)
         if user is not None:
-            self.fields["client"].queryset = Client.objects.filter(user=user)
-            self.fields["project"].queryset = Project.objects.filter(user=user)
+            limit_choices(
+                self.fields["client"], Client.objects.filter(user=user), client_choices, user
+            )
+            limit_choices(
+                self.fields["project"], Project.objects.filter(user=user), project_choices, user
+            )
+
+
+class ImportForm(forms.Form):
+    kind = forms.ChoiceField(
+        choices=[("clients", "Clients"), ("projects", "Projects"), ("invoices", "Invoices")],
+    )
+    file = forms.FileField(
+        help_text="CSV with a header row. Expected columns: "
+        + "; ".join(f"{kind}: {', '.join(columns)}" for kind, columns in COLUMNS.items()),
+    )
+
+
+class IdListField(forms.Field):
+    """
+    The primary keys ticked in a list's checkboxes, as a sorted list of ints.
+    """
+
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        try:
+            return sorted({int(item) for item in value or []})
+        except (TypeError, ValueError):
+            raise forms.ValidationError("Invalid selection.", code="invalid")
+
+
+class BulkActionForm(forms.Form):
+    MAX_SELECTED = 1000
+
+    action = forms.ChoiceField()
+    ids = IdListField(required=False)
+    select_all = forms.BooleanField(required=False)
+
+    def __init__(self, *args, actions=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["action"].choices = [(action.name, action.label) for action in actions]
+
+    def clean(self):
+        cleaned_data = super().clean()
+        ids = cleaned_data.get("ids") or []
+        if not ids and not cleaned_data.get("select_all"):
+            raise forms.ValidationError("Select at least one row.")
+        if len(ids) > self.MAX_SELECTED:
+            raise forms.ValidationError(
+                f"Select at most {self.MAX_SELECTED} rows, or apply the action to all matching rows."
+            )
+        return cleaned_data
@@ -0,0 +1,311 @@
+"""
+Bulk CSV import of clients, projects and invoices.
+
+Rows are read lazily from the CSV and handled in batches. For each batch the
+foreign keys and uniqueness checks are resolved with one lookup query per
+kind, every row is validated with the model's own ``full_clean()``, and the
+valid rows are written with ``bulk_create`` in one transaction.
+"""
+
+import csv
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from . import search
+from .cache import touch_user
+from .models import Client, Invoice, Project
+from .numbering import next_invoice_numbers
+from .summaries import create_client_summaries, refresh_client_summaries
+
+BATCH_SIZE = 1000
+
+COLUMNS = {
+    "clients": ["name", "email", "phone", "company", "notes"],
+    "projects": [
+        "client_email",
+        "name",
+        "description",
+        "status",
+        "amount",
+        "start_date",
+        "end_date",
+    ],
+    "invoices": [
+        "number",
+        "client_email",
+        "project",
+        "amount",
+        "payment_status",
+        "issue_date",
+        "due_date",
+    ],
+}
+
+INVOICE_FIELDS = ["number", "amount", "payment_status", "issue_date", "due_date"]
+
+
+class ImportReport:
+    def __init__(self, kind):
+        self.kind = kind
+        self.created = 0
+        self.errors = []
+
+    def add_error(self, line, message):
+        self.errors.append((line, message))
+
+    @property
+    def ok(self):
+        return not self.errors
+
+
+def _error_text(error):
+    if hasattr(error, "message_dict"):
+        return "; ".join(
+            f"{field}: {' '.join(messages)}" if field != "__all__" else " ".join(messages)
+            for field, messages in error.message_dict.items()
+        )
+    return " ".join(error.messages)
+
+
+def _build(model, values):
+    """
+    Instantiate ``model`` from raw CSV strings. Empty cells fall back to the
+    field default, or ``None`` for nullable fields.
+    """
+    kwargs = {}
+    for name, value in values.items():
+        field = model._meta.get_field(name)
+        value = (value or "").strip()
+        if value:
+            kwargs[name] = value
+        elif field.null:
+            kwargs[name] = None
+        elif not field.has_default():
+            kwargs[name] = value
+    return model(**kwargs)
+
+
+class Importer:
+    model = None
+    exclude = ["user"]
+
+    def __init__(self, user, report):
+        self.user = user
+        self.report = report
+        self.client_ids = set()
+
+    def prepare(self, rows):
+        """
+        Run the per-batch lookup queries.
+        """
+
+    def build(self, row):
+        raise NotImplementedError
+
+    def validate(self, obj):
+        obj.full_clean(exclude=self.exclude, validate_unique=False)
+
+    def handle_batch(self, numbered_rows):
+        self.prepare([row for _, row in numbered_rows])
+        valid = []
+        for line, row in numbered_rows:
+            try:
+                obj = self.build(row)
+                self.validate(obj)
+            except ValidationError as error:
+                self.report.add_error(line, _error_text(error))
+                continue
+            valid.append((line, obj))
+        self.save(valid)
+
+    def save(self, numbered_objects):
+        objects = [obj for _, obj in numbered_objects]
+        try:
+            with transaction.atomic():
+                created = self.model.objects.bulk_create(objects)
+        except IntegrityError:
+            # A concurrent writer took one of our keys; retry row by row so
+            # only the conflicting rows are reported.
+            created = []
+            for line, obj in numbered_objects:
+                try:
+                    with transaction.atomic():
+                        obj.save(force_insert=True)
+                    created.append(obj)
+                except IntegrityError as error:
+                    self.report.add_error(line, str(error))
+        self.report.created += len(created)
+        self.after_save(created)
+        # bulk_create sends no signals, so index the new rows here.
+        search.index_objects(created)
+
+    def after_save(self, created):
+        pass
+
+    def finish(self):
+        refresh_client_summaries(self.client_ids)
+        touch_user(self.user.pk)
+
+
+class ClientImporter(Importer):
+    model = Client
+
+    def __init__(self, user, report):
+        super().__init__(user, report)
+        self.seen_emails = set()
+
+    def prepare(self, rows):
+        emails = {(row.get("email") or "").strip() for row in rows}
+        self.existing_emails = set(
+            Client.objects.filter(user=self.user, email__in=emails).values_list(
+                "email", flat=True
+            )
+        )
+
+    def build(self, row):
+        client = _build(Client, {name: row.get(name) for name in COLUMNS["clients"]})
+        client.user = self.user
+        return client
+
+    def validate(self, obj):
+        super().validate(obj)
+        if obj.email in self.existing_emails or obj.email in self.seen_emails:
+            raise ValidationError({"email": ["A client with this email already exists."]})
+        self.seen_emails.add(obj.email)
+
+    def after_save(self, created):
+        create_client_summaries(created)
+
+
+class ClientLookupMixin:
+    def load_clients(self, rows):
+        emails = {(row.get("client_email") or "").strip() for row in rows}
+        self.clients = {
+            email: Client(pk=pk, user_id=self.user.pk)
+            for pk, email in Client.objects.filter(user=self.user, email__in=emails).values_list(
+                "pk", "email"
+            )
+        }
+
+    def resolve_client(self, row):
+        email = (row.get("client_email") or "").strip()
+        try:
+            return self.clients[email]
+        except KeyError:
+            raise ValidationError({"client_email": [f"No client with email {email!r}."]})
+
+
+class ProjectImporter(ClientLookupMixin, Importer):
+    model = Project
+    exclude = ["user", "client"]
+
+    def prepare(self, rows):
+        self.load_clients(rows)
+
+    def build(self, row):
+        client = self.resolve_client(row)
+        project = _build(Project, {name: row.get(name) for name in COLUMNS["projects"][1:]})
+        project.user = self.user
+        project.client = client
+        return project
+
+    def after_save(self, created):
+        self.client_ids.update(project.client_id for project in created)
+
+
+class InvoiceImporter(ClientLookupMixin, Importer):
+    model = Invoice
+    exclude = ["user", "project"]
+
+    def __init__(self, user, report):
+        super().__init__(user, report)
+        self.seen_numbers = set()
+
+    def prepare(self, rows):
+        self.load_clients(rows)
+        numbers = {(row.get("number") or "").strip() for row in rows}
+        self.existing_numbers = set(
+            Invoice.objects.filter(number__in=numbers).values_list("number", flat=True)
+        )
+        names = {(row.get("project") or "").strip() for row in rows}
+        self.projects = {}
+        client_ids = [client.pk for client in self.clients.values()]
+        for pk, client_id, name in Project.objects.filter(
+            user=self.user, client_id__in=client_ids, name__in=names
+        ).values_list("pk", "client_id", "name"):
+            key = (client_id, name)
+            self.projects[key] = None if key in self.projects else pk
+
+    def build(self, row):
+        client = self.resolve_client(row)
+        name = (row.get("project") or "").strip()
+        key = (client.pk, name)
+        if key not in self.projects:
+            raise ValidationError({"project": [f"No project {name!r} for this client."]})
+        if self.projects[key] is None:
+            raise ValidationError({"project": [f"Project name {name!r} is ambiguous."]})
+        invoice = _build(Invoice, {name: row.get(name) for name in INVOICE_FIELDS})
+        invoice.project_id = self.projects[key]
+        invoice.user = self.user
+        invoice._client_id = client.pk
+        return invoice
+
+    def validate(self, obj):
+        if not obj.number:
+            # Numbered from the user's sequence when saved.
+            obj.full_clean(exclude=[*self.exclude, "number"], validate_unique=False)
+            return
+        super().validate(obj)
+        if obj.number in self.existing_numbers or obj.number in self.seen_numbers:
+            raise ValidationError({"number": ["Invoice with this Number already exists."]})
+        self.seen_numbers.add(obj.number)
+
+    def save(self, numbered_objects):
+        unnumbered = [obj for _, obj in numbered_objects if not obj.number]
+        if not unnumbered:
+            return super().save(numbered_objects)
+        # One block reservation for the batch, rolled back with it.
+        with transaction.atomic():
+            for obj, number in zip(unnumbered, next_invoice_numbers(self.user.pk, len(unnumbered))):
+                obj.number = number
+            super().save(numbered_objects)
+
+    def after_save(self, created):
+        self.client_ids.update(invoice._client_id for invoice in created)
+
+
+IMPORTERS = {
+    "clients": ClientImporter,
+    "projects": ProjectImporter,
+    "invoices": InvoiceImporter,
+}
+
+
+def import_csv(kind, user, stream, batch_size=BATCH_SIZE, progress=None):
+    """
+    Import ``kind`` rows for ``user`` from the text stream ``stream``.
+
+    Returns an ``ImportReport`` with the number of rows created and a list of
+    ``(line, message)`` errors; line numbers count the header as line 1.
+    ``progress``, if given, is called with the number created after each batch.
+    """
+    report = ImportReport(kind)
+    reader = csv.DictReader(stream)
+    missing = [column for column in COLUMNS[kind] if column not in (reader.fieldnames or [])]
+    if missing:
+        report.add_error(1, f"Missing column(s): {', '.join(missing)}.")
+        return report
+
+    importer = IMPORTERS[kind](user, report)
+    numbered = ((reader.line_num, row) for row in reader)
+    while True:
+        batch = list(islice(numbered, batch_size))
+        if not batch:
+            break
+        importer.handle_batch(batch)
+        if progress:
+            progress(report.created)
+    importer.finish()
+    return report
@@ -0,0 +1,212 @@
+"""
+Per-request SQL, template and wall-clock timings.
+
+``RequestMetricsMiddleware`` measures every request that resolves to a named
+URL, reports the numbers in a ``Server-Timing`` header, and keeps a rolling
+window of samples per URL name for ``/stats/``. ``CRM_QUERY_BUDGETS`` maps URL
+names to the most queries a request may run; going over is logged, or raised
+as ``QueryBudgetExceeded`` when ``CRM_QUERY_BUDGETS_STRICT`` is on (as in the
+test suite).
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = 500
+PERCENTILES = (50, 90, 99)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.wall_time = 0.0
+        self._render_started = None
+        self._lock = threading.Lock()
+
+    def add_query(self, duration):
+        with self._lock:
+            self.queries += 1
+            self.sql_time += duration
+
+    def render_started(self):
+        self._render_started = time.perf_counter()
+
+    def render_finished(self, response):
+        if self._render_started is not None:
+            self.template_time += time.perf_counter() - self._render_started
+            self._render_started = None
+
+    def server_timing(self):
+        return ", ".join(
+            [
+                f'sql;dur={self.sql_time * 1000:.1f};desc="{self.queries} queries"',
+                f"tpl;dur={self.template_time * 1000:.1f}",
+                f"total;dur={self.wall_time * 1000:.1f}",
+            ]
+        )
+
+
+# The metrics of the request being handled. Context variables follow the
+# request into ``sync_to_async`` worker threads, so queries an async view runs
+# on other threads and connections are counted too.
+current_metrics = ContextVar("crm_request_metrics", default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(time.perf_counter() - start)
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def install():
+    """
+    Add the recorder to this thread's connections; ones opened later, on any
+    thread, get it from ``connection_created``.
+    """
+    for connection in connections.all():
+        install_query_recorder(None, connection)
+
+
+@contextmanager
+def recording(metrics):
+    token = current_metrics.set(metrics)
+    try:
+        yield metrics
+    finally:
+        current_metrics.reset(token)
+
+
+def percentile(sorted_values, pct):
+    """
+    Nearest-rank percentile of an already sorted, non-empty list.
+    """
+    index = max(0, -(-len(sorted_values) * pct // 100) - 1)
+    return sorted_values[index]
+
+
+class MetricsRegistry:
+    """
+    Thread-safe rolling windows of request samples keyed by URL name.
+    """
+
+    fields = ("queries", "sql_ms", "template_ms", "wall_ms")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = {}
+
+    def record(self, name, metrics):
+        sample = (
+            metrics.queries,
+            metrics.sql_time * 1000,
+            metrics.template_time * 1000,
+            metrics.wall_time * 1000,
+        )
+        window = getattr(settings, "CRM_METRICS_WINDOW", DEFAULT_WINDOW)
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None or samples.maxlen != window:
+                samples = self._samples[name] = deque(samples or (), maxlen=window)
+            samples.append(sample)
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+    def snapshot(self):
+        with self._lock:
+            copies = {name: list(samples) for name, samples in self._samples.items()}
+        stats = {}
+        for name, samples in sorted(copies.items()):
+            entry = {"count": len(samples)}
+            for position, field in enumerate(self.fields):
+                values = sorted(sample[position] for sample in samples)
+                entry[field] = {
+                    f"p{pct}": round(percentile(values, pct), 2) for pct in PERCENTILES
+                }
+                entry[field]["max"] = round(values[-1], 2)
+            stats[name] = entry
+        return stats
+
+
+registry = MetricsRegistry()
+
+
+def check_budget(name, queries):
+    budget = getattr(settings, "CRM_QUERY_BUDGETS", {}).get(name)
+    if budget is None or queries <= budget:
+        return
+    message = f"{name} ran {queries} queries; its budget is {budget}."
+    if getattr(settings, "CRM_QUERY_BUDGETS_STRICT", False):
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = request.crm_metrics = RequestMetrics()
+        start = time.perf_counter()
+        with recording(metrics):
+            response = self.get_response(request)
+        return self.finish(request, response, metrics, start)
+
+    async def __acall__(self, request):
+        metrics = request.crm_metrics = RequestMetrics()
+        start = time.perf_counter()
+        with recording(metrics):
+            response = await self.get_response(request)
+        return self.finish(request, response, metrics, start)
+
+    def finish(self, request, response, metrics, start):
+        metrics.wall_time = time.perf_counter() - start
+        match = request.resolver_match
+        if match is None or not match.url_name:
+            return response
+        response["Server-Timing"] = metrics.server_timing()
+        registry.record(match.url_name, metrics)
+        check_budget(match.url_name, metrics.queries)
+        return response
+
+    def process_template_response(self, request, response):
+        request.crm_metrics.render_started()
+        response.add_post_render_callback(request.crm_metrics.render_finished)
+        return response
@@ -0,0 +1,415 @@
+"""
+A job queue in the database, for work too slow for a request: imports,
+exports, snapshot refreshes, large deletes and overdue sweeps.
+
+``enqueue`` adds a ``Job`` row; ``manage.py run_worker`` claims due jobs and
+runs them in a pool of local processes, so nothing but the database and the
+worker is needed.
+
+Claiming a job is an ``UPDATE`` conditioned on the status and attempt count
+the worker just read, so two workers never run the same attempt. The claim
+is a lease: ``locked_until`` is ``CRM_JOB_VISIBILITY_TIMEOUT`` seconds away
+and a heartbeat thread keeps pushing it back while the job runs. If the
+worker dies, the lease runs out and another worker takes the job again. A
+job that raises is queued again ``CRM_JOB_RETRY_DELAY`` seconds later,
+doubling with each attempt, until it has failed ``max_attempts`` times.
+
+Files a job leaves in ``files_dir`` are removed: an import's upload once it
+is read or the job fails for good, an export ``CRM_JOB_FILE_TTL`` seconds
+after it was written.
+"""
+
+import logging
+import multiprocessing
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+
+from . import bulk, snapshots, worker_process
+from .exports import EXPORTS, FORMATS, export_lines
+from .imports import import_csv
+from .models import Client, Job, Project
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+CLEANUPS = {}
+# Errors kept in an import job's result; the rest are only counted.
+MAX_REPORTED_ERRORS = 100
+# Export lines written between two progress updates.
+EXPORT_PROGRESS_LINES = 10_000
+# Seconds between two sweeps of expired files by the worker.
+FILE_SWEEP_INTERVAL = 600
+
+
+def task(name, cleanup=None):
+    """
+    Register the decorated function as the job kind ``name``. It is called
+    with a ``JobContext`` and the job's ``params`` as keyword arguments, and
+    its JSON-serialisable return value becomes the job's ``result``. If the
+    job fails for good, ``cleanup`` is called with the ``params`` to remove
+    what it left behind.
+    """
+
+    def register(function):
+        TASKS[name] = function
+        if cleanup is not None:
+            CLEANUPS[name] = cleanup
+        return function
+
+    return register
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def visibility_timeout():
+    return timedelta(seconds=_setting("CRM_JOB_VISIBILITY_TIMEOUT", 300))
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=_setting("CRM_JOB_RETRY_DELAY", 30) * 2 ** (attempts - 1))
+
+
+def file_ttl():
+    return timedelta(seconds=_setting("CRM_JOB_FILE_TTL", 24 * 60 * 60))
+
+
+def files_dir():
+    """
+    Where uploads waiting for an import job and finished exports are kept.
+    """
+    path = Path(_setting("CRM_JOB_FILES_DIR", settings.BASE_DIR / "job_files"))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def save_upload(upload, suffix=".csv"):
+    """
+    Copy an uploaded file into ``files_dir`` and return its name there.
+    """
+    name = f"upload-{uuid.uuid4().hex}{suffix}"
+    with open(files_dir() / name, "wb") as handle:
+        for chunk in upload.chunks():
+            handle.write(chunk)
+    return name
+
+
+def enqueue(kind, /, user=None, max_attempts=None, **params):
+    """
+    Queue a ``kind`` job for ``user`` (``None`` for maintenance jobs); the
+    task receives ``params``, which must be JSON-serialisable.
+    """
+    if kind not in TASKS:
+        raise ValueError(f"Unknown job kind {kind!r}.")
+    return Job.objects.create(
+        kind=kind,
+        user=user,
+        params=params,
+        max_attempts=max_attempts or _setting("CRM_JOB_MAX_ATTEMPTS", 3),
+    )
+
+
+def _give_up(kind, params):
+    cleanup = CLEANUPS.get(kind)
+    if cleanup is None:
+        return
+    try:
+        cleanup(**params)
+    except Exception:
+        logger.exception("Could not clean up after a failed %s job.", kind)
+
+
+def expire_files(now=None):
+    """
+    Delete the files of jobs that finished more than ``CRM_JOB_FILE_TTL``
+    ago, and return how many were deleted. The jobs stay, without ``path``
+    in their ``result``.
+    """
+    now = now or timezone.now()
+    expired = Job.objects.filter(
+        status=Job.Status.SUCCEEDED, finished_at__lt=now - file_ttl(), result__has_key="path"
+    )
+    count = 0
+    for job in expired.only("pk", "result"):
+        (files_dir() / job.result.pop("path")).unlink(missing_ok=True)
+        job.save(update_fields=["result"])
+        count += 1
+    return count
+
+
+def claim(limit, now=None):
+    """
+    Lease up to ``limit`` due jobs, oldest first, and return their ids.
+    Running jobs whose lease ran out count as due, or fail if that was their
+    last attempt.
+    """
+    now = now or timezone.now()
+    due = Job.objects.filter(
+        Q(status=Job.Status.QUEUED, run_after__lte=now)
+        | Q(status=Job.Status.RUNNING, locked_until__lt=now)
+    )
+    candidates = due.order_by("run_after", "pk").values_list(
+        "pk", "kind", "params", "status", "attempts", "max_attempts"
+    )[:limit]
+    claimed = []
+    for pk, kind, params, status, attempts, max_attempts in candidates:
+        # Only the worker whose UPDATE still finds the row as it was read wins.
+        unchanged = Job.objects.filter(pk=pk, status=status, attempts=attempts)
+        if status == Job.Status.RUNNING and attempts >= max_attempts:
+            failed = unchanged.update(
+                status=Job.Status.FAILED,
+                error="The worker stopped before the job finished.",
+                locked_until=None,
+                finished_at=now,
+            )
+            if failed:
+                _give_up(kind, params)
+            continue
+        if unchanged.update(
+            status=Job.Status.RUNNING,
+            attempts=attempts + 1,
+            locked_until=now + visibility_timeout(),
+            started_at=now,
+        ):
+            claimed.append(pk)
+    return claimed
+
+
+class JobContext:
+    """
+    What a task sees of its job: the job itself, and ``progress`` to report
+    how far it got on the status page.
+    """
+
+    def __init__(self, job):
+        self.job = job
+
+    def _attempt(self):
+        # Rows of this attempt only: a job taken over after its lease ran out
+        # belongs to the new attempt.
+        return Job.objects.filter(
+            pk=self.job.pk, status=Job.Status.RUNNING, attempts=self.job.attempts
+        )
+
+    def progress(self, **values):
+        self.job.progress = {**self.job.progress, **values}
+        self._attempt().update(progress=self.job.progress)
+
+    def extend_lease(self):
+        self._attempt().update(locked_until=timezone.now() + visibility_timeout())
+
+
+def _heartbeat(context, stop):
+    interval = visibility_timeout().total_seconds() / 3
+    try:
+        while not stop.wait(interval):
+            try:
+                context.extend_lease()
+            except Exception:
+                logger.warning("Could not extend the lease of job %s.", context.job.pk)
+    finally:
+        connections.close_all()
+
+
+def run_job(job_id):
+    """
+    Run one claimed job and record how it ended; returns its new status.
+    """
+    job = Job.objects.get(pk=job_id)
+    context = JobContext(job)
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(context, stop), daemon=True)
+    heartbeat.start()
+    try:
+        result = TASKS[job.kind](context, **job.params)
+    except Exception as error:
+        logger.exception("Job %s (%s) failed.", job.pk, job.kind)
+        update = {"error": "".join(traceback.format_exception_only(error)).strip()}
+        if job.attempts < job.max_attempts:
+            update.update(
+                status=Job.Status.QUEUED, run_after=timezone.now() + retry_delay(job.attempts)
+            )
+        else:
+            update.update(status=Job.Status.FAILED, finished_at=timezone.now())
+    else:
+        update = {
+            "status": Job.Status.SUCCEEDED,
+            "result": result,
+            "error": "",
+            "finished_at": timezone.now(),
+        }
+    finally:
+        stop.set()
+        heartbeat.join()
+    recorded = context._attempt().update(locked_until=None, **update)
+    if recorded and update["status"] == Job.Status.FAILED:
+        _give_up(job.kind, job.params)
+    return update["status"]
+
+
+def work(concurrency=None, once=False, poll_interval=1.0, log=None):
+    """
+    Claim and run jobs until interrupted, or until none are due if ``once``.
+    ``concurrency`` processes run jobs side by side; ``0`` runs them one at
+    a time in this process. Returns the number of jobs run.
+    """
+    if concurrency is None:
+        concurrency = _setting("CRM_JOB_CONCURRENCY", 2)
+    log = log or (lambda message: None)
+    next_sweep = 0.0
+
+    def sweep():
+        nonlocal next_sweep
+        if time.monotonic() >= next_sweep:
+            expired = expire_files()
+            if expired:
+                log(f"Deleted {expired} expired file(s).")
+            next_sweep = time.monotonic() + FILE_SWEEP_INTERVAL
+
+    if concurrency == 0:
+        count = 0
+        while True:
+            sweep()
+            claimed = claim(1)
+            if claimed:
+                log(f"Job {claimed[0]}: {run_job(claimed[0])}")
+                count += 1
+            elif once:
+                return count
+            else:
+                time.sleep(poll_interval)
+
+    count = 0
+    running = {}
+    broken = False
+    executor = _pool(concurrency)
+    try:
+        while True:
+            sweep()
+            if broken and not running:
+                executor.shutdown(wait=False)
+                executor = _pool(concurrency)
+                broken = False
+            free = concurrency - len(running)
+            if free and not broken:
+                for job_id in claim(free):
+                    running[executor.submit(worker_process.run, job_id)] = job_id
+            if not running:
+                if once:
+                    return count
+                time.sleep(poll_interval)
+                continue
+            done, _ = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            for future in done:
+                job_id = running.pop(future)
+                count += 1
+                try:
+                    log(f"Job {job_id}: {future.result()}")
+                except BrokenProcessPool:
+                    # A process died and took the pool with it: its jobs are
+                    # run again once their leases run out.
+                    logger.error("Worker process died while running job %s.", job_id)
+                    broken = True
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _pool(concurrency):
+    # The processes open the databases this one has open, which differ from
+    # the settings under tests or when the settings were changed at run time.
+    databases = {alias: connections[alias].settings_dict["NAME"] for alias in connections}
+    return ProcessPoolExecutor(
+        max_workers=concurrency,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=worker_process.start,
+        initargs=(databases,),
+    )
+
+
+def _user(context):
+    return get_user_model().objects.get(pk=context.job.user_id)
+
+
+def _discard_upload(kind, path):
+    (files_dir() / path).unlink(missing_ok=True)
+
+
+@task("import", cleanup=_discard_upload)
+def import_file(context, kind, path):
+    upload = files_dir() / path
+    with open(upload, encoding="utf-8-sig", newline="") as stream:
+        report = import_csv(
+            kind, _user(context), stream, progress=lambda created: context.progress(created=created)
+        )
+    upload.unlink()
+    return {
+        "kind": kind,
+        "created": report.created,
+        "error_count": len(report.errors),
+        "errors": report.errors[:MAX_REPORTED_ERRORS],
+    }
+
+
+@task("export")
+def export_file(context, kind, fmt="csv", query=None):
+    if kind not in EXPORTS or fmt not in FORMATS:
+        raise ValueError(f"Unknown export {kind!r} in {fmt!r}.")
+    extension = FORMATS[fmt][1]
+    path = f"export-{context.job.pk}.{extension}"
+    lines = 0
+    with open(files_dir() / path, "w", encoding="utf-8", newline="") as handle:
+        for line in export_lines(kind, _user(context), fmt, query or {}):
+            handle.write(line)
+            lines += 1
+            if lines % EXPORT_PROGRESS_LINES == 0:
+                context.progress(lines=lines)
+    return {"path": path, "filename": f"{kind}.{extension}", "lines": lines}
+
+
+def _delete(context, model, pk, delete, chunk_size):
+    obj = model.objects.filter(pk=pk, user_id=context.job.user_id).first()
+    if obj is None:
+        # Already gone, perhaps by an earlier attempt.
+        return {}
+    deleted = delete(
+        obj,
+        chunk_size=chunk_size,
+        progress=lambda label, count: context.progress(**{label: count}),
+    )
+    return dict(deleted)
+
+
+@task("delete_client")
+def delete_client(context, pk, chunk_size=bulk.DELETE_CHUNK_SIZE):
+    return _delete(context, Client, pk, bulk.delete_client, chunk_size)
+
+
+@task("delete_project")
+def delete_project(context, pk, chunk_size=bulk.DELETE_CHUNK_SIZE):
+    return _delete(context, Project, pk, bulk.delete_project, chunk_size)
+
+
+@task("refresh_snapshots")
+def refresh_snapshots(context, as_of=None, full=False):
+    as_of = date.fromisoformat(as_of) if as_of else None
+    return {"months": snapshots.refresh_snapshots(as_of=as_of, full=full)}
+
+
+@task("mark_overdue_invoices")
+def mark_overdue_invoices(context, as_of=None, chunk_size=5000):
+    as_of = date.fromisoformat(as_of) if as_of else None
+    per_user = bulk.mark_overdue_invoices(as_of=as_of, chunk_size=chunk_size)
+    return {"invoices": sum(per_user.values()), "users": len(per_user)}
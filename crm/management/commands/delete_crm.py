@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.bulk import DELETE_CHUNK_SIZE, delete_client, delete_project
+from crm.jobs import enqueue
+from crm.models import Client, Project
+
+TARGETS = {
+    "client": (Client, delete_client),
+    "project": (Project, delete_project),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete clients or projects with everything under them, a chunk of rows per "
+        "transaction, reporting progress as it goes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(TARGETS))
+        parser.add_argument("ids", nargs="+", type=int, help="Primary keys to delete.")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=DELETE_CHUNK_SIZE,
+            help="Rows deleted per transaction.",
+        )
+        parser.add_argument(
+            "--background",
+            action="store_true",
+            help="Queue a job for manage.py run_worker instead of running now.",
+        )
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+        model, delete = TARGETS[options["kind"]]
+        objects = model.objects.filter(pk__in=options["ids"])
+        missing = set(options["ids"]) - set(objects.values_list("pk", flat=True))
+        if missing:
+            raise CommandError(
+                f"No {options['kind']} with id {', '.join(map(str, sorted(missing)))}."
+            )
+
+        if options["background"]:
+            for obj in objects.select_related("user").order_by("pk"):
+                job = enqueue(
+                    f"delete_{options['kind']}",
+                    user=obj.user,
+                    pk=obj.pk,
+                    chunk_size=options["chunk_size"],
+                )
+                self.stdout.write(f"Queued job {job.pk} to delete {options['kind']} {obj.pk}.")
+            return
+
+        def progress(label, count):
+            self.stdout.write(f"  {label}: {count}")
+
+        for obj in objects.order_by("pk"):
+            self.stdout.write(f"Deleting {options['kind']} {obj.pk} ({obj})")
+            deleted = delete(obj, chunk_size=options["chunk_size"], progress=progress)
+            self.stdout.write(
+                self.style.SUCCESS(f"Deleted {sum(deleted.values())} row(s) for {obj.pk}.")
+            )
@@ -0,0 +1,30 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.imports import BATCH_SIZE, IMPORTERS, import_csv
+
+
+class Command(BaseCommand):
+    help = "Import clients, projects or invoices for one user from a CSV file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(IMPORTERS))
+        parser.add_argument("path", help="CSV file with a header row.")
+        parser.add_argument("--user", required=True, help="Username who will own the rows.")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        try:
+            user = get_user_model().objects.get(username=options["user"])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user named {options['user']!r}.")
+        with open(options["path"], newline="", encoding="utf-8-sig") as handle:
+            report = import_csv(options["kind"], user, handle, batch_size=options["batch_size"])
+        for line, message in report.errors:
+            self.stderr.write(f"line {line}: {message}")
+        style = self.style.SUCCESS if report.ok else self.style.WARNING
+        self.stdout.write(
+            style(f"Imported {report.created} {report.kind}; {len(report.errors)} row(s) rejected.")
+        )
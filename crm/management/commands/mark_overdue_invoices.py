@@ -0,0 +1,57 @@
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.bulk import mark_overdue_invoices
+from crm.jobs import enqueue
+
+
+class Command(BaseCommand):
+    help = "Mark pending invoices whose due date has passed as overdue."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--as-of",
+            help="Treat invoices due before this date (YYYY-MM-DD) as overdue. Defaults to today.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=5000,
+            help="Range of invoice ids updated per transaction.",
+        )
+        parser.add_argument(
+            "--background",
+            action="store_true",
+            help="Queue a job for manage.py run_worker instead of running now.",
+        )
+
+    def handle(self, *args, **options):
+        as_of = None
+        if options["as_of"]:
+            try:
+                as_of = date.fromisoformat(options["as_of"])
+            except ValueError:
+                raise CommandError("--as-of must be a date in YYYY-MM-DD format.")
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+
+        if options["background"]:
+            job = enqueue(
+                "mark_overdue_invoices",
+                as_of=as_of and as_of.isoformat(),
+                chunk_size=options["chunk_size"],
+            )
+            self.stdout.write(self.style.SUCCESS(f"Queued job {job.pk}."))
+            return
+
+        per_user = mark_overdue_invoices(as_of=as_of, chunk_size=options["chunk_size"])
+        usernames = dict(
+            get_user_model().objects.filter(pk__in=per_user).values_list("pk", "username")
+        )
+        for user_id, count in sorted(per_user.items()):
+            self.stdout.write(f"{usernames.get(user_id, user_id)}: {count}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Marked {sum(per_user.values())} invoice(s) as overdue.")
+        )
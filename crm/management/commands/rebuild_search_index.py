@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from crm import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index from the CRM tables."
+
+    def handle(self, *args, **options):
+        if not search.enabled():
+            raise CommandError("The search index is only used on SQLite.")
+        counts = search.rebuild()
+        for kind, count in counts.items():
+            self.stdout.write(f"{kind}: {count}")
+        self.stdout.write(self.style.SUCCESS(f"Indexed {sum(counts.values())} object(s)."))
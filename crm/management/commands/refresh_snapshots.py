@@ -0,0 +1,47 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.jobs import enqueue
+from crm.snapshots import refresh_snapshots
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the monthly revenue and aging snapshots for the months touched "
+        "by invoice changes since the last run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--as-of",
+            help="Age receivables as of this date (YYYY-MM-DD). Defaults to today.",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Ignore the change watermark and rebuild every month.",
+        )
+        parser.add_argument(
+            "--background",
+            action="store_true",
+            help="Queue a job for manage.py run_worker instead of running now.",
+        )
+
+    def handle(self, *args, **options):
+        as_of = None
+        if options["as_of"]:
+            try:
+                as_of = date.fromisoformat(options["as_of"])
+            except ValueError:
+                raise CommandError("--as-of must be a date in YYYY-MM-DD format.")
+
+        if options["background"]:
+            job = enqueue(
+                "refresh_snapshots", as_of=as_of and as_of.isoformat(), full=options["full"]
+            )
+            self.stdout.write(self.style.SUCCESS(f"Queued job {job.pk}."))
+            return
+
+        count = refresh_snapshots(as_of=as_of, full=options["full"])
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {count} monthly snapshot(s)."))
@@ -0,0 +1,67 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.benchmarks import compare, run
+
+
+class Command(BaseCommand):
+    help = "Time every CRM view and admin changelist against the seeded benchmark data."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=10)
+        parser.add_argument(
+            "--warm-cache",
+            action="store_true",
+            help="Keep the cache between requests instead of clearing it before each one.",
+        )
+        parser.add_argument("--output", help="Write the JSON report to this file.")
+        parser.add_argument("--baseline", help="JSON report to compare against.")
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.2,
+            help="Allowed p95 slowdown against the baseline, as a fraction.",
+        )
+        parser.add_argument(
+            "--fail-on-regression",
+            action="store_true",
+            help="Exit with an error when any case regressed against the baseline.",
+        )
+
+    def handle(self, *args, **options):
+        if options["iterations"] < 1:
+            raise CommandError("--iterations must be at least 1.")
+        try:
+            report = run(
+                iterations=options["iterations"],
+                warm_cache=options["warm_cache"],
+                stdout=self.stdout if options["verbosity"] > 1 else None,
+            )
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        for name, result in report["results"].items():
+            self.stdout.write(
+                f"{name:<32} {result['status']:>3} {result['queries'] or 0:>4}q "
+                f"p50 {result['p50_ms']:>9.2f} ms  p95 {result['p95_ms']:>9.2f} ms  "
+                f"peak {result['peak_kb']:>9.1f} KiB"
+            )
+        if report["meta"]["uncovered_urls"]:
+            self.stderr.write(
+                "Not benchmarked: " + ", ".join(report["meta"]["uncovered_urls"])
+            )
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(report, output, indent=2)
+
+        if options["baseline"]:
+            with open(options["baseline"]) as baseline_file:
+                baseline = json.load(baseline_file)
+            regressions = compare(report, baseline, tolerance=options["tolerance"])
+            for regression in regressions:
+                self.stderr.write(f"Regression: {regression}")
+            if regressions and options["fail_on_regression"]:
+                raise CommandError(f"{len(regressions)} regression(s) against the baseline.")
+            if not regressions:
+                self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
@@ -0,0 +1,48 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.benchmarks import load_test
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive concurrent page views and writes against the seeded benchmark data. "
+        "Run it once per settings profile (--settings) to compare their throughput."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--duration", type=float, default=10.0, help="Seconds.")
+        parser.add_argument(
+            "--write-ratio",
+            type=float,
+            default=0.1,
+            help="Fraction of requests that add a contact log.",
+        )
+        parser.add_argument("--output", help="Write the JSON result to this file.")
+
+    def handle(self, *args, **options):
+        if options["threads"] < 1 or options["duration"] <= 0:
+            raise CommandError("--threads and --duration must be positive.")
+        if not 0 <= options["write_ratio"] <= 1:
+            raise CommandError("--write-ratio must be between 0 and 1.")
+        try:
+            result = load_test(
+                threads=options["threads"],
+                duration=options["duration"],
+                write_ratio=options["write_ratio"],
+            )
+        except ValueError as error:
+            raise CommandError(str(error))
+        result["settings"] = settings.SETTINGS_MODULE
+        self.stdout.write(
+            f"{result['settings']}: {result['requests']} requests from {result['threads']} "
+            f"threads, {result['rps']} req/s, p50 {result['p50_ms']} ms, p95 {result['p95_ms']} ms"
+        )
+        for message, count in result["errors"].items():
+            self.stderr.write(f"{count} x {message}")
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(result, output, indent=2)
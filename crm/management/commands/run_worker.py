@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.jobs import work
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs in a pool of local worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            help="Jobs run side by side, one process each; 0 runs them in this "
+            "process. Defaults to CRM_JOB_CONCURRENCY.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit when no job is due instead of waiting for more.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds between checks for new jobs.",
+        )
+
+    def handle(self, *args, **options):
+        if options["concurrency"] is not None and options["concurrency"] < 0:
+            raise CommandError("--concurrency cannot be negative.")
+        count = work(
+            concurrency=options["concurrency"],
+            once=options["once"],
+            poll_interval=options["poll_interval"],
+            log=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Ran {count} job(s)."))
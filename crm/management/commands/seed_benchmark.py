@@ -0,0 +1,34 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.benchmarks import USER_PREFIX, seed
+
+
+class Command(BaseCommand):
+    help = "Fill the database with skewed synthetic CRM data for run_benchmarks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=50, help="Number of benchmark users.")
+        parser.add_argument(
+            "--max-invoices",
+            type=int,
+            default=100_000,
+            help="Invoices for the largest user; the others fall off with a power law.",
+        )
+        parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+
+    def handle(self, *args, **options):
+        if options["users"] < 1 or options["max_invoices"] < 1:
+            raise CommandError("--users and --max-invoices must be at least 1.")
+        if get_user_model().objects.filter(username__startswith=USER_PREFIX).exists():
+            raise CommandError("Benchmark users already exist; seed into a fresh database.")
+        totals = seed(
+            users=options["users"],
+            max_invoices=options["max_invoices"],
+            seed_value=options["seed"],
+            stdout=self.stdout,
+        )
+        invoices = sum(counts["invoices"] for counts in totals.values())
+        self.stdout.write(
+            self.style.SUCCESS(f"Seeded {len(totals)} user(s) with {invoices} invoice(s).")
+        )
@@ -0,0 +1,57 @@
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from crm.routers import replica_alias, synced_path
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database over the replica's file, standing in for "
+        "replication when the two are local files."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            help="File to copy to, with the time of the copy recorded in "
+            "<path>.synced. Defaults to the replica database's NAME and "
+            "CRM_REPLICA_SYNCED_PATH.",
+        )
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != "sqlite":
+            raise CommandError("sync_replica only copies SQLite databases.")
+        path = options["path"]
+        if path is None:
+            alias = replica_alias()
+            if alias is None:
+                raise CommandError("No replica is configured; set CRM_REPLICA_PATH.")
+            path = connections[alias].settings_dict["NAME"]
+            marker = getattr(settings, "CRM_REPLICA_SYNCED_PATH", None) or synced_path(path)
+        else:
+            marker = synced_path(path)
+        marker = Path(marker)
+        if str(path) == str(primary.settings_dict["NAME"]):
+            raise CommandError("The replica and the primary are the same file.")
+
+        primary.ensure_connection()
+        # Taken before the copy: writes from here on may be missing from it.
+        started = time.time()
+        target = sqlite3.connect(path)
+        try:
+            # The backup API copies a consistent snapshot while the primary
+            # stays open for reads and writes.
+            primary.connection.backup(target)
+        finally:
+            target.close()
+        partial = marker.with_name(f"{marker.name}.tmp")
+        partial.write_text(repr(started))
+        os.replace(partial, marker)
+        self.stdout.write(f"Copied {primary.settings_dict['NAME']} to {path}.")
@@ -0,0 +1,68 @@
+# Generated by Django 4.2.30 on 2026-10-18 05:51
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Q, Sum
+
+
+def backfill_client_summaries(apps, schema_editor):
+    Client = apps.get_model("crm", "Client")
+    ClientSummary = apps.get_model("crm", "ClientSummary")
+    Invoice = apps.get_model("crm", "Invoice")
+    Project = apps.get_model("crm", "Project")
+
+    project_counts = dict(
+        Project.objects.order_by()
+        .values("client_id")
+        .annotate(total=Count("pk"))
+        .values_list("client_id", "total")
+    )
+    invoice_totals = {
+        row["project__client_id"]: row
+        for row in Invoice.objects.order_by()
+        .values("project__client_id")
+        .annotate(
+            total=Count("pk"),
+            billed=Sum("amount", filter=~Q(payment_status="cancelled")),
+            outstanding=Sum("amount", filter=Q(payment_status__in=["pending", "overdue"])),
+        )
+    }
+    summaries = []
+    for client_id, user_id in Client.objects.values_list("pk", "user_id").iterator():
+        totals = invoice_totals.get(client_id, {})
+        summaries.append(
+            ClientSummary(
+                client_id=client_id,
+                user_id=user_id,
+                project_count=project_counts.get(client_id, 0),
+                invoice_count=totals.get("total", 0),
+                total_billed=totals.get("billed") or 0,
+                outstanding_balance=totals.get("outstanding") or 0,
+            )
+        )
+    ClientSummary.objects.bulk_create(summaries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('crm', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClientSummary',
+            fields=[
+                ('client', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='crm.client')),
+                ('project_count', models.PositiveIntegerField(default=0)),
+                ('invoice_count', models.PositiveIntegerField(default=0)),
+                ('total_billed', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('outstanding_balance', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='client_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(backfill_client_summaries, migrations.RunPython.noop),
+    ]
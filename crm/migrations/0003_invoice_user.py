@@ -0,0 +1,60 @@
+# Generated by Django 4.2.30 on 2026-10-18 05:54
+
+from django.conf import settings
+from django.db import migrations, models, transaction
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+BACKFILL_BATCH_SIZE = 5000
+
+
+def backfill_invoice_user(apps, schema_editor):
+    Invoice = apps.get_model("crm", "Invoice")
+    Project = apps.get_model("crm", "Project")
+    owner = Subquery(Project.objects.filter(pk=OuterRef("project_id")).values("user_id")[:1])
+    last_pk = 0
+    while True:
+        batch = list(
+            Invoice.objects.filter(pk__gt=last_pk, user__isnull=True)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:BACKFILL_BATCH_SIZE]
+        )
+        if not batch:
+            break
+        with transaction.atomic(using=schema_editor.connection.alias):
+            Invoice.objects.filter(pk__in=batch).update(user_id=owner)
+        last_pk = batch[-1]
+
+
+class Migration(migrations.Migration):
+
+    # Each backfill batch commits on its own so large tables are not locked
+    # for the whole run.
+    atomic = False
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('crm', '0002_client_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='user',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='invoices', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(backfill_invoice_user, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='invoice',
+            name='user',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='invoices', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['user', 'payment_status', 'issue_date'], name='crm_invoice_user_id_27e7b3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['user', 'issue_date'], name='crm_invoice_user_id_ae4f82_idx'),
+        ),
+    ]
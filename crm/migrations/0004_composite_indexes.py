@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-18 05:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0003_invoice_user'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='project',
+            name='crm_project_status_9d26bc_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='project',
+            name='crm_project_user_id_2e4f63_idx',
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['user', 'name'], name='crm_client_user_id_bf117e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contactlog',
+            index=models.Index(fields=['user', 'client', 'contacted_at'], name='crm_contact_user_id_14d7a5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['project', 'issue_date'], name='crm_invoice_project_91d47e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['user', 'created_at'], name='crm_project_user_id_a3f184_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['user', 'status', 'created_at'], name='crm_project_user_id_f69ca2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['client', 'created_at'], name='crm_project_client__98f7f5_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 05:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0004_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='clientsummary',
+            index=models.Index(fields=['user', 'total_billed'], name='crm_clients_user_id_10cb3d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['user', 'payment_status', 'due_date', 'amount'], name='crm_invoice_user_id_d2b9ec_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['user', 'issue_date', 'payment_status', 'amount'], name='crm_invoice_user_id_5806a1_idx'),
+        ),
+    ]
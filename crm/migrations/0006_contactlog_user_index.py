@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 06:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0005_dashboard_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contactlog',
+            index=models.Index(fields=['user', 'contacted_at'], name='crm_contact_user_id_617b26_idx'),
+        ),
+    ]
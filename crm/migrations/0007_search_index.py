@@ -0,0 +1,45 @@
+from django.db import migrations
+
+CREATE_SQL = [
+    "CREATE VIRTUAL TABLE crm_search USING fts5("
+    "kind UNINDEXED, object_id UNINDEXED, owner, title, body, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+    # Weight title matches ten times body matches; kind/object_id/owner never count.
+    "INSERT INTO crm_search (crm_search, rank) VALUES ('rank', 'bm25(0, 0, 0, 10, 1)')",
+    "INSERT INTO crm_search (rowid, kind, object_id, owner, title, body) "
+    "SELECT id * 4 + 0, 'client', id, 'u' || user_id, COALESCE(name, ''), "
+    "COALESCE(company, '') || ' ' || COALESCE(email, '') || ' ' || COALESCE(phone, '') "
+    "|| ' ' || COALESCE(notes, '') FROM crm_client",
+    "INSERT INTO crm_search (rowid, kind, object_id, owner, title, body) "
+    "SELECT id * 4 + 1, 'project', id, 'u' || user_id, COALESCE(name, ''), "
+    "COALESCE(description, '') FROM crm_project",
+    "INSERT INTO crm_search (rowid, kind, object_id, owner, title, body) "
+    "SELECT id * 4 + 2, 'invoice', id, 'u' || user_id, COALESCE(number, ''), '' "
+    "FROM crm_invoice",
+    "INSERT INTO crm_search (rowid, kind, object_id, owner, title, body) "
+    "SELECT id * 4 + 3, 'contact_log', id, 'u' || user_id, '', COALESCE(notes, '') "
+    "FROM crm_contactlog",
+]
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for statement in CREATE_SQL:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS crm_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("crm", "0006_contactlog_user_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:07
+
+import crm.models
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('crm', '0007_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceSequence',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='invoice_sequence', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('prefix', models.CharField(blank=True, max_length=20)),
+                ('number_format', models.CharField(default='{prefix}{number:05d}', help_text='Python format string with {prefix} and {number}, e.g. {prefix}{number:05d}.', max_length=50, validators=[crm.models.validate_number_format])),
+                ('last_number', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0009_monthly_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contactlog',
+            index=models.Index(fields=['contacted_at'], name='crm_contact_contact_b576f3_idx'),
+        ),
+    ]
@@ -1,6 +1,6 @@
 from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, router, transaction
 from django.utils import timezone
 
 
@@ -20,6 +20,9 @@ class Client(models.Model):
     class Meta:
         ordering = ["name"]
         unique_together = ("user", "email")
+        indexes = [
+            models.Index(fields=["user", "name"]),
+        ]
 
     def __str__(self) -> str:
         return self.name
@@ -57,9 +60,12 @@ class Project(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        # Ascending on purpose: SQLite walks them backwards for the
+        # ``-created_at, -pk`` list ordering, picking up the rowid tiebreaker.
         indexes = [
-            models.Index(fields=["status"]),
-            models.Index(fields=["user"]),
+            models.Index(fields=["user", "created_at"]),
+            models.Index(fields=["user", "status", "created_at"]),
+            models.Index(fields=["client", "created_at"]),
         ]
 
     def clean(self):
@@ -84,6 +90,13 @@ class Invoice(models.Model):
         on_delete=models.CASCADE,
         related_name="invoices",
     )
+    # Copied from ``project.user`` on save so ownership checks skip the join.
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="invoices",
+        editable=False,
+    )
     amount = models.DecimalField(max_digits=12, decimal_places=2)
     payment_status = models.CharField(
         max_length=20,
@@ -93,13 +106,39 @@ class Invoice(models.Model):
     issue_date = models.DateField(default=timezone.now)
     due_date = models.DateField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Change watermark for the monthly snapshots; set by hand in set-based updates.
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ["-issue_date"]
         indexes = [
             models.Index(fields=["payment_status"]),
+            models.Index(fields=["user", "payment_status", "issue_date"]),
+            models.Index(fields=["user", "issue_date"]),
+            models.Index(fields=["project", "issue_date"]),
+            # Covering indexes for the dashboard aggregates.
+            models.Index(fields=["user", "payment_status", "due_date", "amount"]),
+            models.Index(fields=["user", "issue_date", "payment_status", "amount"]),
         ]
 
+    def save(self, *args, **kwargs):
+        if self.project_id:
+            self.user_id = self.project.user_id
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None and "project" in update_fields:
+                kwargs["update_fields"] = {*update_fields, "user"}
+        if self.number or not self.user_id:
+            super().save(*args, **kwargs)
+            return
+        from .numbering import next_invoice_number
+
+        # Numbered in the insert's transaction, so a failed insert gives the
+        # number back.
+        using = kwargs.get("using") or router.db_for_write(Invoice, instance=self)
+        with transaction.atomic(using=using):
+            self.number = next_invoice_number(self.user_id, using=using)
+            super().save(*args, **kwargs)
+
     def __str__(self) -> str:
         return f"Invoice {self.number}"
 
@@ -138,6 +177,12 @@ class ContactLog(models.Model):
 
     class Meta:
         ordering = ["-contacted_at"]
+        indexes = [
+            models.Index(fields=["user", "client", "contacted_at"]),
+            models.Index(fields=["user", "contacted_at"]),
+            # The admin's date hierarchy, across every user.
+            models.Index(fields=["contacted_at"]),
+        ]
 
     def clean(self):
         super().clean()
@@ -149,3 +194,195 @@ class ContactLog(models.Model):
 
     def __str__(self) -> str:
         return f"{self.get_contact_type_display()} with {self.client.name}"
+
+
+class ClientSummary(models.Model):
+    """
+    Per-client rollup kept current by the signal handlers in ``crm.signals``.
+
+    Read by the client list so it does not have to join projects and invoices.
+    """
+
+    client = models.OneToOneField(
+        Client,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="summary",
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="client_summaries",
+    )
+    project_count = models.PositiveIntegerField(default=0)
+    invoice_count = models.PositiveIntegerField(default=0)
+    total_billed = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    outstanding_balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "total_billed"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"Summary for client #{self.client_id}"
+
+
+def validate_number_format(value):
+    try:
+        first, second = (value.format(prefix="", number=number) for number in (1, 2))
+    except (KeyError, IndexError, ValueError) as error:
+        raise ValidationError(f"Invalid number format: {error}.")
+    if first == second:
+        raise ValidationError("The number format must include {number}.")
+
+
+class InvoiceSequence(models.Model):
+    """
+    Per-user counter behind the invoice numbers assigned by ``crm.numbering``.
+    """
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="invoice_sequence",
+    )
+    prefix = models.CharField(max_length=20, blank=True)
+    number_format = models.CharField(
+        max_length=50,
+        default="{prefix}{number:05d}",
+        validators=[validate_number_format],
+        help_text="Python format string with {prefix} and {number}, e.g. {prefix}{number:05d}.",
+    )
+    last_number = models.PositiveBigIntegerField(default=0)
+
+    def format(self, number):
+        return self.number_format.format(prefix=self.prefix, number=number)
+
+    def __str__(self) -> str:
+        return f"Invoice numbers for user #{self.user_id}"
+
+
+class ChangeToken(models.Model):
+    """
+    The user's current change token (see ``crm.cache``), replaced in the
+    transaction of every write to the user's rows. It lives in the database
+    so that writes made by other processes (commands, job workers) reach the
+    validators and cache keys of every web process.
+    """
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="change_token",
+    )
+    token = models.CharField(max_length=40)
+
+    def __str__(self) -> str:
+        return f"Change token for user #{self.user_id}"
+
+
+class MonthlySnapshot(models.Model):
+    """
+    Per-user rollup of the invoices issued in one month, rebuilt by
+    ``crm.snapshots``; the accounting report reads it instead of the invoices.
+
+    The aging columns split the month's outstanding amount by days past due
+    (or past issue, without a due date) as of ``as_of``; invoices not yet due
+    count as 0-30. ``stale`` marks rows whose invoices were deleted or moved
+    away, which the change watermark cannot see.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="monthly_snapshots",
+    )
+    month = models.DateField()
+    invoice_count = models.PositiveIntegerField(default=0)
+    billed = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    paid = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    outstanding = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    aging_0_30 = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    aging_31_60 = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    aging_61_90 = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    aging_over_90 = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    as_of = models.DateField()
+    stale = models.BooleanField(default=False)
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["month"]
+        constraints = [
+            models.UniqueConstraint(fields=["user", "month"], name="crm_snapshot_user_month"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.month:%B %Y} for user #{self.user_id}"
+
+
+class SnapshotWatermark(models.Model):
+    """
+    How far ``crm.snapshots`` has read the invoice changes: every invoice
+    updated before ``updated_at`` is reflected in the snapshots.
+    """
+
+    name = models.CharField(max_length=50, primary_key=True)
+    updated_at = models.DateTimeField()
+
+    def __str__(self) -> str:
+        return f"{self.name} up to {self.updated_at:%Y-%m-%d %H:%M:%S}"
+
+
+class Job(models.Model):
+    """
+    A unit of background work for ``crm.jobs``, run by ``manage.py run_worker``.
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = "queued", "Queued"
+        RUNNING = "running", "Running"
+        SUCCEEDED = "succeeded", "Succeeded"
+        FAILED = "failed", "Failed"
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="jobs",
+        null=True,
+        blank=True,
+    )
+    kind = models.CharField(max_length=50)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    # Not picked up before this time; pushed back after each failed attempt.
+    run_after = models.DateTimeField(default=timezone.now)
+    # The running attempt's lease: past it, another worker may take the job.
+    locked_until = models.DateTimeField(null=True, blank=True)
+    progress = models.JSONField(default=dict, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            # Claiming: due queued jobs, and running jobs whose lease ran out.
+            models.Index(fields=["status", "run_after"]),
+            models.Index(fields=["status", "locked_until"]),
+            models.Index(fields=["user", "created_at"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+    @property
+    def finished(self):
+        return self.status in (self.Status.SUCCEEDED, self.Status.FAILED)
@@ -0,0 +1,87 @@
+"""
+Server-assigned invoice numbers, drawn from one counter row per user.
+
+``next_invoice_numbers`` advances the user's ``InvoiceSequence`` with a single
+``UPDATE ... RETURNING`` and formats the values it reserved. It must run in
+the transaction that saves the invoices: if that rolls back, so does the
+counter, so the sequence has no gaps. The ``UPDATE`` takes the write lock (a
+row lock on other databases), so concurrent writers queue on it instead of
+racing for the same number. On SQLite it should be the first statement of
+its transaction, because a transaction that has already read cannot take the
+write lock after another writer commits; ``busy_timeout`` covers the wait.
+"""
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import F
+
+from .models import Invoice, InvoiceSequence
+
+# Backends whose UPDATE can return the new row.
+RETURNING_VENDORS = {"sqlite", "postgresql"}
+
+
+def default_prefix(user_id):
+    return getattr(settings, "CRM_INVOICE_NUMBER_PREFIX", "INV-{user_id}-").format(
+        user_id=user_id
+    )
+
+
+def _advance(user_id, count, using):
+    """
+    Add ``count`` to the user's counter; return the sequence with the new
+    ``last_number``.
+    """
+    connection = connections[using]
+    sequences = InvoiceSequence.objects.using(using).filter(user_id=user_id)
+    if connection.vendor in RETURNING_VENDORS:
+        quote = connection.ops.quote_name
+        sql = (
+            f"UPDATE {quote(InvoiceSequence._meta.db_table)} "
+            f"SET {quote('last_number')} = {quote('last_number')} + %s "
+            f"WHERE {quote('user_id')} = %s "
+            f"RETURNING {quote('last_number')}, {quote('prefix')}, {quote('number_format')}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [count, user_id])
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        last_number, prefix, number_format = row
+        return InvoiceSequence(
+            user_id=user_id, prefix=prefix, number_format=number_format, last_number=last_number
+        )
+    if not sequences.update(last_number=F("last_number") + count):
+        return None
+    # The UPDATE holds the row lock until the transaction ends.
+    return sequences.get()
+
+
+def next_invoice_numbers(user_id, count=1, using=DEFAULT_DB_ALIAS):
+    """
+    Reserve ``count`` consecutive invoice numbers for ``user_id`` and return
+    them formatted, in order. Values already taken by a hand-typed number are
+    skipped over; the block is topped up with further values.
+    """
+    numbers = []
+    with transaction.atomic(using=using, savepoint=False):
+        while len(numbers) < count:
+            wanted = count - len(numbers)
+            sequence = _advance(user_id, wanted, using)
+            if sequence is None:
+                InvoiceSequence.objects.using(using).bulk_create(
+                    [InvoiceSequence(user_id=user_id, prefix=default_prefix(user_id))],
+                    ignore_conflicts=True,
+                )
+                continue
+            first = sequence.last_number - wanted + 1
+            block = [sequence.format(value) for value in range(first, sequence.last_number + 1)]
+            taken = set(
+                Invoice.objects.using(using).filter(number__in=block).values_list("number", flat=True)
+            )
+            numbers.extend(number for number in block if number not in taken)
+    return numbers
+
+
+def next_invoice_number(user_id, using=DEFAULT_DB_ALIAS):
+    return next_invoice_numbers(user_id, 1, using)[0]
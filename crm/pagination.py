@@ -0,0 +1,214 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import OperationalError, connections
+from django.db.models import Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+
+class KeysetPage:
+    """
+    A single page of a keyset-paginated queryset.
+
+    Exposes the small part of Django's ``Page`` interface the templates use,
+    plus ready-made query strings for the neighbouring pages so the current
+    filters are carried along.
+    """
+
+    def __init__(self, object_list, has_next, has_previous, next_query="", previous_query=""):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_query = next_query
+        self.previous_query = previous_query
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+
+def encode_cursor(values):
+    payload = json.dumps(values, cls=DjangoJSONEncoder, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, fields):
+    """
+    Turn a cursor back into typed values using each ordering field's ``to_python``.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise Http404("Invalid page cursor.")
+    if not isinstance(values, list) or len(values) != len(fields):
+        raise Http404("Invalid page cursor.")
+    try:
+        return [field.to_python(value) for field, value in zip(fields, values)]
+    except ValidationError:
+        raise Http404("Invalid page cursor.")
+
+
+def keyset_filter(ordering, values, forward=True):
+    """
+    Build the ``WHERE`` clause selecting rows strictly after (or before) ``values``.
+
+    For ``ordering = ["-issue_date", "-pk"]`` moving forward this produces
+    ``issue_date < v0 OR (issue_date = v0 AND pk < v1)``, which the database can
+    answer with an index range scan instead of an ``OFFSET``.
+    """
+    condition = Q()
+    equal = Q()
+    for term, value in zip(ordering, values):
+        descending = term.startswith("-")
+        name = term.lstrip("-")
+        lookup = "lt" if descending == forward else "gt"
+        condition |= equal & Q(**{f"{name}__{lookup}": value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+def reverse_ordering(ordering):
+    return [term[1:] if term.startswith("-") else f"-{term}" for term in ordering]
+
+
+class KeysetPaginationMixin:
+    """
+    Cursor pagination for ``ListView`` keyed on ``keyset_ordering``.
+
+    The last term of ``keyset_ordering`` must be unique (normally ``pk``) so that
+    every row has a stable position. Pages are addressed with ``?after=`` and
+    ``?before=`` cursors instead of page numbers, so deep pages cost the same as
+    the first one.
+    """
+
+    paginate_by = 25
+    keyset_ordering = ("-pk",)
+    after_kwarg = "after"
+    before_kwarg = "before"
+
+    def get_keyset_ordering(self):
+        return list(self.keyset_ordering)
+
+    def _keyset_fields(self, model, ordering):
+        opts = model._meta
+        return [
+            opts.pk if term.lstrip("-") == "pk" else opts.get_field(term.lstrip("-"))
+            for term in ordering
+        ]
+
+    def _row_values(self, obj, ordering):
+        return [getattr(obj, term.lstrip("-")) for term in ordering]
+
+    def _page_query(self, kwarg, cursor):
+        params = self.request.GET.copy()
+        params.pop(self.after_kwarg, None)
+        params.pop(self.before_kwarg, None)
+        params[kwarg] = cursor
+        return params.urlencode()
+
+    def _keyset_window(self, queryset, page_size):
+        """
+        The ordered, sliced queryset for the requested page, plus its direction.
+        """
+        ordering = self.get_keyset_ordering()
+        fields = self._keyset_fields(queryset.model, ordering)
+        after = self.request.GET.get(self.after_kwarg)
+        before = self.request.GET.get(self.before_kwarg)
+
+        forward = not before
+        if after or before:
+            values = decode_cursor(after or before, fields)
+            queryset = queryset.filter(keyset_filter(ordering, values, forward=forward))
+        queryset = queryset.order_by(*(ordering if forward else reverse_ordering(ordering)))
+        return queryset[: page_size + 1], forward
+
+    def _keyset_page(self, rows, page_size, forward):
+        ordering = self.get_keyset_ordering()
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if forward:
+            has_next, has_previous = has_more, bool(self.request.GET.get(self.after_kwarg))
+        else:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+
+        page = KeysetPage(rows, has_next=has_next, has_previous=has_previous)
+        if rows and has_next:
+            page.next_query = self._page_query(
+                self.after_kwarg, encode_cursor(self._row_values(rows[-1], ordering))
+            )
+        if rows and has_previous:
+            page.previous_query = self._page_query(
+                self.before_kwarg, encode_cursor(self._row_values(rows[0], ordering))
+            )
+        return (None, page, page.object_list, page.has_other_pages())
+
+    def paginate_queryset(self, queryset, page_size):
+        window, forward = self._keyset_window(queryset, page_size)
+        return self._keyset_page(list(window), page_size, forward)
+
+    async def apaginate_queryset(self, queryset, page_size):
+        window, forward = self._keyset_window(queryset, page_size)
+        return self._keyset_page([row async for row in window], page_size, forward)
+
+
+def estimated_count(model, using):
+    """
+    The planner's row count for ``model``'s table, or ``None`` if it has none:
+    ``sqlite_stat1`` (kept by ``ANALYZE`` and ``PRAGMA optimize``) on SQLite,
+    ``pg_class.reltuples`` on PostgreSQL.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            try:
+                cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s", [table])
+            except OperationalError:
+                # Never analyzed, so there is no statistics table yet.
+                return None
+            # Every row of the table's statistics starts with its row count.
+            return max((int(stat.split()[0]) for (stat,) in cursor.fetchall()), default=None)
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass", [table])
+            row = cursor.fetchone()
+            return int(row[0]) if row and row[0] >= 0 else None
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that takes an unfiltered queryset's size from the database
+    statistics instead of a ``COUNT(*)`` over the whole table.
+
+    Small tables and filtered querysets, whose estimate would be wrong, are
+    still counted exactly. Past the real end the last pages come back empty.
+    """
+
+    # Tables estimated below this many rows are cheap enough to count.
+    exact_below = 10_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= self.exact_below:
+                return estimate
+        return super().count
@@ -0,0 +1,149 @@
+from datetime import date
+
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .filters import filter_snapshots
+from .models import ClientSummary, Invoice, MonthlySnapshot, Project
+
+BILLED = ~Q(payment_status=Invoice.PaymentStatus.CANCELLED)
+PAID = Q(payment_status=Invoice.PaymentStatus.PAID)
+
+AGING_COLUMNS = [
+    ("aging_0_30", "0-30 days"),
+    ("aging_31_60", "31-60 days"),
+    ("aging_61_90", "61-90 days"),
+    ("aging_over_90", "90+ days"),
+]
+
+
+class MonthStart(TruncMonth):
+    """
+    ``TruncMonth`` that stays in C on SQLite.
+
+    Django's SQLite backend implements date truncation with a Python callback,
+    which costs a round trip per row; ``strftime`` does the same in the engine.
+    """
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        sql, params = compiler.compile(self.lhs)
+        return f"strftime('%%Y-%%m-01', {sql})", params
+
+
+def months_back(today, count):
+    """
+    First day of the month ``count - 1`` months before ``today``.
+    """
+    month_index = today.year * 12 + today.month - 1 - (count - 1)
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def invoice_totals(user, today=None):
+    """
+    Billed, paid, outstanding and overdue totals for ``user``.
+
+    One grouped pass over ``payment_status`` plus a ranged query for pending
+    invoices past their due date, both answered from covering indexes.
+    """
+    today = today or timezone.localdate()
+    by_status = {
+        row["payment_status"]: row
+        for row in Invoice.objects.filter(user=user)
+        .values("payment_status")
+        .annotate(amount=Sum("amount"), count=Count("pk"))
+    }
+    late = Invoice.objects.filter(
+        user=user, payment_status=Invoice.PaymentStatus.PENDING, due_date__lt=today
+    ).aggregate(amount=Sum("amount"), count=Count("pk"))
+
+    def total(statuses, key="amount"):
+        return sum((by_status[status][key] for status in statuses if status in by_status), 0)
+
+    outstanding = [Invoice.PaymentStatus.PENDING, Invoice.PaymentStatus.OVERDUE]
+    overdue = [Invoice.PaymentStatus.OVERDUE]
+    return {
+        "billed": total([*outstanding, Invoice.PaymentStatus.PAID]),
+        "paid": total([Invoice.PaymentStatus.PAID]),
+        "outstanding": total(outstanding),
+        "outstanding_count": total(outstanding, "count"),
+        "overdue": total(overdue) + (late["amount"] or 0),
+        "overdue_count": total(overdue, "count") + late["count"],
+    }
+
+
+def revenue_by_month(user, today=None, months=12):
+    today = today or timezone.localdate()
+    return list(
+        Invoice.objects.filter(user=user, issue_date__gte=months_back(today, months))
+        .annotate(month=MonthStart("issue_date"))
+        .values("month")
+        .annotate(billed=Sum("amount", filter=BILLED), paid=Sum("amount", filter=PAID))
+        .order_by("month")
+    )
+
+
+def projects_by_status(user):
+    counts = {
+        row["status"]: row
+        for row in Project.objects.filter(user=user)
+        .values("status")
+        .annotate(count=Count("pk"), amount=Sum("amount"))
+    }
+    return [
+        {
+            "status": value,
+            "label": label,
+            "count": counts.get(value, {}).get("count", 0),
+            "amount": counts.get(value, {}).get("amount") or 0,
+        }
+        for value, label in Project.Status.choices
+    ]
+
+
+def top_clients(user, limit=5):
+    return list(
+        ClientSummary.objects.filter(user=user, total_billed__gt=0)
+        .select_related("client")
+        .order_by("-total_billed")[:limit]
+    )
+
+
+def dashboard(user, today=None):
+    """
+    Everything the dashboard shows, in five aggregate queries.
+    """
+    today = today or timezone.localdate()
+    return {
+        "totals": invoice_totals(user, today),
+        "revenue_by_month": revenue_by_month(user, today),
+        "projects_by_status": projects_by_status(user),
+        "top_clients": top_clients(user),
+    }
+
+
+def accounting_report(user, params, today=None):
+    """
+    Revenue per month and receivables aging from the monthly snapshots (see
+    ``crm.snapshots``), never the invoices themselves: the months of
+    ``params["year"]``, or the last twelve. Revenue per client comes from the
+    client summaries.
+    """
+    today = today or timezone.localdate()
+    snapshots = MonthlySnapshot.objects.filter(user=user)
+    if params.get("year"):
+        months = filter_snapshots(snapshots, params)
+    else:
+        months = snapshots.filter(month__gte=months_back(today, 12))
+    totals = snapshots.aggregate(
+        outstanding=Sum("outstanding"),
+        refreshed_at=Max("refreshed_at"),
+        **{name: Sum(name) for name, _ in AGING_COLUMNS},
+    )
+    return {
+        "months": list(months.order_by("month")),
+        "aging": [{"label": label, "amount": totals[name] or 0} for name, label in AGING_COLUMNS],
+        "outstanding": totals["outstanding"] or 0,
+        "refreshed_at": totals["refreshed_at"],
+        "client_revenue": top_clients(user, limit=20),
+    }
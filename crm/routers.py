@@ -0,0 +1,153 @@
+"""
+Read-replica routing for the list, detail and export pages.
+
+``ReplicaReadMixin`` points the ORM reads of a request at ``CRM_REPLICA_ALIAS``
+while the view runs; objects loaded there remember it, so related lookups
+made later by the template follow them. Every write, and every other page,
+stays on the primary. A user whose change token (see ``crm.cache``) says
+they wrote something the replica may not have yet reads from the primary:
+
+- When the replica is a copy refreshed by ``manage.py sync_replica``, that
+  is any write since the last copy, which the command records in
+  ``CRM_REPLICA_SYNCED_PATH``. Until the first copy everyone reads from
+  the primary.
+- Otherwise (continuous replication) it is any write in the last
+  ``CRM_REPLICA_LAG`` seconds.
+
+A token is issued before its transaction commits, so in the first case
+``CRM_REPLICA_LAG`` is also how long a write may take to commit.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from .cache import auser_token, token_timestamp, user_token
+
+_read_alias = ContextVar("crm_read_alias", default=None)
+
+
+@contextmanager
+def reading_from(alias):
+    """
+    Route reads without an instance hint to ``alias`` inside the block.
+    """
+    reset_token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(reset_token)
+
+
+def replica_alias():
+    """
+    The configured replica alias, or ``None`` when reads are not split.
+    """
+    alias = getattr(settings, "CRM_REPLICA_ALIAS", None)
+    return alias if alias in settings.DATABASES else None
+
+
+def synced_path(path):
+    """
+    The file in which ``sync_replica`` records when it copied the primary
+    to ``path``.
+    """
+    return Path(f"{path}.synced")
+
+
+def replica_synced_at():
+    """
+    When the data in the replica was copied from the primary, in seconds
+    since the epoch, or ``None`` if it never was.
+    """
+    try:
+        return float(Path(settings.CRM_REPLICA_SYNCED_PATH).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _replica_has(token):
+    written = token_timestamp(token)
+    lag = getattr(settings, "CRM_REPLICA_LAG", 5)
+    if getattr(settings, "CRM_REPLICA_SYNCED_PATH", None) is None:
+        return time.time() - written >= lag
+    synced = replica_synced_at()
+    return synced is not None and written < synced - lag
+
+
+def read_database(user_id):
+    """
+    The alias ``user_id``'s page reads should use: the replica, unless the
+    user wrote something it may not have yet.
+    """
+    alias = replica_alias()
+    if alias is None or not _replica_has(user_token(user_id)):
+        return DEFAULT_DB_ALIAS
+    return alias
+
+
+async def aread_database(user_id):
+    alias = replica_alias()
+    if alias is None or not _replica_has(await auser_token(user_id)):
+        return DEFAULT_DB_ALIAS
+    return alias
+
+
+class ReplicaRouter:
+    """
+    Writes and migrations go to the primary; reads go wherever the current
+    ``reading_from`` block says, and related-object reads follow the instance
+    they start from.
+    """
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema along with its data.
+        return db != replica_alias()
+
+
+class ReplicaReadMixin:
+    """
+    Serve a read-only view from the replica chosen by ``read_database``.
+
+    Must come after ``LoginRequiredMixin`` so that the session and user are
+    loaded from the primary. Works on sync and async views alike; streaming
+    views should pass ``self.read_db`` to ``QuerySet.using()`` themselves,
+    since their rows are read after ``dispatch`` returns.
+    """
+
+    read_db = DEFAULT_DB_ALIAS
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.view_is_async:
+            return self.adispatch_replica(request, *args, **kwargs)
+        if request.user.is_authenticated:
+            self.read_db = read_database(request.user.pk)
+        with reading_from(self.read_db):
+            return super().dispatch(request, *args, **kwargs)
+
+    async def adispatch_replica(self, request, *args, **kwargs):
+        user_id = await sync_to_async(
+            lambda: request.user.pk if request.user.is_authenticated else None
+        )()
+        if user_id is not None:
+            self.read_db = await aread_database(user_id)
+        with reading_from(self.read_db):
+            return await super().dispatch(request, *args, **kwargs)
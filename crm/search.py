@@ -0,0 +1,276 @@
+"""
+Full-text search over clients, projects, invoices and contact-log notes.
+
+On SQLite the text lives in the ``crm_search`` FTS5 table created by migration
+``0007_search_index``. Each row holds one object; its rowid is derived from the
+object's kind and primary key so it can be replaced or removed without a
+lookup, and an ``owner`` token (``u<user id>``) scopes every query to one user
+inside the index itself. The signal handlers in ``crm.signals`` keep the
+table current; ``manage.py rebuild_search_index`` regenerates it from scratch.
+
+Other database backends fall back to ``icontains`` lookups over the same
+fields, without ranking.
+"""
+
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.urls import reverse
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Client, ContactLog, Invoice, Project
+
+TABLE = "crm_search"
+DEFAULT_LIMIT = 20
+SNIPPET_TOKENS = 12
+HIGHLIGHT_START, HIGHLIGHT_END = "\x02", "\x03"
+TERM_RE = re.compile(r"\w+")
+
+
+class Document:
+    """
+    How one model is indexed: ``title`` fields rank ten times higher than
+    ``body`` fields.
+    """
+
+    def __init__(self, model, code, title, body, related=()):
+        self.model = model
+        self.code = code
+        self.title = title
+        self.body = body
+        self.related = related
+
+    def rowid(self, pk):
+        return pk * len(DOCUMENTS) + self.code
+
+    def text(self, obj, fields):
+        return " ".join(str(value) for value in (getattr(obj, name) for name in fields) if value)
+
+    def sql_text(self, fields):
+        if not fields:
+            return "''"
+        return " || ' ' || ".join(f"COALESCE({name}, '')" for name in fields)
+
+
+DOCUMENTS = {
+    "client": Document(Client, 0, ["name"], ["company", "email", "phone", "notes"]),
+    "project": Document(Project, 1, ["name"], ["description"], related=["client"]),
+    "invoice": Document(Invoice, 2, ["number"], []),
+    "contact_log": Document(ContactLog, 3, [], ["notes"], related=["client"]),
+}
+KIND_BY_MODEL = {document.model: kind for kind, document in DOCUMENTS.items()}
+
+
+def enabled():
+    return connection.vendor == "sqlite"
+
+
+def index_objects(objects):
+    """
+    Insert or replace the index rows for ``objects``.
+    """
+    if not enabled():
+        return
+    rows = []
+    for obj in objects:
+        kind = KIND_BY_MODEL[type(obj)]
+        document = DOCUMENTS[kind]
+        rows.append(
+            (
+                document.rowid(obj.pk),
+                kind,
+                obj.pk,
+                f"u{obj.user_id}",
+                document.text(obj, document.title),
+                document.text(obj, document.body),
+            )
+        )
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {TABLE} WHERE rowid = %s", [row[:1] for row in rows])
+        cursor.executemany(
+            f"INSERT INTO {TABLE} (rowid, kind, object_id, owner, title, body) "
+            "VALUES (%s, %s, %s, %s, %s, %s)",
+            rows,
+        )
+
+
+def index_object(obj):
+    index_objects([obj])
+
+
+def remove_objects(model, pks):
+    """
+    Remove the index rows of the ``model`` objects with primary keys ``pks``.
+    """
+    if not enabled() or not pks:
+        return
+    document = DOCUMENTS[KIND_BY_MODEL[model]]
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"DELETE FROM {TABLE} WHERE rowid = %s", [(document.rowid(pk),) for pk in pks]
+        )
+
+
+def remove_object(obj):
+    remove_objects(type(obj), [obj.pk])
+
+
+def rebuild():
+    """
+    Regenerate the whole index with one ``INSERT ... SELECT`` per kind and
+    return the number of rows indexed per kind.
+    """
+    if not enabled():
+        return {}
+    counts = {}
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+        for kind, document in DOCUMENTS.items():
+            cursor.execute(
+                f"INSERT INTO {TABLE} (rowid, kind, object_id, owner, title, body) "
+                f"SELECT id * {len(DOCUMENTS)} + {document.code}, %s, id, 'u' || user_id, "
+                f"{document.sql_text(document.title)}, {document.sql_text(document.body)} "
+                f"FROM {document.model._meta.db_table}",
+                [kind],
+            )
+            counts[kind] = cursor.rowcount
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+    return counts
+
+
+def match_expression(user_id, query):
+    """
+    Turn free text into an FTS5 query: every word must appear as a prefix in
+    the title or body, and only the user's rows can match. Returns ``None``
+    when the query has no searchable words.
+    """
+    words = _prefix_words(query)
+    if words is None:
+        return None
+    return f"owner : u{user_id} AND {{title body}} : ({words})"
+
+
+def _prefix_words(query):
+    terms = TERM_RE.findall(query)
+    if not terms:
+        return None
+    return " AND ".join(f'"{term}"*' for term in terms)
+
+
+def matching_ids(kind, query, columns=("title", "body")):
+    """
+    A subquery of the ``kind`` object ids whose ``columns`` contain every
+    word of ``query`` as a prefix, across all users, for use in a ``pk__in``
+    filter; ``None`` when the query has no searchable words. For the admin,
+    which searches every user's rows.
+    """
+    words = _prefix_words(query)
+    if words is None:
+        return None
+    return RawSQL(
+        f"SELECT object_id FROM {TABLE} WHERE {TABLE} MATCH %s AND kind = %s",
+        [f"{{{' '.join(columns)}}} : ({words})", kind],
+    )
+
+
+class SearchHit:
+    def __init__(self, kind, obj, snippet=""):
+        self.kind = kind
+        self.object = obj
+        self.snippet_raw = snippet
+
+    @property
+    def label(self):
+        return self.kind.replace("_", " ").capitalize()
+
+    @property
+    def title(self):
+        if self.kind == "contact_log":
+            return f"{self.object.get_contact_type_display()} with {self.object.client.name}"
+        return str(self.object)
+
+    @property
+    def url(self):
+        if self.kind == "contact_log":
+            return reverse("client-detail", args=[self.object.client_id])
+        return reverse(f"{self.kind}-detail", args=[self.object.pk])
+
+    @property
+    def snippet(self):
+        return self.snippet_raw.replace(HIGHLIGHT_START, "").replace(HIGHLIGHT_END, "")
+
+    @property
+    def snippet_html(self):
+        html = escape(self.snippet_raw)
+        return mark_safe(html.replace(HIGHLIGHT_START, "<mark>").replace(HIGHLIGHT_END, "</mark>"))
+
+
+def _load_hits(user, ranked):
+    """
+    Fetch the objects for ``(kind, pk, snippet)`` rows with one query per kind,
+    keeping the ranked order.
+    """
+    ids = {}
+    for kind, pk, _ in ranked:
+        ids.setdefault(kind, []).append(pk)
+    objects = {}
+    for kind, pks in ids.items():
+        document = DOCUMENTS[kind]
+        queryset = document.model.objects.filter(user=user, pk__in=pks)
+        for obj in queryset.select_related(*document.related):
+            objects[kind, obj.pk] = obj
+    return [
+        SearchHit(kind, objects[kind, pk], snippet)
+        for kind, pk, snippet in ranked
+        if (kind, pk) in objects
+    ]
+
+
+def _fallback_search(user, query, kinds, limit):
+    terms = TERM_RE.findall(query)
+    if not terms:
+        return []
+    ranked = []
+    for kind in kinds:
+        document = DOCUMENTS[kind]
+        condition = Q()
+        for term in terms:
+            term_match = Q()
+            for name in document.title + document.body:
+                term_match |= Q(**{f"{name}__icontains": term})
+            condition &= term_match
+        pks = document.model.objects.filter(condition, user=user).values_list("pk", flat=True)
+        ranked.extend((kind, pk, "") for pk in pks.order_by("-pk")[:limit])
+    return _load_hits(user, ranked[:limit])
+
+
+def search(user, query, kinds=None, limit=DEFAULT_LIMIT):
+    """
+    Return up to ``limit`` ``SearchHit`` objects for ``user``, best match first.
+    """
+    kinds = [kind for kind in (kinds or DOCUMENTS) if kind in DOCUMENTS]
+    if not kinds:
+        return []
+    if not enabled():
+        return _fallback_search(user, query, kinds, limit)
+    expression = match_expression(user.pk, query)
+    if expression is None:
+        return []
+    kind_filter = ""
+    params = [HIGHLIGHT_START, HIGHLIGHT_END, SNIPPET_TOKENS, expression]
+    if len(kinds) < len(DOCUMENTS):
+        kind_filter = f" AND kind IN ({', '.join(['%s'] * len(kinds))})"
+        params.extend(kinds)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT kind, object_id, snippet({TABLE}, 4, %s, %s, '…', %s) FROM {TABLE} "
+            f"WHERE {TABLE} MATCH %s{kind_filter} ORDER BY rank LIMIT %s",
+            [*params, limit],
+        )
+        ranked = cursor.fetchall()
+    return _load_hits(user, ranked)
@@ -0,0 +1,156 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import search, snapshots
+from .cache import touch_user
+from .models import Client, ClientSummary, ContactLog, Invoice, Project
+from .summaries import refresh_client_summaries
+
+
+def _project_client_id(project_id):
+    return Project.objects.filter(pk=project_id).values_list("client_id", flat=True).first()
+
+
+def _cascaded_from(origin, *models):
+    """
+    True when a delete was started on one of ``models`` and reached us through
+    a cascade; the handler for the origin refreshes everything once instead.
+    """
+    return origin is not None and isinstance(origin, models)
+
+
+@receiver(post_save, sender=Client)
+def create_client_summary(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        ClientSummary.objects.get_or_create(client=instance, defaults={"user_id": instance.user_id})
+
+
+@receiver(pre_save, sender=Project)
+def remember_project_owner(sender, instance, raw=False, **kwargs):
+    instance._previous_client_id = instance._previous_user_id = None
+    if instance.pk and not raw:
+        previous = Project.objects.filter(pk=instance.pk).values_list("client_id", "user_id").first()
+        if previous:
+            instance._previous_client_id, instance._previous_user_id = previous
+
+
+@receiver(pre_save, sender=Invoice)
+def remember_invoice_owner(sender, instance, raw=False, **kwargs):
+    instance._previous_client_id = instance._previous_user_id = None
+    instance._previous_issue_date = None
+    if instance.pk and not raw:
+        previous = (
+            Invoice.objects.filter(pk=instance.pk)
+            .values_list("project__client_id", "user_id", "issue_date")
+            .first()
+        )
+        if previous:
+            (
+                instance._previous_client_id,
+                instance._previous_user_id,
+                instance._previous_issue_date,
+            ) = previous
+
+
+@receiver(post_save, sender=Project)
+def sync_invoice_owner(sender, instance, raw=False, **kwargs):
+    previous_user_id = getattr(instance, "_previous_user_id", None)
+    if not raw and previous_user_id and previous_user_id != instance.user_id:
+        invoices = Invoice.objects.filter(project=instance)
+        snapshots.mark_invoices_stale(invoices)
+        invoices.update(user_id=instance.user_id, updated_at=timezone.now())
+        search.index_objects(Invoice.objects.filter(project=instance))
+
+
+@receiver(post_save, sender=Project)
+def refresh_summary_on_project_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_client_summaries(
+            [instance.client_id, getattr(instance, "_previous_client_id", None)]
+        )
+
+
+@receiver(post_delete, sender=Project)
+def refresh_summary_on_project_delete(sender, instance, origin=None, **kwargs):
+    if not _cascaded_from(origin, Client):
+        refresh_client_summaries([instance.client_id])
+
+
+@receiver(post_save, sender=Invoice)
+def refresh_summary_on_invoice_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_client_summaries(
+            [
+                _project_client_id(instance.project_id),
+                getattr(instance, "_previous_client_id", None),
+            ]
+        )
+
+
+@receiver(post_delete, sender=Invoice)
+def refresh_summary_on_invoice_delete(sender, instance, origin=None, **kwargs):
+    if _cascaded_from(origin, Client, Project):
+        return
+    refresh_client_summaries([_project_client_id(instance.project_id)])
+
+
+@receiver(post_save, sender=Invoice)
+def mark_snapshot_on_invoice_move(sender, instance, raw=False, **kwargs):
+    # The month an invoice moved to is found through ``updated_at``; the one
+    # it left is not.
+    previous_user_id = getattr(instance, "_previous_user_id", None)
+    if raw or not previous_user_id:
+        return
+    previous = (previous_user_id, snapshots.month_of(instance._previous_issue_date))
+    if previous != (instance.user_id, snapshots.month_of(instance.issue_date)):
+        snapshots.mark_stale([previous])
+
+
+@receiver(post_delete, sender=Invoice)
+def mark_snapshot_on_invoice_delete(sender, instance, **kwargs):
+    snapshots.mark_stale([(instance.user_id, instance.issue_date)])
+
+
+@receiver(post_save, sender=Client)
+@receiver(post_save, sender=Project)
+@receiver(post_save, sender=Invoice)
+@receiver(post_save, sender=ContactLog)
+def invalidate_user_cache_on_save(sender, instance, **kwargs):
+    touch_user(instance.user_id)
+    previous_user_id = getattr(instance, "_previous_user_id", None)
+    if previous_user_id and previous_user_id != instance.user_id:
+        touch_user(previous_user_id)
+
+
+@receiver(post_delete, sender=Client)
+@receiver(post_delete, sender=Project)
+@receiver(post_delete, sender=Invoice)
+@receiver(post_delete, sender=ContactLog)
+def invalidate_user_cache_on_delete(sender, instance, origin=None, **kwargs):
+    if origin is not instance and _cascaded_from(origin, Client, Project):
+        return
+    user_model = get_user_model()
+    if isinstance(origin, user_model) or getattr(origin, "model", None) is user_model:
+        # The whole account is going, change token included.
+        return
+    touch_user(instance.user_id)
+
+
+@receiver(post_save, sender=Client)
+@receiver(post_save, sender=Project)
+@receiver(post_save, sender=Invoice)
+@receiver(post_save, sender=ContactLog)
+def update_search_index(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_object(instance)
+
+
+@receiver(post_delete, sender=Client)
+@receiver(post_delete, sender=Project)
+@receiver(post_delete, sender=Invoice)
+@receiver(post_delete, sender=ContactLog)
+def remove_from_search_index(sender, instance, **kwargs):
+    # Cascaded deletes are handled row by row: the index has no foreign keys.
+    search.remove_object(instance)
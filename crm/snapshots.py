@@ -0,0 +1,172 @@
+"""
+Monthly revenue and receivables-aging snapshots for the accounting report.
+
+``refresh_snapshots`` recomputes only the ``(user, month)`` rows that can have
+changed since its last run:
+
+- months of invoices whose ``updated_at`` passed the stored watermark;
+- rows marked ``stale`` because invoices left them (deleted, or moved to
+  another month or user), which no ``updated_at`` can show;
+- rows with money outstanding whose aging is as of an earlier day.
+
+The watermark is set a little before the refresh started, so an invoice
+committed while it ran is picked up again next time rather than missed.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.db.models import Count, DecimalField, Exists, OuterRef, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cache import touch_user
+from .models import Invoice, MonthlySnapshot, SnapshotWatermark
+from .reports import AGING_COLUMNS, BILLED, PAID, MonthStart
+from .summaries import OUTSTANDING_STATUSES, REFRESH_CHUNK_SIZE
+
+WATERMARK = "monthly"
+# Longer than any transaction that saves invoices.
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+# Days past due covered by each of ``reports.AGING_COLUMNS``.
+AGING_BUCKETS = dict(
+    zip([name for name, _ in AGING_COLUMNS], [(None, 30), (31, 60), (61, 90), (91, None)])
+)
+
+
+def month_of(day):
+    # ``issue_date`` defaults to ``timezone.now``, a datetime, until reloaded.
+    return models.DateField().to_python(day).replace(day=1)
+
+
+def next_month(month):
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+def mark_stale(keys):
+    """
+    Flag the snapshot rows for ``keys``, ``(user_id, month)`` pairs, for the
+    next refresh.
+    """
+    by_user = defaultdict(set)
+    for user_id, month in keys:
+        if user_id and month:
+            by_user[user_id].add(month_of(month))
+    for user_id, months in by_user.items():
+        MonthlySnapshot.objects.filter(user_id=user_id, month__in=months).update(stale=True)
+
+
+def mark_invoices_stale(invoices):
+    """
+    ``mark_stale`` for the months of ``invoices``, in one ``UPDATE``; call
+    before deleting or moving them with a set-based statement.
+    """
+    invoices = invoices.order_by()
+    months = invoices.annotate(invoice_month=MonthStart("issue_date")).filter(
+        user_id=OuterRef("user_id"), invoice_month=OuterRef("month")
+    )
+    MonthlySnapshot.objects.filter(
+        Exists(months), user_id__in=invoices.values("user_id")
+    ).update(stale=True)
+
+
+def _money(condition):
+    return Coalesce(
+        Sum("amount", filter=condition),
+        Value(0),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+
+
+def _aging(as_of, low, high):
+    condition = Q(payment_status__in=OUTSTANDING_STATUSES)
+    if low is not None:
+        condition &= Q(aged_from__lte=as_of - timedelta(days=low))
+    if high is not None:
+        condition &= Q(aged_from__gt=as_of - timedelta(days=high + 1))
+    return _money(condition)
+
+
+def _compute(user_id, months, as_of):
+    """
+    Snapshot rows for ``user_id``'s ``months``, from one grouped query.
+    """
+    months = sorted(months)
+    rows = (
+        Invoice.objects.filter(
+            user_id=user_id, issue_date__gte=months[0], issue_date__lt=next_month(months[-1])
+        )
+        .annotate(month=MonthStart("issue_date"), aged_from=Coalesce("due_date", "issue_date"))
+        .filter(month__in=months)
+        .values("month")
+        .annotate(
+            invoice_count=Count("pk"),
+            billed=_money(BILLED),
+            paid=_money(PAID),
+            outstanding=_money(Q(payment_status__in=OUTSTANDING_STATUSES)),
+            **{name: _aging(as_of, low, high) for name, (low, high) in AGING_BUCKETS.items()},
+        )
+        .order_by()
+    )
+    return [MonthlySnapshot(user_id=user_id, as_of=as_of, **row) for row in rows]
+
+
+def changed_months(since, as_of):
+    """
+    The ``(user_id, month)`` pairs whose snapshot rows need recomputing.
+    """
+    keys = set(
+        MonthlySnapshot.objects.filter(
+            Q(stale=True) | Q(outstanding__gt=0, as_of__lt=as_of)
+        ).values_list("user_id", "month")
+    )
+    invoices = Invoice.objects.all()
+    if since is not None:
+        invoices = invoices.filter(updated_at__gte=since)
+    keys.update(
+        invoices.order_by()
+        .annotate(month=MonthStart("issue_date"))
+        .values_list("user_id", "month")
+        .distinct()
+    )
+    return keys
+
+
+def rebuild(keys, as_of):
+    """
+    Replace the snapshot rows for ``keys`` with freshly computed ones; months
+    left without invoices lose their row.
+    """
+    by_user = defaultdict(set)
+    for user_id, month in keys:
+        by_user[user_id].add(month)
+    for user_id, months in by_user.items():
+        months = sorted(months)
+        for start in range(0, len(months), REFRESH_CHUNK_SIZE):
+            chunk = months[start : start + REFRESH_CHUNK_SIZE]
+            with transaction.atomic():
+                MonthlySnapshot.objects.filter(user_id=user_id, month__in=chunk).delete()
+                MonthlySnapshot.objects.bulk_create(_compute(user_id, chunk, as_of))
+        # New validators for the user's report page.
+        touch_user(user_id)
+
+
+def refresh_snapshots(as_of=None, full=False):
+    """
+    Bring the snapshots up to date and return how many ``(user, month)``
+    rows were recomputed. ``full`` ignores the watermark and rebuilds all.
+    """
+    as_of = as_of or timezone.localdate()
+    started = timezone.now()
+    watermark = SnapshotWatermark.objects.filter(name=WATERMARK).first()
+    since = None if full or watermark is None else watermark.updated_at
+    keys = changed_months(since, as_of)
+    if full:
+        keys.update(MonthlySnapshot.objects.values_list("user_id", "month"))
+    rebuild(keys, as_of)
+    SnapshotWatermark.objects.update_or_create(
+        name=WATERMARK, defaults={"updated_at": started - WATERMARK_OVERLAP}
+    )
+    return len(keys)
@@ -0,0 +1,45 @@
+"""
+SQLite connection tuning, switched on by ``config.settings_production``.
+
+``CRM_SQLITE_PRAGMAS`` is applied to every new SQLite connection, and with
+persistent connections (``CONN_MAX_AGE``) each one runs ``PRAGMA optimize``
+at the end of a request once every ``CRM_SQLITE_OPTIMIZE_INTERVAL`` seconds,
+as SQLite recommends for long-lived connections. Both go straight to the
+driver connection, so they do not count against the request query budgets.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    for name, value in getattr(settings, "CRM_SQLITE_PRAGMAS", {}).items():
+        connection.connection.execute(f"PRAGMA {name} = {value}")
+    connection.crm_optimized_at = time.monotonic()
+
+
+def optimize(connection):
+    connection.connection.execute("PRAGMA optimize")
+    connection.crm_optimized_at = time.monotonic()
+
+
+@receiver(request_finished)
+def optimize_periodically(sender, **kwargs):
+    interval = getattr(settings, "CRM_SQLITE_OPTIMIZE_INTERVAL", None)
+    if not interval:
+        return
+    now = time.monotonic()
+    for connection in connections.all(initialized_only=True):
+        # Connections that close_old_connections just closed have nothing to tune.
+        if connection.vendor != "sqlite" or connection.connection is None:
+            continue
+        if now - getattr(connection, "crm_optimized_at", now) >= interval:
+            optimize(connection)
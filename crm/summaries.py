@@ -0,0 +1,74 @@
+from django.db.models import Count, DecimalField, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import ClientSummary, Invoice, Project
+
+OUTSTANDING_STATUSES = (Invoice.PaymentStatus.PENDING, Invoice.PaymentStatus.OVERDUE)
+
+# Keeps the ``IN (...)`` list well under every backend's parameter limit.
+REFRESH_CHUNK_SIZE = 500
+
+
+def _per_client(queryset, client_field, aggregate, output_field):
+    """
+    Correlated subquery computing ``aggregate`` for the summary's client.
+    """
+    subquery = (
+        queryset.filter(**{client_field: OuterRef("client_id")})
+        .order_by()
+        .values(client_field)
+        .annotate(value=aggregate)
+        .values("value")
+    )
+    return Coalesce(Subquery(subquery, output_field=output_field), Value(0), output_field=output_field)
+
+
+def refresh_client_summaries(client_ids):
+    """
+    Recompute the rollups for ``client_ids`` with one set-based ``UPDATE``
+    per chunk of ids.
+
+    Only existing summary rows are updated; rows are created together with
+    their client, so a refresh racing a cascade delete never resurrects one.
+    """
+    client_ids = sorted({client_id for client_id in client_ids if client_id})
+    if not client_ids:
+        return
+    money = DecimalField(max_digits=14, decimal_places=2)
+    invoices = Invoice.objects.all()
+    values = {
+        "project_count": _per_client(
+            Project.objects.all(), "client_id", Count("pk"), IntegerField()
+        ),
+        "invoice_count": _per_client(
+            invoices, "project__client_id", Count("pk"), IntegerField()
+        ),
+        "total_billed": _per_client(
+            invoices,
+            "project__client_id",
+            Sum("amount", filter=~Q(payment_status=Invoice.PaymentStatus.CANCELLED)),
+            money,
+        ),
+        "outstanding_balance": _per_client(
+            invoices,
+            "project__client_id",
+            Sum("amount", filter=Q(payment_status__in=OUTSTANDING_STATUSES)),
+            money,
+        ),
+        "updated_at": timezone.now(),
+    }
+    for start in range(0, len(client_ids), REFRESH_CHUNK_SIZE):
+        chunk = client_ids[start : start + REFRESH_CHUNK_SIZE]
+        ClientSummary.objects.filter(client_id__in=chunk).update(**values)
+
+
+def create_client_summaries(clients):
+    """
+    Create empty summary rows for freshly inserted ``clients`` and fill them in.
+    """
+    ClientSummary.objects.bulk_create(
+        [ClientSummary(client_id=client.pk, user_id=client.user_id) for client in clients],
+        ignore_conflicts=True,
+    )
+    refresh_client_summaries(client.pk for client in clients)
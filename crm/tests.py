@@ -1,10 +1,67 @@
+import csv
+import json
+import os
+import random
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib import messages
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
-from django.test import TestCase
-from django.urls import reverse
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import Sum
+from django.http import Http404
+from django.test import (
+    AsyncRequestFactory,
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
 from django.utils import timezone
 
-from crm.models import Client, ContactLog, Invoice, Project
+from crm import async_views, benchmarks, bulk, jobs, reports, search, snapshots, sqlite
+from crm.api import RESOURCES
+from crm.cache import cached_for_user, remembering_tokens, touch_user, user_token
+from crm.exports import EXPORTS
+from crm.forms import ContactLogForm, InvoiceForm
+from crm.imports import import_csv
+from crm.instrumentation import (
+    QueryBudgetExceeded,
+    RequestMetrics,
+    percentile,
+    recording,
+    registry,
+)
+from crm.models import (
+    Client,
+    ClientSummary,
+    ContactLog,
+    Invoice,
+    InvoiceSequence,
+    Job,
+    MonthlySnapshot,
+    Project,
+    validate_number_format,
+)
+from crm.numbering import next_invoice_number, next_invoice_numbers
+from crm.pagination import EstimatedCountPaginator, encode_cursor
+from crm.routers import ReplicaRouter, read_database, reading_from, replica_synced_at
+from crm.views import ClientInvoicesView, InvoiceListView
 
 
 class ModelTests(TestCase):
@@ -73,6 +130,7 @@ class ModelTests(TestCase):
             dup.full_clean()
 
 
+@override_settings(CRM_QUERY_BUDGETS_STRICT=True)
 class ViewTests(TestCase):
     def setUp(self):
         User = get_user_model()
@@ -160,3 +218,1967 @@ class ViewTests(TestCase):
         response = self.client.get(reverse("invoice-list"))
         self.assertContains(response, self.invoice_alice.number)
         self.assertNotContains(response, self.invoice_bob.number)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="alice", password="pass1234")
+        for index in range(30):
+            Client.objects.create(
+                user=self.user, name=f"Client {index:02d}", email=f"c{index}@example.com"
+            )
+        self.project = Project.objects.create(
+            user=self.user, client=Client.objects.get(name="Client 00"), name="Site", amount=100
+        )
+        today = timezone.now().date()
+        for index in range(30):
+            Invoice.objects.create(
+                number=f"INV-{index:02d}",
+                project=self.project,
+                amount=10,
+                issue_date=today - timezone.timedelta(days=index // 2),
+                payment_status=(
+                    Invoice.PaymentStatus.PAID if index % 3 == 0 else Invoice.PaymentStatus.PENDING
+                ),
+            )
+        self.client.force_login(self.user)
+
+    def test_client_list_pages_forward_and_back(self):
+        response = self.client.get(reverse("client-list"))
+        names = [client.name for client in response.context["clients"]]
+        self.assertEqual(names, [f"Client {index:02d}" for index in range(25)])
+        page = response.context["page_obj"]
+        self.assertTrue(page.has_next())
+        self.assertFalse(page.has_previous())
+
+        response = self.client.get(f"{reverse('client-list')}?{page.next_query}")
+        names = [client.name for client in response.context["clients"]]
+        self.assertEqual(names, [f"Client {index:02d}" for index in range(25, 30)])
+        page = response.context["page_obj"]
+        self.assertFalse(page.has_next())
+
+        response = self.client.get(f"{reverse('client-list')}?{page.previous_query}")
+        names = [client.name for client in response.context["clients"]]
+        self.assertEqual(names, [f"Client {index:02d}" for index in range(25)])
+
+    def test_invoice_pages_cover_every_row_once_with_filter(self):
+        seen = []
+        query = "payment_status=pending"
+        while True:
+            response = self.client.get(f"{reverse('invoice-list')}?{query}")
+            seen.extend(invoice.number for invoice in response.context["invoices"])
+            page = response.context["page_obj"]
+            if not page.has_next():
+                break
+            self.assertIn("payment_status=pending", page.next_query)
+            query = page.next_query
+        expected = list(
+            Invoice.objects.filter(payment_status=Invoice.PaymentStatus.PENDING)
+            .order_by("-issue_date", "-pk")
+            .values_list("number", flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get(reverse("project-list"), {"after": "not-a-cursor"})
+        self.assertEqual(response.status_code, 404)
+
+
+class ClientSummaryTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="alice", password="pass1234")
+        self.acme = Client.objects.create(user=self.user, name="Acme", email="a@acme.com")
+        self.globex = Client.objects.create(user=self.user, name="Globex", email="g@globex.com")
+        self.project = Project.objects.create(
+            user=self.user, client=self.acme, name="Site", amount=500
+        )
+
+    def summary(self, client):
+        return ClientSummary.objects.get(client=client)
+
+    def test_summary_tracks_invoice_writes(self):
+        invoice = Invoice.objects.create(number="INV-1", project=self.project, amount=300)
+        Invoice.objects.create(
+            number="INV-2",
+            project=self.project,
+            amount=200,
+            payment_status=Invoice.PaymentStatus.PAID,
+        )
+        summary = self.summary(self.acme)
+        self.assertEqual(summary.project_count, 1)
+        self.assertEqual(summary.invoice_count, 2)
+        self.assertEqual(summary.total_billed, 500)
+        self.assertEqual(summary.outstanding_balance, 300)
+
+        invoice.payment_status = Invoice.PaymentStatus.CANCELLED
+        invoice.save()
+        summary = self.summary(self.acme)
+        self.assertEqual(summary.total_billed, 200)
+        self.assertEqual(summary.outstanding_balance, 0)
+
+        invoice.delete()
+        self.assertEqual(self.summary(self.acme).invoice_count, 1)
+
+    def test_moving_project_updates_both_clients(self):
+        Invoice.objects.create(number="INV-1", project=self.project, amount=300)
+        self.project.client = self.globex
+        self.project.save()
+        self.assertEqual(self.summary(self.acme).project_count, 0)
+        self.assertEqual(self.summary(self.acme).invoice_count, 0)
+        self.assertEqual(self.summary(self.globex).project_count, 1)
+        self.assertEqual(self.summary(self.globex).total_billed, 300)
+
+    def test_deleting_project_and_client_cascades_cleanly(self):
+        Invoice.objects.create(number="INV-1", project=self.project, amount=300)
+        self.project.delete()
+        self.assertEqual(self.summary(self.acme).project_count, 0)
+        self.assertEqual(self.summary(self.acme).invoice_count, 0)
+        self.acme.delete()
+        self.assertFalse(ClientSummary.objects.filter(client_id=self.acme.pk).exists())
+
+    def test_client_list_reads_counts_in_one_query(self):
+        Invoice.objects.create(number="INV-1", project=self.project, amount=300)
+        self.client.force_login(self.user)
+        cache.clear()
+        with self.assertNumQueries(4):  # session, user, change token, clients
+            response = self.client.get(reverse("client-list"))
+        acme = next(client for client in response.context["clients"] if client.pk == self.acme.pk)
+        self.assertEqual((acme.project_count, acme.invoice_count), (1, 1))
+
+    def test_client_list_status_filter_does_not_duplicate_clients(self):
+        Project.objects.create(user=self.user, client=self.acme, name="Second", amount=10)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("client-list"), {"status": Project.Status.PLANNED})
+        self.assertEqual([client.name for client in response.context["clients"]], ["Acme"])
+
+
+class InvoiceOwnerTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username="alice", password="pass1234")
+        self.other_user = User.objects.create_user(username="bob", password="pass1234")
+        client_obj = Client.objects.create(user=self.user, name="Acme", email="a@acme.com")
+        self.project = Project.objects.create(
+            user=self.user, client=client_obj, name="Site", amount=500
+        )
+        other_client = Client.objects.create(user=self.other_user, name="Bob", email="b@b.com")
+        self.other_project = Project.objects.create(
+            user=self.other_user, client=other_client, name="Other", amount=100
+        )
+
+    def test_owner_copied_from_project(self):
+        invoice = Invoice.objects.create(number="INV-1", project=self.project, amount=10)
+        self.assertEqual(invoice.user, self.user)
+
+    def test_owner_follows_project_move(self):
+        invoice = Invoice.objects.create(number="INV-1", project=self.project, amount=10)
+        invoice.project = self.other_project
+        invoice.save(update_fields=["project"])
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.user, self.other_user)
+
+    def test_owner_follows_project_reassignment(self):
+        invoice = Invoice.objects.create(number="INV-1", project=self.project, amount=10)
+        self.project.user = self.other_user
+        self.project.save()
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.user, self.other_user)
+
+    def test_invoice_views_scope_without_project_join(self):
+        invoice = Invoice.objects.create(number="INV-1", project=self.project, amount=10)
+        self.client.force_login(self.other_user)
+        response = self.client.get(reverse("invoice-detail", args=[invoice.pk]))
+        self.assertEqual(response.status_code, 404)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("invoice-detail", args=[invoice.pk]))
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(CRM_QUERY_BUDGETS_STRICT=True)
+class QueryPlanTests(TestCase):
+    """
+    Runs ``EXPLAIN QUERY PLAN`` over every SELECT a view issues and fails when
+    SQLite resorts to a full table scan or a temporary B-tree to sort.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        today = timezone.now().date()
+        cls.user = User.objects.create_user(username="alice", password="pass1234")
+        for owner in [cls.user, User.objects.create_user(username="bob", password="pass1234")]:
+            for client_index in range(6):
+                client_obj = Client.objects.create(
+                    user=owner,
+                    name=f"{owner.username} client {client_index}",
+                    email=f"{owner.username}{client_index}@example.com",
+                )
+                for project_index in range(3):
+                    project = Project.objects.create(
+                        user=owner,
+                        client=client_obj,
+                        name=f"Project {project_index}",
+                        amount=100,
+                        status=Project.Status.values[project_index],
+                    )
+                    for invoice_index in range(3):
+                        Invoice.objects.create(
+                            number=f"{owner.username}-{client_index}-{project_index}-{invoice_index}",
+                            project=project,
+                            amount=50,
+                            issue_date=today - timezone.timedelta(days=invoice_index * 20),
+                            payment_status=Invoice.PaymentStatus.values[invoice_index],
+                        )
+                    ContactLog.objects.create(
+                        user=owner, client=client_obj, project=project, notes="Call"
+                    )
+        cls.client_obj = Client.objects.filter(user=cls.user).first()
+        cls.project = Project.objects.filter(user=cls.user).first()
+        cls.invoice = Invoice.objects.filter(user=cls.user).first()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def view_urls(self):
+        client_pk, project_pk, invoice_pk = self.client_obj.pk, self.project.pk, self.invoice.pk
+        return [
+            reverse("home"),
+            reverse("reports"),
+            reverse("reports") + "?year=2024",
+            reverse("client-list"),
+            reverse("client-list") + "?q=client&email=alice&status=planned",
+            reverse("client-detail", args=[client_pk]),
+            reverse("client-projects", args=[client_pk]),
+            reverse("client-invoices", args=[client_pk]),
+            reverse("client-contact-logs", args=[client_pk]),
+            reverse("client-create"),
+            reverse("client-update", args=[client_pk]),
+            reverse("client-delete", args=[client_pk]),
+            reverse("contactlog-create", args=[client_pk]),
+            reverse("project-list"),
+            reverse("project-list") + "?status=planned",
+            reverse("project-detail", args=[project_pk]),
+            reverse("project-create"),
+            reverse("project-update", args=[project_pk]),
+            reverse("project-delete", args=[project_pk]),
+            reverse("invoice-list"),
+            reverse("invoice-list") + "?payment_status=paid",
+            reverse("invoice-detail", args=[invoice_pk]),
+            reverse("invoice-create"),
+            reverse("invoice-update", args=[invoice_pk]),
+            reverse("invoice-delete", args=[invoice_pk]),
+            *(reverse("export", args=[kind]) for kind in EXPORTS),
+            reverse("export", args=["invoices"]) + "?payment_status=paid&format=jsonl",
+            reverse("export", args=["projects"]) + "?status=planned",
+            reverse("export", args=["contact_logs"]) + f"?client={client_pk}",
+            *(reverse("api-list", args=[kind]) for kind in RESOURCES),
+            reverse("api-list", args=["invoices"]) + "?payment_status=paid&fields=id,amount",
+            reverse("api-list", args=["clients"]) + "?status=planned",
+            reverse("api-detail", args=["invoices", invoice_pk]),
+            reverse("search") + "?q=client+call",
+            reverse("job-list"),
+            reverse("api-search") + "?q=project&kind=project",
+        ]
+
+    def plan_problems(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            details = [row[-1] for row in cursor.fetchall()]
+        return [
+            detail
+            for detail in details
+            # Full-text lookups show up as a scan answered by the FTS index.
+            if (
+                detail.startswith("SCAN ")
+                and detail != "SCAN CONSTANT ROW"
+                and "VIRTUAL TABLE INDEX" not in detail
+            )
+            or ("TEMP B-TREE" in detail and "ORDER BY" in detail)
+        ]
+
+    def assert_indexed(self, url):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+            if response.streaming:
+                b"".join(response.streaming_content)
+        self.assertLess(response.status_code, 400, url)
+        for query in captured.captured_queries:
+            if query["sql"].lstrip().upper().startswith("SELECT"):
+                self.assertEqual(self.plan_problems(query["sql"]), [], query["sql"])
+        return response
+
+    def test_view_queries_use_indexes(self):
+        for url in self.view_urls():
+            with self.subTest(url=url):
+                self.assert_indexed(url)
+
+    def test_deep_pages_use_indexes(self):
+        section_names = ["client-projects", "client-invoices", "client-contact-logs"]
+        for name in ["client-list", "project-list", "invoice-list", *section_names]:
+            with self.subTest(name=name):
+                args = [self.client_obj.pk] if name in section_names else []
+                response = self.client.get(reverse(name, args=args))
+                view = response.context["view"]
+                first_row = response.context["object_list"][0]
+                cursor = encode_cursor(view._row_values(first_row, view.get_keyset_ordering()))
+                self.assert_indexed(f"{reverse(name, args=args)}?after={cursor}")
+                self.assert_indexed(f"{reverse(name, args=args)}?before={cursor}")
+
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username="alice", password="pass1234")
+        other_user = User.objects.create_user(username="bob", password="pass1234")
+        self.today = timezone.localdate()
+        acme = Client.objects.create(user=self.user, name="Acme", email="a@acme.com")
+        globex = Client.objects.create(user=self.user, name="Globex", email="g@globex.com")
+        site = Project.objects.create(user=self.user, client=acme, name="Site", amount=1000)
+        Project.objects.create(
+            user=self.user,
+            client=globex,
+            name="App",
+            amount=400,
+            status=Project.Status.IN_PROGRESS,
+        )
+        app = Project.objects.get(name="App")
+        rows = [
+            ("INV-1", site, 300, Invoice.PaymentStatus.PAID, None),
+            ("INV-2", site, 200, Invoice.PaymentStatus.PENDING, self.today - timezone.timedelta(days=3)),
+            ("INV-3", app, 150, Invoice.PaymentStatus.PENDING, self.today + timezone.timedelta(days=3)),
+            ("INV-4", app, 50, Invoice.PaymentStatus.OVERDUE, None),
+            ("INV-5", app, 999, Invoice.PaymentStatus.CANCELLED, None),
+        ]
+        for number, project, amount, status, due_date in rows:
+            Invoice.objects.create(
+                number=number,
+                project=project,
+                amount=amount,
+                payment_status=status,
+                issue_date=self.today,
+                due_date=due_date,
+            )
+        bob_client = Client.objects.create(user=other_user, name="Bob Co", email="b@b.com")
+        Invoice.objects.create(
+            number="BOB-1",
+            project=Project.objects.create(
+                user=other_user, client=bob_client, name="Other", amount=1
+            ),
+            amount=5000,
+        )
+        self.client.force_login(self.user)
+
+    def test_home_renders_dashboard(self):
+        response = self.client.get(reverse("home"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, "crm/dashboard.html")
+
+    def test_totals_are_scoped_and_conditional(self):
+        response = self.client.get(reverse("home"))
+        totals = response.context["totals"]
+        self.assertEqual(totals["billed"], 700)
+        self.assertEqual(totals["paid"], 300)
+        self.assertEqual(totals["outstanding"], 400)
+        self.assertEqual(totals["outstanding_count"], 3)
+        self.assertEqual(totals["overdue"], 250)
+        self.assertEqual(totals["overdue_count"], 2)
+
+    def test_breakdowns(self):
+        response = self.client.get(reverse("home"))
+        months = response.context["revenue_by_month"]
+        self.assertEqual(len(months), 1)
+        self.assertEqual((months[0]["billed"], months[0]["paid"]), (700, 300))
+        statuses = {row["status"]: row["count"] for row in response.context["projects_by_status"]}
+        self.assertEqual(statuses[Project.Status.PLANNED], 1)
+        self.assertEqual(statuses[Project.Status.IN_PROGRESS], 1)
+        self.assertEqual(
+            [summary.client.name for summary in response.context["top_clients"]],
+            ["Acme", "Globex"],
+        )
+
+    def test_dashboard_uses_fixed_number_of_queries(self):
+        cache.clear()
+        with self.assertNumQueries(8):  # session, user, change token, five aggregates
+            self.client.get(reverse("home"))
+
+
+class UserCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.user = User.objects.create_user(username="alice", password="pass1234")
+        self.other_user = User.objects.create_user(username="bob", password="pass1234")
+        self.acme = Client.objects.create(user=self.user, name="Acme", email="a@acme.com")
+        self.bob_client = Client.objects.create(
+            user=self.other_user, name="Bob Co", email="b@b.com"
+        )
+        self.project = Project.objects.create(
+            user=self.user, client=self.acme, name="Site", amount=500
+        )
+        self.client.force_login(self.user)
+
+    def test_repeat_dashboard_is_served_from_cache(self):
+        self.client.get(reverse("home"))
+        with self.assertNumQueries(3):  # session, user, change token
+            self.client.get(reverse("home"))
+
+    def test_dashboard_is_recomputed_the_next_day(self):
+        self.client.get(reverse("home"))
+        tomorrow = timezone.localdate() + timezone.timedelta(days=1)
+        with mock.patch("django.utils.timezone.localdate", return_value=tomorrow):
+            with self.assertNumQueries(8):  # session, user, change token, five aggregates
+                self.client.get(reverse("home"))
+
+    def test_write_invalidates_only_that_users_entries(self):
+        compute_calls = []
+
+        def compute(user_id):
+            compute_calls.append(user_id)
+            return user_id
+
+        cached_for_user(self.user.pk, "probe", lambda: compute(self.user.pk))
+        cached_for_user(self.other_user.pk, "probe", lambda: compute(self.other_user.pk))
+        Invoice.objects.create(number="INV-1", project=self.project, amount=10)
+        cached_for_user(self.user.pk, "probe", lambda: compute(self.user.pk))
+        cached_for_user(self.other_user.pk, "probe", lambda: compute(self.other_user.pk))
+        self.assertEqual(compute_calls, [self.user.pk, self.other_user.pk, self.user.pk])
+
+    def test_dashboard_reflects_new_invoice(self):
+        self.client.get(reverse("home"))
+        Invoice.objects.create(number="INV-1", project=self.project, amount=10)
+        response = self.client.get(reverse("home"))
+        self.assertEqual(response.context["totals"]["billed"], 10)
+
+    def test_client_list_counts_refresh_after_contact_log_and_delete(self):
+        self.client.get(reverse("client-list"))
+        token = user_token(self.user.pk)
+        ContactLog.objects.create(user=self.user, client=self.acme, notes="Call")
+        self.assertNotEqual(user_token(self.user.pk), token)
+        self.project.delete()
+        response = self.client.get(reverse("client-list"))
+        self.assertEqual(response.context["clients"][0].project_count, 0)
+
+
+class OverdueSweepTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.today = timezone.localdate()
+        self.users = [
+            User.objects.create_user(username="alice", password="pass1234"),
+            User.objects.create_user(username="bob", password="pass1234"),
+        ]
+        for user in self.users:
+            client_obj = Client.objects.create(user=user, name="Acme", email=f"{user}@acme.com")
+            project = Project.objects.create(user=user, client=client_obj, name="Site", amount=1)
+            for index, (status, days) in enumerate(
+                [
+                    (Invoice.PaymentStatus.PENDING, -10),
+                    (Invoice.PaymentStatus.PENDING, -1),
+                    (Invoice.PaymentStatus.PENDING, 5),
+                    (Invoice.PaymentStatus.PAID, -10),
+                ]
+            ):
+                Invoice.objects.create(
+                    number=f"{user}-{index}",
+                    project=project,
+                    amount=10,
+                    payment_status=status,
+                    due_date=self.today + timezone.timedelta(days=days),
+                )
+        Invoice.objects.create(number="no-due-date", project=project, amount=10)
+
+    def test_marks_only_past_due_pending_invoices(self):
+        out = StringIO()
+        call_command("mark_overdue_invoices", "--chunk-size", "1", stdout=out)
+        overdue = set(
+            Invoice.objects.filter(payment_status=Invoice.PaymentStatus.OVERDUE).values_list(
+                "number", flat=True
+            )
+        )
+        self.assertEqual(overdue, {"alice-0", "alice-1", "bob-0", "bob-1"})
+        self.assertIn("alice: 2", out.getvalue())
+        self.assertIn("bob: 2", out.getvalue())
+        self.assertIn("Marked 4 invoice(s)", out.getvalue())
+
+    def test_as_of_date(self):
+        as_of = self.today - timezone.timedelta(days=5)
+        call_command("mark_overdue_invoices", "--as-of", as_of.isoformat(), stdout=StringIO())
+        self.assertEqual(
+            Invoice.objects.filter(payment_status=Invoice.PaymentStatus.OVERDUE).count(), 2
+        )
+
+    def test_invalid_as_of(self):
+        with self.assertRaises(CommandError):
+            call_command("mark_overdue_invoices", "--as-of", "yesterday", stdout=StringIO())
+
+
+@override_settings(CRM_QUERY_BUDGETS_STRICT=True)
+class BulkActionTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username="alice", password="pass1234")
+        self.other_user = User.objects.create_user(username="bob", password="pass1234")
+        self.acme = Client.objects.create(user=self.user, name="Acme", email="a@acme.com")
+        self.site = Project.objects.create(user=self.user, client=self.acme, name="Site", amount=1)
+        self.app = Project.objects.create(user=self.user, client=self.acme, name="App", amount=1)
+        self.invoices = [
+            Invoice.objects.create(number=f"INV-{index}", project=project, amount=100)
+            for index, project in enumerate([self.site, self.site, self.app])
+        ]
+        self.log = ContactLog.objects.create(
+            user=self.user, client=self.acme, project=self.site, notes="Scope call"
+        )
+        bob_client = Client.objects.create(user=self.other_user, name="Bob Co", email="b@b.com")
+        self.bob_invoice = Invoice.objects.create(
+            number="BOB-1",
+            project=Project.objects.create(
+                user=self.other_user, client=bob_client, name="Other", amount=1
+            ),
+            amount=100,
+        )
+        self.client.force_login(self.user)
+
+    def test_status_change_is_scoped_and_refreshes_summaries(self):
+        token = user_token(self.user.pk)
+        ids = [self.invoices[0].pk, self.invoices[1].pk, self.bob_invoice.pk]
+        response = self.client.post(
+            reverse("invoice-bulk") + "?payment_status=pending",
+            {"action": "paid", "ids": ids},
+        )
+        self.assertRedirects(
+            response, reverse("invoice-list") + "?payment_status=pending", target_status_code=200
+        )
+        paid = Invoice.objects.filter(payment_status=Invoice.PaymentStatus.PAID)
+        self.assertEqual(set(paid.values_list("number", flat=True)), {"INV-0", "INV-1"})
+        self.assertEqual(ClientSummary.objects.get(client=self.acme).outstanding_balance, 100)
+        self.assertNotEqual(user_token(self.user.pk), token)
+
+        # Savepoint, owners, update, summary refresh, token, release: no per-row work.
+        with self.assertNumQueries(6):
+            updated = bulk.update_invoice_status(
+                Invoice.objects.filter(user=self.user), Invoice.PaymentStatus.CANCELLED
+            )
+        self.assertEqual(updated, 3)
+        self.assertEqual(ClientSummary.objects.get(client=self.acme).total_billed, 0)
+
+    def test_select_all_applies_to_the_filtered_rows(self):
+        self.invoices[2].payment_status = Invoice.PaymentStatus.PAID
+        self.invoices[2].save()
+        response = self.client.post(
+            reverse("invoice-bulk") + "?payment_status=pending",
+            {"action": "cancelled", "select_all": "1"},
+            follow=True,
+        )
+        self.assertContains(response, "Marked 2 invoice(s) as cancelled.")
+        self.assertEqual(
+            Invoice.objects.filter(payment_status=Invoice.PaymentStatus.CANCELLED).count(), 2
+        )
+        response = self.client.post(
+            reverse("project-bulk"), {"action": "status-completed", "select_all": "1"}
+        )
+        self.assertEqual(Project.objects.filter(status=Project.Status.COMPLETED).count(), 2)
+
+    def test_empty_selection_is_rejected(self):
+        response = self.client.post(reverse("invoice-bulk"), {"action": "paid"}, follow=True)
+        self.assertContains(response, "Select at least one row.")
+        self.assertFalse(Invoice.objects.filter(payment_status=Invoice.PaymentStatus.PAID).exists())
+
+    def test_project_delete_cleans_up_related_rows(self):
+        self.client.post(
+            reverse("project-bulk"),
+            {"action": "delete", "ids": [self.site.pk, self.bob_invoice.project_id]},
+        )
+        self.assertFalse(Project.objects.filter(pk=self.site.pk).exists())
+        self.assertTrue(Project.objects.filter(pk=self.bob_invoice.project_id).exists())
+        self.assertEqual(
+            list(Invoice.objects.filter(user=self.user).values_list("number", flat=True)),
+            ["INV-2"],
+        )
+        self.log.refresh_from_db()
+        self.assertIsNone(self.log.project_id)
+        summary = ClientSummary.objects.get(client=self.acme)
+        self.assertEqual((summary.project_count, summary.invoice_count), (1, 1))
+        if search.enabled():
+            hits = {(hit.kind, hit.object.pk) for hit in search.search(self.user, "site inv")}
+            self.assertEqual(hits, set())
+
+        self.client.post(reverse("invoice-bulk"), {"action": "delete", "ids": [self.invoices[2].pk]})
+        self.assertEqual(ClientSummary.objects.get(client=self.acme).invoice_count, 0)
+
+    def test_chunked_client_delete(self):
+        calls = []
+        deleted = bulk.delete_client(
+            self.acme, chunk_size=1, progress=lambda label, count: calls.append((label, count))
+        )
+        self.assertEqual(
+            deleted,
+            {"crm.Invoice": 3, "crm.ContactLog": 1, "crm.Project": 2, "crm.Client": 1},
+        )
+        self.assertEqual(
+            calls,
+            [
+                ("crm.Invoice", 1),
+                ("crm.Invoice", 2),
+                ("crm.Invoice", 3),
+                ("crm.ContactLog", 1),
+                ("crm.Project", 1),
+                ("crm.Project", 2),
+                ("crm.Client", 1),
+            ],
+        )
+        self.assertFalse(Client.objects.filter(user=self.user).exists())
+        self.assertFalse(ClientSummary.objects.filter(user=self.user).exists())
+        self.assertEqual(list(Invoice.objects.values_list("number", flat=True)), ["BOB-1"])
+        if search.enabled():
+            self.assertEqual(search.search(self.user, "acme site scope inv"), [])
+
+    def test_delete_views_and_command_use_the_chunked_path(self):
+        response = self.client.post(reverse("project-delete", args=[self.site.pk]), follow=True)
+        self.assertRedirects(response, reverse("project-list"))
+        self.assertContains(response, "Project deleted.")
+        self.assertEqual(ClientSummary.objects.get(client=self.acme).invoice_count, 1)
+        self.log.refresh_from_db()
+        self.assertIsNone(self.log.project_id)
+
+        bob_client = self.bob_invoice.project.client
+        response = self.client.post(reverse("client-delete", args=[bob_client.pk]))
+        self.assertEqual(response.status_code, 404)
+        self.client.post(reverse("client-delete", args=[self.acme.pk]))
+        self.assertFalse(Client.objects.filter(pk=self.acme.pk).exists())
+
+        out = StringIO()
+        call_command("delete_crm", "client", str(bob_client.pk), "--chunk-size", "10", stdout=out)
+        self.assertIn("crm.Invoice: 1", out.getvalue())
+        self.assertFalse(Invoice.objects.exists())
+        with self.assertRaises(CommandError):
+            call_command("delete_crm", "project", str(self.site.pk), stdout=StringIO())
+
+    def test_admin_actions(self):
+        admin_user = get_user_model().objects.create_superuser("admin", "a@example.com", "pass")
+        self.client.force_login(admin_user)
+        url = reverse("admin:crm_invoice_changelist")
+        self.client.post(
+            url,
+            {"action": "bulk_overdue", "_selected_action": [self.invoices[0].pk, self.bob_invoice.pk]},
+        )
+        self.assertEqual(
+            Invoice.objects.filter(payment_status=Invoice.PaymentStatus.OVERDUE).count(), 2
+        )
+        self.client.post(
+            url,
+            {"action": "delete_selected", "_selected_action": [self.invoices[0].pk], "post": "yes"},
+        )
+        self.assertFalse(Invoice.objects.filter(pk=self.invoices[0].pk).exists())
+        self.assertEqual(ClientSummary.objects.get(client=self.acme).invoice_count, 2)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username="alice", password="pass1234")
+        other_user = User.objects.create_user(username="bob", password="pass1234")
+        acme = Client.objects.create(user=self.user, name="Acme", email="a@acme.com")
+        project = Project.objects.create(user=self.user, client=acme, name="Site", amount=500)
+        Invoice.objects.create(
+            number="INV-1", project=project, amount=300, payment_status=Invoice.PaymentStatus.PAID
+        )
+        Invoice.objects.create(number="INV-2", project=project, amount=200)
+        ContactLog.objects.create(user=self.user, client=acme, notes="Called, re: invoice")
+        bob_client = Client.objects.create(user=other_user, name="Bob Co", email="b@b.com")
+        Invoice.objects.create(
+            number="BOB-1",
+            project=Project.objects.create(
+                user=other_user, client=bob_client, name="Other", amount=1
+            ),
+            amount=5,
+        )
+        self.client.force_login(self.user)
+
+    def test_csv_export_streams_scoped_filtered_rows(self):
+        response = self.client.get(
+            reverse("export", args=["invoices"]), {"payment_status": "paid"}
+        )
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        rows = list(csv.reader(b"".join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0][:2], ["id", "number"])
+        self.assertEqual([row[1] for row in rows[1:]], ["INV-1"])
+        self.assertEqual(rows[1][4], "Acme")
+
+    def test_jsonl_export(self):
+        response = self.client.get(reverse("export", args=["contact_logs"]), {"format": "jsonl"})
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 1)
+        record = json.loads(lines[0])
+        self.assertEqual(record["client_name"], "Acme")
+        self.assertEqual(record["notes"], "Called, re: invoice")
+
+    def test_unknown_export_is_404(self):
+        response = self.client.get(reverse("export", args=["users"]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_management_command(self):
+        out = StringIO()
+        call_command(
+            "export_crm", "invoices", "--user", "alice", "--filter", "payment_status=pending",
+            stdout=out,
+        )
+        rows = list(csv.reader(out.getvalue().splitlines()))
+        self.assertEqual([row[1] for row in rows[1:]], ["INV-2"])
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username="alice", password="pass1234")
+        other_user = User.objects.create_user(username="bob", password="pass1234")
+        acme = Client.objects.create(user=self.user, name="Acme", email="a@acme.com")
+        project = Project.objects.create(user=self.user, client=acme, name="Site", amount=500)
+        for day in range(1, 4):
+            Invoice.objects.create(
+                number=f"INV-{day}",
+                project=project,
+                amount=100 * day,
+                issue_date=date(2024, 1, day),
+                payment_status=Invoice.PaymentStatus.PAID if day == 1 else "pending",
+            )
+        bob_client = Client.objects.create(user=other_user, name="Bob Co", email="b@b.com")
+        self.bob_project = Project.objects.create(
+            user=other_user, client=bob_client, name="Other", amount=1
+        )
+        self.client.force_login(self.user)
+        cache.clear()
+
+    def test_list_is_scoped_filtered_and_paginated(self):
+        url = reverse("api-list", args=["invoices"])
+        data = self.client.get(url, {"limit": 2, "fields": "number,amount"}).json()
+        self.assertEqual(data["results"], [
+            {"number": "INV-3", "amount": "300.00"},
+            {"number": "INV-2", "amount": "200.00"},
+        ])
+        data = self.client.get(data["next"]).json()
+        self.assertEqual([row["number"] for row in data["results"]], ["INV-1"])
+        self.assertIsNone(data["next"])
+
+        data = self.client.get(url, {"payment_status": "paid"}).json()
+        self.assertEqual([row["number"] for row in data["results"]], ["INV-1"])
+        projects = self.client.get(reverse("api-list", args=["projects"])).json()["results"]
+        self.assertEqual(len(projects), 1)
+
+    def test_unknown_field_and_other_users_rows(self):
+        response = self.client.get(reverse("api-list", args=["clients"]), {"fields": "user_id"})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse("api-detail", args=["projects", self.bob_project.pk]))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {"error": "No such object."})
+
+    def test_errors_are_json(self):
+        response = self.client.get(reverse("api-detail", args=["clients", 9999]))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {"error": "No such object."})
+        unknown = [reverse("api-list", args=["widgets"]), reverse("api-detail", args=["widgets", 1])]
+        for url in unknown:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 404)
+            self.assertEqual(response.json(), {"error": "Unknown resource."})
+        response = self.client.get(reverse("api-list", args=["clients"]), {"after": "garbage"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"error": "Invalid page cursor."})
+
+    def test_anonymous_is_forbidden(self):
+        self.client.logout()
+        response = self.client.get(reverse("api-list", args=["clients"]))
+        self.assertEqual(response.status_code, 403)
+
+    def test_conditional_requests(self):
+        url = reverse("api-list", args=["clients"])
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertIn("Last-Modified", response)
+
+        with self.assertNumQueries(3):  # session, user and change token only
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Client.objects.create(user=self.user, name="Beta", email="b@beta.com")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(response.json()["results"]), 2)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username="alice", password="pass1234")
+        self.other_user = User.objects.create_user(username="bob", password="pass1234")
+        self.acme = Client.objects.create(
+            user=self.user, name="Acme Widgets", email="ops@acme.com", notes="Prefers calls"
+        )
+        self.project = Project.objects.create(
+            user=self.user,
+            client=self.acme,
+            name="Website redesign",
+            description="New landing page for Acme",
+            amount=500,
+        )
+        ContactLog.objects.create(user=self.user, client=self.acme, notes="Discussed <b>budget</b>")
+        Client.objects.create(user=self.other_user, name="Acme Rival", email="x@rival.com")
+        self.client.force_login(self.user)
+
+    def kinds(self, query, user=None):
+        return [(hit.kind, hit.object.pk) for hit in search.search(user or self.user, query)]
+
+    def test_ranked_scoped_prefix_search(self):
+        self.assertEqual(
+            self.kinds("acme"), [("client", self.acme.pk), ("project", self.project.pk)]
+        )
+        self.assertEqual(self.kinds("budg"), [("contact_log", ContactLog.objects.get().pk)])
+        self.assertEqual(self.kinds("ops@acme.com"), [("client", self.acme.pk)])
+        self.assertEqual(self.kinds("u%d" % self.user.pk), [])
+        self.assertEqual(self.kinds("?!"), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.project.name = "Mobile app"
+        self.project.save()
+        self.assertEqual(self.kinds("mobile"), [("project", self.project.pk)])
+        self.assertEqual(self.kinds("website"), [])
+
+        self.project.user = self.other_user
+        self.project.save()
+        invoice = Invoice.objects.create(number="INV-77", project=self.project, amount=10)
+        self.assertEqual(self.kinds("inv"), [])
+        self.assertEqual(self.kinds("inv", self.other_user), [("invoice", invoice.pk)])
+
+        self.acme.delete()
+        self.assertEqual(self.kinds("acme"), [])
+        self.assertEqual(self.kinds("mobile", self.other_user), [])
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM crm_search")
+        self.assertEqual(self.kinds("acme"), [])
+        out = StringIO()
+        call_command("rebuild_search_index", stdout=out)
+        self.assertIn("Indexed 4 object(s).", out.getvalue())
+        self.assertEqual(len(self.kinds("acme")), 2)
+
+    def test_search_page_and_api(self):
+        response = self.client.get(reverse("search"), {"q": "budget"})
+        self.assertContains(response, "Discussed &lt;b&gt;<mark>budget</mark>&lt;/b&gt;", html=False)
+        self.assertContains(response, reverse("client-detail", args=[self.acme.pk]))
+
+        data = self.client.get(reverse("api-search"), {"q": "acme", "kind": "project"}).json()
+        self.assertEqual(
+            [(row["kind"], row["id"]) for row in data["results"]], [("project", self.project.pk)]
+        )
+        self.assertEqual(self.client.get(reverse("api-search")).status_code, 400)
+        for limit in ["0", "-1"]:
+            response = self.client.get(reverse("api-search"), {"q": "acme", "limit": limit})
+            self.assertEqual(response.status_code, 400)
+
+
+class ClientDetailSectionTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username="alice", password="pass1234")
+        self.other_user = User.objects.create_user(username="bob", password="pass1234")
+        self.acme = Client.objects.create(user=self.user, name="Acme", email="a@acme.com")
+        for index in range(12):
+            project = Project.objects.create(
+                user=self.user, client=self.acme, name=f"Project {index:02}", amount=100
+            )
+            Invoice.objects.create(number=f"INV-{index:02}", project=project, amount=40)
+            ContactLog.objects.create(user=self.user, client=self.acme, notes=f"Note {index:02}")
+        self.client.force_login(self.user)
+
+    def test_detail_page_renders_header_only(self):
+        with self.assertNumQueries(4):  # session, user, token, client joined to its summary
+            response = self.client.get(reverse("client-detail", args=[self.acme.pk]))
+        self.assertContains(response, "12 projects")
+        invoices_url = reverse("client-invoices", args=[self.acme.pk])
+        self.assertContains(response, f'data-fragment="{invoices_url}"')
+        self.assertNotContains(response, "INV-00")
+        self.assertNotIn("contact_log_form", response.context)
+
+    def test_sections_are_paginated_fragments(self):
+        url = reverse("client-projects", args=[self.acme.pk])
+        with self.assertNumQueries(5):  # session, user, token, client, projects
+            response = self.client.get(url, HTTP_X_FRAGMENT="1")
+        self.assertTemplateNotUsed(response, "base.html")
+        self.assertEqual(len(response.context["projects"]), 10)
+        self.assertIn("X-Fragment", response["Vary"])
+        response = self.client.get(f"{url}?{response.context['page_obj'].next_query}")
+        self.assertTemplateUsed(response, "base.html")
+        self.assertEqual(
+            [project.name for project in response.context["projects"]],
+            ["Project 01", "Project 00"],
+        )
+
+    def test_sections_are_scoped_to_the_user(self):
+        self.client.force_login(self.other_user)
+        for name in ["client-projects", "client-invoices", "client-contact-logs"]:
+            response = self.client.get(reverse(name, args=[self.acme.pk]))
+            self.assertEqual(response.status_code, 404)
+            response = self.client.get(reverse(name, args=[0]))
+            self.assertEqual(response.status_code, 404)
+
+
+class ConditionalPageTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username="alice", password="pass1234")
+        self.acme = Client.objects.create(user=self.user, name="Acme", email="a@acme.com")
+        self.project = Project.objects.create(
+            user=self.user, client=self.acme, name="Site", amount=500
+        )
+        self.invoice = Invoice.objects.create(number="INV-1", project=self.project, amount=100)
+        self.client.force_login(self.user)
+        self.client.get(reverse("login"))  # sets the CSRF cookie, as logging in does
+        cache.clear()
+
+    def test_unchanged_pages_are_not_rendered_again(self):
+        urls = [
+            reverse("home"),
+            reverse("client-list"),
+            reverse("client-detail", args=[self.acme.pk]),
+            reverse("project-list"),
+            reverse("project-detail", args=[self.project.pk]),
+            reverse("invoice-list") + "?payment_status=pending",
+            reverse("invoice-detail", args=[self.invoice.pk]),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response["Cache-Control"], "private, no-cache")
+                with self.assertNumQueries(3):  # session, user and change token only
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b"")
+
+    def test_writes_and_variants_change_the_etag(self):
+        url = reverse("invoice-list")
+        etag = self.client.get(url)["ETag"]
+        self.assertNotEqual(self.client.get(url + "?payment_status=paid")["ETag"], etag)
+
+        ContactLog.objects.create(user=self.user, client=self.acme, notes="Call")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+        # Pages with forms embed tokens derived from the CSRF secret.
+        self.client.cookies["csrftoken"] = "a" * 32
+        self.assertNotEqual(self.client.get(url)["ETag"], response["ETag"])
+
+        section = reverse("client-invoices", args=[self.acme.pk])
+        self.assertNotEqual(
+            self.client.get(section)["ETag"],
+            self.client.get(section, HTTP_X_FRAGMENT="1")["ETag"],
+        )
+
+    def test_writes_from_other_processes_change_the_etag(self):
+        Invoice.objects.filter(pk=self.invoice.pk).update(due_date=date(2024, 1, 1))
+        url = reverse("invoice-list")
+        etag = self.client.get(url)["ETag"]
+        self.assertContains(self.client.get(reverse("client-list")), "Acme")
+
+        # A command run in another process, with a cache this one never sees.
+        caches = {
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+            "other": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "LOCATION": "other-process",
+            },
+        }
+        with override_settings(CACHES=caches, CRM_CACHE_ALIAS="other"):
+            call_command("mark_overdue_invoices", as_of="2024-06-01", stdout=StringIO())
+            Client.objects.filter(pk=self.acme.pk).update(name="Acme Corp")
+            touch_user(self.user.pk)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        [invoice] = response.context["invoices"]
+        self.assertEqual(invoice.payment_status, Invoice.PaymentStatus.OVERDUE)
+        self.assertContains(self.client.get(reverse("client-list")), "Acme Corp")
+
+    def test_pending_messages_force_a_render(self):
+        url = reverse("invoice-list")
+        etag = self.client.get(url)["ETag"]
+        request = RequestFactory().get(url, HTTP_IF_NONE_MATCH=etag)
+        request.META["CSRF_COOKIE"] = self.client.cookies["csrftoken"].value
+        request.user = self.user
+        request._messages = CookieStorage(request)
+        self.assertEqual(InvoiceListView.as_view()(request).status_code, 304)
+        messages.info(request, "Invoice saved.")
+        self.assertEqual(InvoiceListView.as_view()(request).status_code, 200)
+
+
+class FormChoiceTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username="alice", password="pass1234")
+        other_user = User.objects.create_user(username="bob", password="pass1234")
+        for index in range(20):
+            client_obj = Client.objects.create(
+                user=self.user, name=f"Client {index}", email=f"c{index}@example.com"
+            )
+            Project.objects.create(user=self.user, client=client_obj, name=f"P{index}", amount=1)
+        self.acme = Client.objects.get(name="Client 0")
+        bob_client = Client.objects.create(user=other_user, name="Bob Co", email="b@b.com")
+        self.bob_project = Project.objects.create(
+            user=other_user, client=bob_client, name="Hidden", amount=1
+        )
+        self.client.force_login(self.user)
+        cache.clear()
+
+    def test_choices_come_from_one_query_and_are_cached(self):
+        # As in a request, where ChangeTokenMiddleware reads the token once.
+        with remembering_tokens():
+            form = InvoiceForm(user=self.user)
+            with self.assertNumQueries(2):  # change token, choices
+                choices = list(form.fields["project"].choices)
+            self.assertEqual(len(choices), 21)
+            self.assertIn((Project.objects.get(name="P0").pk, "P0 (Client 0)"), choices)
+            with self.assertNumQueries(0):
+                form = ContactLogForm(user=self.user)
+                str(form["project"])
+
+    def test_choices_follow_renames_and_validate_ownership(self):
+        list(InvoiceForm(user=self.user).fields["project"].choices)
+        self.acme.name = "Renamed"
+        self.acme.save()
+        labels = [label for _, label in InvoiceForm(user=self.user).fields["project"].choices]
+        self.assertIn("P0 (Renamed)", labels)
+
+        form = InvoiceForm(
+            data={"number": "X-1", "project": self.bob_project.pk, "amount": "1"}, user=self.user
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn("project", form.errors)
+
+    def test_invoice_create_query_count_is_flat(self):
+        response = self.client.get(reverse("invoice-create"))
+        self.assertContains(response, "P19 (Client 19)")
+        self.assertLessEqual(int(re.search(r'"(\d+) queries"', response["Server-Timing"])[1]), 5)
+
+
+class BenchmarkTests(TestCase):
+    def test_seed_is_skewed(self):
+        self.assertEqual(benchmarks.account_sizes(4, 1000), [1000, 466, 298, 217])
+        totals = benchmarks.seed(users=3, max_invoices=80, seed_value=1)
+        self.assertEqual([counts["invoices"] for counts in totals.values()], [80, 37, 23])
+        whale = get_user_model().objects.get(username="bench-user-001")
+        self.assertEqual(Invoice.objects.filter(user=whale).count(), 80)
+        self.assertEqual(ContactLog.objects.filter(user=whale).count(), 24)
+        self.assertEqual(
+            ClientSummary.objects.filter(user=whale).aggregate(total=Sum("invoice_count"))["total"],
+            80,
+        )
+
+    def test_run_covers_every_url_and_compares(self):
+        benchmarks.seed(users=2, max_invoices=30)
+        report = benchmarks.run(iterations=1)
+        self.assertEqual(report["meta"]["uncovered_urls"], [])
+        self.assertIn("admin:invoice", report["results"])
+        result = report["results"]["whale/invoice-list"]
+        self.assertEqual((result["status"], result["queries"]), (200, 4))
+        self.assertEqual(set(result), {"url", "status", "queries", "p50_ms", "p95_ms", "peak_kb"})
+
+        self.assertEqual(benchmarks.compare(report, report), [])
+        baseline = json.loads(json.dumps(report))
+        baseline["results"]["whale/invoice-list"]["queries"] = 2
+        self.assertEqual(
+            benchmarks.compare(report, baseline), ["whale/invoice-list: 2 -> 4 queries"]
+        )
+
+
+@override_settings(CRM_QUERY_BUDGETS_STRICT=True)
+class SnapshotTests(TestCase):
+    as_of = date(2024, 6, 15)
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="alice", password="pass1234")
+        acme = Client.objects.create(user=self.user, name="Acme", email="a@acme.com")
+        self.project = Project.objects.create(user=self.user, client=acme, name="Site", amount=1)
+        self.invoices = {}
+        Status = Invoice.PaymentStatus
+        for number, issued, due, amount, status in [
+            ("JAN", date(2024, 1, 5), None, 100, Status.PAID),
+            ("JAN-X", date(2024, 1, 9), None, 999, Status.CANCELLED),
+            ("FEB", date(2024, 2, 1), date(2024, 1, 1), 10, Status.PENDING),  # 166 days late
+            ("MAR", date(2024, 3, 1), date(2024, 4, 1), 200, Status.PENDING),  # 75 days
+            ("MAY", date(2024, 5, 1), date(2024, 5, 10), 50, Status.OVERDUE),  # 36 days
+            ("JUN", date(2024, 6, 1), date(2024, 7, 1), 30, Status.PENDING),  # not yet due
+        ]:
+            self.invoices[number] = Invoice.objects.create(
+                number=number,
+                project=self.project,
+                amount=amount,
+                issue_date=issued,
+                due_date=due,
+                payment_status=status,
+            )
+        # Changed well before the first refresh's watermark.
+        Invoice.objects.update(updated_at=timezone.now() - timezone.timedelta(hours=1))
+        self.assertEqual(snapshots.refresh_snapshots(as_of=self.as_of), 5)
+
+    def snapshot(self, month):
+        return MonthlySnapshot.objects.get(user=self.user, month=month)
+
+    def test_months_and_aging(self):
+        january = self.snapshot(date(2024, 1, 1))
+        self.assertEqual((january.invoice_count, january.billed, january.paid), (2, 100, 100))
+        self.assertEqual(january.outstanding, 0)
+        self.assertFalse(MonthlySnapshot.objects.filter(month=date(2024, 4, 1)).exists())
+
+        report = reports.accounting_report(self.user, {"year": "2024"}, today=self.as_of)
+        self.assertEqual([row.month.month for row in report["months"]], [1, 2, 3, 5, 6])
+        self.assertEqual([bucket["amount"] for bucket in report["aging"]], [30, 50, 200, 10])
+        self.assertEqual(report["outstanding"], 290)
+
+    def test_refresh_recomputes_only_changed_months(self):
+        self.assertEqual(snapshots.refresh_snapshots(as_of=self.as_of), 0)
+
+        march = self.invoices["MAR"]
+        march.issue_date = date(2024, 4, 20)
+        march.save()
+        self.invoices["JUN"].delete()
+        bulk.update_invoice_status(Invoice.objects.filter(number="MAY"), Invoice.PaymentStatus.PAID)
+        # March (left), April (joined), May (updated) and June (deleted from).
+        self.assertEqual(snapshots.refresh_snapshots(as_of=self.as_of), 4)
+        self.assertFalse(MonthlySnapshot.objects.filter(month=date(2024, 3, 1)).exists())
+        self.assertEqual(self.snapshot(date(2024, 4, 1)).aging_61_90, 200)
+        self.assertEqual(self.snapshot(date(2024, 5, 1)).paid, 50)
+        self.assertFalse(MonthlySnapshot.objects.filter(month=date(2024, 6, 1)).exists())
+
+        # A day later only the months with money outstanding age.
+        Invoice.objects.update(updated_at=timezone.now() - timezone.timedelta(hours=1))
+        out = StringIO()
+        call_command("refresh_snapshots", "--as-of", "2024-06-16", stdout=out)
+        self.assertIn("Refreshed 2 monthly snapshot(s).", out.getvalue())
+
+    def test_editing_an_invoice_into_another_month_stays_within_budget(self):
+        self.client.force_login(self.user)
+        march = self.invoices["MAR"]
+        response = self.client.post(
+            reverse("invoice-update", args=[march.pk]),
+            {
+                "number": "MAR",
+                "project": self.project.pk,
+                "amount": "200.00",
+                "payment_status": Invoice.PaymentStatus.PENDING,
+                "issue_date": "2024-04-20",
+                "due_date": "2024-05-01",
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(self.snapshot(date(2024, 3, 1)).stale)
+
+    def test_set_based_deletes_mark_months_stale(self):
+        bulk.delete_invoices(Invoice.objects.filter(number__in=["FEB", "MAR"]))
+        stale = MonthlySnapshot.objects.filter(stale=True).values_list("month", flat=True)
+        self.assertEqual(sorted(month.month for month in stale), [2, 3])
+
+    def test_report_page_and_export_read_the_snapshot(self):
+        self.client.force_login(self.user)
+        # Not yet refreshed, so the report still shows the old amount.
+        Invoice.objects.filter(number="MAR").update(amount=1)
+        response = self.client.get(reverse("reports"), {"year": "2024"})
+        self.assertContains(response, "March 2024")
+        self.assertContains(response, "$200.00")
+        export = self.client.get(reverse("export", args=["monthly_revenue"]), {"year": "2024"})
+        rows = list(csv.DictReader(b"".join(export.streaming_content).decode().splitlines()))
+        self.assertEqual([row["month"] for row in rows][:2], ["2024-01-01", "2024-02-01"])
+        self.assertEqual(rows[2]["aging_61_90"], "200.00")
+
+
+@override_settings(CRM_ADMIN_PERFORMANCE_MODE=True)
+class AdminPerformanceTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.alice = User.objects.create_user(username="alice", password="pass1234")
+        self.bob = User.objects.create_user(username="bob", password="pass1234")
+        acme = Client.objects.create(user=self.alice, name="Acme", email="a@acme.com")
+        site = Project.objects.create(user=self.alice, client=acme, name="Site", amount=1)
+        self.logs = [
+            ContactLog.objects.create(user=self.alice, client=acme, project=site, notes="Kickoff")
+        ]
+        globex = Client.objects.create(user=self.bob, name="Globex", email="g@globex.com")
+        self.logs.append(ContactLog.objects.create(user=self.bob, client=globex, notes="Renewal"))
+        admin_user = User.objects.create_superuser("admin", "admin@example.com", "pass")
+        self.client.force_login(admin_user)
+        self.url = reverse("admin:crm_contactlog_changelist")
+
+    def changelist_pks(self, query=""):
+        response = self.client.get(self.url + query)
+        self.assertEqual(response.status_code, 200)
+        return [obj.pk for obj in response.context["cl"].result_list]
+
+    def test_changelist_filters_by_autocomplete_and_orders_by_pk(self):
+        response = self.client.get(self.url)
+        self.assertContains(response, "admin-autocomplete")
+        self.assertNotContains(response, f"?user__id__exact={self.bob.pk}")
+        self.assertFalse(response.context["cl"].show_full_result_count)
+        self.assertEqual(self.changelist_pks(), [self.logs[1].pk, self.logs[0].pk])
+        self.assertEqual(self.changelist_pks(f"?user__id__exact={self.bob.pk}"), [self.logs[1].pk])
+        response = self.client.get(
+            reverse("admin:autocomplete"),
+            {"app_label": "crm", "model_name": "contactlog", "field_name": "user", "term": "bo"},
+        )
+        self.assertEqual([user["text"] for user in response.json()["results"]], ["bob"])
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(self.url)
+        acme = Client.objects.get(name="Acme")
+        for index in range(5):
+            project = Project.objects.create(
+                user=self.alice, client=acme, name=f"Extra {index}", amount=1
+            )
+            ContactLog.objects.create(user=self.alice, client=acme, project=project, notes="x")
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(self.url)
+        self.assertEqual(len(many), len(few))
+
+    def test_search_uses_full_text_index(self):
+        if not search.enabled():
+            self.skipTest("Full-text search needs SQLite.")
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.changelist_pks("?q=acm"), [self.logs[0].pk])
+        self.assertTrue(any("MATCH" in query["sql"] for query in queries))
+        self.assertEqual(self.changelist_pks("?q=renewal"), [self.logs[1].pk])
+        self.assertEqual(self.changelist_pks("?q=site"), [self.logs[0].pk])
+        self.assertEqual(self.changelist_pks("?q=nothing"), [])
+
+    def test_paginator_estimates_unfiltered_counts(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        ContactLog.objects.create(user=self.bob, client=self.logs[1].client, notes="Later")
+
+        def count(queryset, exact_below=1):
+            paginator = EstimatedCountPaginator(queryset, 10)
+            paginator.exact_below = exact_below
+            return paginator.count
+
+        # The statistics still say two rows; a filter or a small table is counted.
+        self.assertEqual(count(ContactLog.objects.all()), 2)
+        self.assertEqual(count(ContactLog.objects.filter(user=self.bob)), 2)
+        self.assertEqual(count(ContactLog.objects.all(), exact_below=10_000), 3)
+
+
+class SqliteTuningTests(TransactionTestCase):
+    def pragma(self, name):
+        return connection.connection.execute(f"PRAGMA {name}").fetchone()[0]
+
+    def test_pragmas_and_periodic_optimize(self):
+        connection.ensure_connection()
+        default_cache_size = self.pragma("cache_size")
+        self.addCleanup(
+            connection.connection.execute, f"PRAGMA cache_size = {default_cache_size}"
+        )
+        with override_settings(CRM_SQLITE_PRAGMAS={"cache_size": -4096, "busy_timeout": 1234}):
+            with self.assertNumQueries(0):  # Sent to the driver, outside the query budgets.
+                sqlite.apply_pragmas(None, connection)
+        self.assertEqual((self.pragma("cache_size"), self.pragma("busy_timeout")), (-4096, 1234))
+
+        connection.crm_optimized_at -= 120
+        with override_settings(CRM_SQLITE_OPTIMIZE_INTERVAL=None):
+            sqlite.optimize_periodically(None)
+        self.assertLess(connection.crm_optimized_at, time.monotonic() - 100)
+        with override_settings(CRM_SQLITE_OPTIMIZE_INTERVAL=60):
+            sqlite.optimize_periodically(None)
+        self.assertGreater(connection.crm_optimized_at, time.monotonic() - 100)
+
+    def test_load_test_reports_throughput(self):
+        benchmarks.seed(users=1, max_invoices=20)
+        # One worker: the in-memory test database cannot take concurrent writers.
+        # With this seed its first request is a write.
+        result = benchmarks.load_test(threads=1, duration=0.5, write_ratio=0.5, seed_value=1)
+        self.assertEqual(result["errors"], {})
+        self.assertGreater(result["requests"], 0)
+        self.assertGreater(ContactLog.objects.count(), 6)
+
+
+class AsyncViewTests(TransactionTestCase):
+    """
+    The client detail sections run on worker threads with their own
+    connections, which only see committed rows, hence TransactionTestCase.
+    """
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username="alice", password="pass1234")
+        self.other_user = User.objects.create_user(username="bob", password="pass1234")
+        self.acme = Client.objects.create(user=self.user, name="Acme", email="a@acme.com")
+        self.project = Project.objects.create(
+            user=self.user, client=self.acme, name="Site", amount=500
+        )
+        for index in range(12):
+            Invoice.objects.create(number=f"INV-{index:02}", project=self.project, amount=10)
+        ContactLog.objects.create(user=self.user, client=self.acme, notes="Kickoff call")
+        self.factory = AsyncRequestFactory()
+
+    def request(self, path, user=None, **params):
+        request = self.factory.get(path, params)
+        request.user = user or self.user
+        return request
+
+    async def render(self, view_class, path, user=None, **kwargs):
+        response = await view_class.as_view()(self.request(path, user), **kwargs)
+        # Rendered on the event loop: a lazy query in a template would raise.
+        response.render()
+        return response
+
+    async def test_list_pages(self):
+        response = await self.render(async_views.AsyncInvoiceListView, "/invoices/")
+        self.assertEqual(len(response.context_data["invoices"]), 12)
+        self.assertContains(response, "INV-11")
+        response = await self.render(async_views.AsyncClientListView, "/clients/")
+        self.assertEqual(response.context_data["clients"][0].project_count, 1)
+        response = await self.render(
+            async_views.AsyncProjectListView, "/projects/", user=self.other_user
+        )
+        self.assertEqual(response.context_data["projects"], [])
+
+    async def test_client_detail_loads_sections_concurrently(self):
+        metrics = RequestMetrics()
+        with recording(metrics):
+            response = await self.render(
+                async_views.AsyncClientDetailView, "/clients/", pk=self.acme.pk
+            )
+        # The change token, the header and one bounded query per section, all
+        # counted even though the sections ran on other threads.
+        self.assertEqual(metrics.queries, 5)
+        sections = response.context_data["sections"]
+        self.assertEqual(len(sections["invoices"]["object_list"]), 10)
+        self.assertTrue(sections["invoices"]["is_paginated"])
+        self.assertContains(response, "data-loaded")
+        self.assertContains(response, "Kickoff call")
+
+        # Paging on leads to the section's own view, not back to the detail page.
+        [href] = re.findall(r'href="([^"]*\?after=[^"]*)"', response.content.decode())
+        path, _, query = href.partition("?")
+        self.assertEqual(path, reverse("client-invoices", args=[self.acme.pk]))
+        self.assertEqual(resolve(path).func.view_class, ClientInvoicesView)
+        self.assertEqual(query, sections["invoices"]["page_obj"].next_query)
+
+    async def test_detail_scoping_and_login(self):
+        with self.assertRaises(Http404):
+            await async_views.AsyncClientDetailView.as_view()(
+                self.request("/", self.other_user), pk=self.acme.pk
+            )
+        response = await self.render(
+            async_views.AsyncProjectDetailView, "/", pk=self.project.pk
+        )
+        self.assertEqual(len(response.context_data["invoices"]), 12)
+
+        request = self.request("/invoices/")
+        request.user = AnonymousUser()
+        response = await async_views.AsyncInvoiceListView.as_view()(request)
+        self.assertEqual(response.status_code, 302)
+
+    async def test_conditional_requests(self):
+        view = async_views.AsyncClientDetailView.as_view()
+        response = await view(self.request("/clients/"), pk=self.acme.pk)
+        request = self.factory.get("/clients/", headers={"If-None-Match": response["ETag"]})
+        request.user = self.user
+        metrics = RequestMetrics()
+        with recording(metrics):
+            response = await view(request, pk=self.acme.pk)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(metrics.queries, 1)  # the change token
+
+
+@override_settings(CRM_REPLICA_ALIAS="replica", CRM_REPLICA_LAG=0)
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    In tests the replica alias mirrors the primary: a second connection to
+    the same database, which only sees committed rows.
+    """
+
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="alice", password="pass1234")
+        acme = Client.objects.create(user=self.user, name="Acme", email="a@acme.com")
+        self.project = Project.objects.create(user=self.user, client=acme, name="Site", amount=500)
+        Invoice.objects.create(number="INV-1", project=self.project, amount=100)
+        Invoice.objects.create(number="INV-2", project=self.project, amount=200)
+
+    def test_router_decisions(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_write(Invoice), DEFAULT_DB_ALIAS)
+        self.assertFalse(router.allow_migrate("replica", "crm"))
+        self.assertTrue(router.allow_migrate(DEFAULT_DB_ALIAS, "crm"))
+
+        self.assertEqual(read_database(self.user.pk), "replica")
+        with override_settings(CRM_REPLICA_LAG=60):
+            # Just wrote its invoices, so reads its own writes from the primary.
+            self.assertEqual(read_database(self.user.pk), DEFAULT_DB_ALIAS)
+        with override_settings(CRM_REPLICA_ALIAS=None):
+            self.assertEqual(read_database(self.user.pk), DEFAULT_DB_ALIAS)
+
+        self.assertEqual(Project.objects.all().db, DEFAULT_DB_ALIAS)
+        with reading_from("replica"):
+            project = Project.objects.get(pk=self.project.pk)
+        # Related lookups follow the instance, even outside the block.
+        self.assertEqual(project.invoices.all().db, "replica")
+        self.assertEqual(project._state.db, "replica")
+
+    def test_pages_read_from_the_replica_until_the_user_writes(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connections["replica"]) as replica:
+            response = self.client.get(reverse("invoice-list"))
+            self.assertContains(response, "INV-2")
+            export = self.client.get(reverse("export", args=["invoices"]))
+            export = b"".join(export.streaming_content)
+        self.assertIn(b"INV-1", export)
+        self.assertEqual(len(replica), 2)
+
+        with override_settings(CRM_REPLICA_LAG=60):
+            invoice = self.project.invoices.first()
+            response = self.client.post(
+                reverse("invoice-bulk"), {"action": "paid", "ids": [invoice.pk]}
+            )
+            self.assertEqual(response.status_code, 302)
+            with CaptureQueriesContext(connections["replica"]) as replica:
+                response = self.client.get(reverse("invoice-list"))
+        self.assertEqual(len(replica), 0)
+        self.assertContains(response, "Paid")
+
+    def test_copied_replica_serves_users_who_wrote_before_the_copy(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "replica.sqlite3")
+            with override_settings(CRM_REPLICA_SYNCED_PATH=f"{path}.synced"):
+                # Never copied: the replica has nothing yet.
+                self.assertEqual(read_database(self.user.pk), DEFAULT_DB_ALIAS)
+                call_command("sync_replica", path=path, stdout=StringIO())
+                self.assertEqual(read_database(self.user.pk), "replica")
+
+                # However long ago the write was, the copy predates it.
+                touch_user(self.user.pk)
+                with override_settings(CRM_REPLICA_SYNCED_PATH=None, CRM_REPLICA_LAG=5):
+                    with mock.patch("time.time", return_value=time.time() + 60):
+                        self.assertEqual(read_database(self.user.pk), "replica")
+                with mock.patch("time.time", return_value=time.time() + 60):
+                    self.assertEqual(read_database(self.user.pk), DEFAULT_DB_ALIAS)
+
+                call_command("sync_replica", path=path, stdout=StringIO())
+                self.assertEqual(read_database(self.user.pk), "replica")
+
+    async def test_async_pages_read_from_the_replica(self):
+        request = AsyncRequestFactory().get("/projects/")
+        request.user = self.user
+        response = await async_views.AsyncProjectListView.as_view()(request)
+        [project] = response.context_data["projects"]
+        self.assertEqual(project._state.db, "replica")
+
+    def test_sync_replica(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "replica.sqlite3")
+            before = time.time()
+            call_command("sync_replica", path=path, stdout=StringIO())
+            copy = sqlite3.connect(path)
+            try:
+                rows = copy.execute("SELECT number FROM crm_invoice ORDER BY number").fetchall()
+            finally:
+                copy.close()
+            with override_settings(CRM_REPLICA_SYNCED_PATH=f"{path}.synced"):
+                self.assertGreaterEqual(replica_synced_at(), before)
+        self.assertEqual(rows, [("INV-1",), ("INV-2",)])
+        with override_settings(CRM_REPLICA_ALIAS=None):
+            with self.assertRaises(CommandError):
+                call_command("sync_replica", stdout=StringIO())
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="alice", password="pass1234")
+        self.client.force_login(self.user)
+        registry.clear()
+        cache.clear()
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse("client-list"))
+        timing = response["Server-Timing"]
+        self.assertIn('desc="4 queries"', timing)
+        self.assertRegex(timing, r"tpl;dur=\d+\.\d, total;dur=\d+\.\d")
+
+    def test_stats_endpoint_is_staff_only(self):
+        for _ in range(3):
+            self.client.get(reverse("client-list"))
+        self.assertEqual(self.client.get(reverse("request-stats")).status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save()
+        stats = self.client.get(reverse("request-stats")).json()
+        self.assertEqual(stats["client-list"]["count"], 3)
+        self.assertEqual(set(stats["client-list"]["wall_ms"]), {"p50", "p90", "p99", "max"})
+        self.assertEqual(stats["client-list"]["queries"]["p99"], 4)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 90), 7)
+
+    def test_query_budgets(self):
+        with override_settings(CRM_QUERY_BUDGETS={"client-list": 2}):
+            with self.assertLogs("crm.instrumentation", "WARNING") as logs:
+                self.client.get(reverse("client-list"))
+            self.assertIn("client-list ran 4 queries; its budget is 2.", logs.output[0])
+            cache.clear()
+            with override_settings(CRM_QUERY_BUDGETS_STRICT=True):
+                with self.assertRaises(QueryBudgetExceeded):
+                    self.client.get(reverse("client-list"))
+
+
+class ImportTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username="alice", password="pass1234")
+        self.other_user = User.objects.create_user(username="bob", password="pass1234")
+        Client.objects.create(user=self.user, name="Existing", email="old@example.com")
+        Client.objects.create(user=self.other_user, name="Bob Co", email="bob@example.com")
+
+    def run_import(self, kind, text, **kwargs):
+        return import_csv(kind, self.user, StringIO(text), **kwargs)
+
+    def test_clients_import_reports_row_errors(self):
+        report = self.run_import(
+            "clients",
+            "name,email,phone,company,notes\n"
+            "Acme,a@acme.com,,Acme Inc,\n"
+            "Dup,old@example.com,,,\n"
+            "Again,a@acme.com,,,\n"
+            ",broken-email,,,\n"
+            "Globex,g@globex.com,555,,Big\n",
+            batch_size=2,
+        )
+        self.assertEqual(report.created, 2)
+        self.assertEqual([line for line, _ in report.errors], [3, 4, 5])
+        self.assertIn("email", report.errors[0][1])
+        acme = Client.objects.get(user=self.user, email="a@acme.com")
+        self.assertEqual(acme.company, "Acme Inc")
+        self.assertTrue(ClientSummary.objects.filter(client=acme).exists())
+
+    def test_projects_and_invoices_resolve_foreign_keys(self):
+        report = self.run_import(
+            "projects",
+            "client_email,name,description,status,amount,start_date,end_date\n"
+            "old@example.com,Site,,in_progress,1000,2024-01-01,\n"
+            "bob@example.com,Stolen,,,10,,\n"
+            "old@example.com,Bad,,nope,10,,\n",
+        )
+        self.assertEqual(report.created, 1)
+        self.assertEqual([line for line, _ in report.errors], [3, 4])
+        project = Project.objects.get(name="Site")
+        self.assertEqual(project.user, self.user)
+        self.assertEqual(project.status, Project.Status.IN_PROGRESS)
+        self.assertIsNone(project.end_date)
+
+        bob_project = Project.objects.create(
+            user=self.other_user, client=Client.objects.get(name="Bob Co"), name="X", amount=1
+        )
+        Invoice.objects.create(number="TAKEN", project=bob_project, amount=1)
+        report = self.run_import(
+            "invoices",
+            "number,client_email,project,amount,payment_status,issue_date,due_date\n"
+            "INV-1,old@example.com,Site,400,paid,2024-02-01,2024-03-01\n"
+            "INV-2,old@example.com,Site,100,,,\n"
+            "TAKEN,old@example.com,Site,5,,,\n"
+            "INV-3,old@example.com,Missing,5,,,\n"
+            "INV-4,old@example.com,Site,abc,,,\n",
+        )
+        self.assertEqual(report.created, 2)
+        self.assertEqual([line for line, _ in report.errors], [4, 5, 6])
+        invoice = Invoice.objects.get(number="INV-2")
+        self.assertEqual(invoice.user, self.user)
+        self.assertEqual(invoice.payment_status, Invoice.PaymentStatus.PENDING)
+        summary = ClientSummary.objects.get(client__email="old@example.com", user=self.user)
+        self.assertEqual((summary.project_count, summary.invoice_count), (1, 2))
+        self.assertEqual(summary.total_billed, 500)
+
+    def test_missing_columns(self):
+        report = self.run_import("invoices", "number,amount\nX,1\n")
+        self.assertEqual(report.created, 0)
+        self.assertIn("Missing column", report.errors[0][1])
+
+    def test_upload_view_and_command(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.client.force_login(self.user)
+        upload = SimpleUploadedFile(
+            "clients.csv", b"name,email,phone,company,notes\nAcme,a@acme.com,,,\n", "text/csv"
+        )
+        with self.settings(CRM_JOB_FILES_DIR=directory.name):
+            response = self.client.post(reverse("import"), {"kind": "clients", "file": upload})
+            self.assertRedirects(response, reverse("job-list"))
+            self.assertFalse(Client.objects.filter(name="Acme").exists())
+            jobs.work(concurrency=0, once=True)
+        job = Job.objects.get(user=self.user)
+        self.assertEqual(
+            (job.status, job.result["created"], job.max_attempts), (Job.Status.SUCCEEDED, 1, 1)
+        )
+        self.assertEqual(os.listdir(directory.name), [])
+
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as handle:
+            handle.write("name,email,phone,company,notes\nGlobex,g@globex.com,,,\n")
+        self.addCleanup(os.remove, handle.name)
+        out = StringIO()
+        call_command("import_crm", "clients", handle.name, "--user", "alice", stdout=out)
+        self.assertIn("Imported 1 clients", out.getvalue())
+        self.assertTrue(Client.objects.filter(user=self.user, name="Globex").exists())
+        for size in ["0", "-5"]:
+            with self.assertRaises(CommandError):
+                call_command(
+                    "import_crm", "clients", handle.name, "--user", "alice", "--batch-size", size
+                )
+
+
+@override_settings(CRM_QUERY_BUDGETS_STRICT=True, CRM_JOB_RETRY_DELAY=30)
+class JobTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        files = override_settings(CRM_JOB_FILES_DIR=directory.name)
+        files.enable()
+        self.addCleanup(files.disable)
+        User = get_user_model()
+        self.user = User.objects.create_user(username="alice", password="pass1234")
+        self.acme = Client.objects.create(user=self.user, name="Acme", email="a@acme.com")
+        self.project = Project.objects.create(
+            user=self.user, client=self.acme, name="Site", amount=1
+        )
+        Invoice.objects.create(number="INV-1", project=self.project, amount=300)
+        self.client.force_login(self.user)
+
+    def add_task(self, name, function):
+        jobs.TASKS[name] = function
+        self.addCleanup(jobs.TASKS.pop, name)
+
+    def test_export_job_and_status_page(self):
+        response = self.client.post(reverse("export", args=["invoices"]) + "?payment_status=pending")
+        self.assertRedirects(response, reverse("job-list"))
+        job = Job.objects.get(user=self.user)
+        self.assertEqual(job.kind, "export")
+        self.assertEqual(
+            job.params,
+            {"kind": "invoices", "fmt": "csv", "query": {"payment_status": "pending"}},
+        )
+        response = self.client.get(reverse("job-list"))
+        self.assertContains(response, 'http-equiv="refresh"')
+
+        self.assertEqual(jobs.work(concurrency=0, once=True), 1)
+        response = self.client.get(reverse("job-list"))
+        self.assertNotContains(response, 'http-equiv="refresh"')
+        download = reverse("job-download", args=[job.pk])
+        self.assertContains(response, download)
+        response = self.client.get(download)
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="invoices.csv"')
+        self.assertIn(b"INV-1", b"".join(response.streaming_content))
+
+        other = get_user_model().objects.create_user(username="bob", password="pass1234")
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(download).status_code, 404)
+        self.assertNotContains(self.client.get(reverse("job-list")), download)
+
+        self.client.force_login(self.user)
+        job.refresh_from_db()
+        path = jobs.files_dir() / job.result["path"]
+        self.assertEqual(jobs.expire_files(), 0)
+        self.assertEqual(jobs.expire_files(now=timezone.now() + jobs.file_ttl()), 1)
+        self.assertFalse(path.exists())
+        self.assertEqual(self.client.get(download).status_code, 404)
+        self.assertContains(self.client.get(reverse("job-list")), "invoices.csv has expired")
+
+    def test_failed_import_removes_its_upload(self):
+        upload = SimpleUploadedFile("clients.csv", b"name,email\nAcme,a@acme.com\n")
+        crashed = jobs.enqueue(
+            "import", user=self.user, max_attempts=1, kind="clients", path=jobs.save_upload(upload)
+        )
+        with mock.patch("crm.jobs.import_csv", side_effect=OSError("Disk full")):
+            with self.assertLogs("crm.jobs", "ERROR"):
+                jobs.work(concurrency=0, once=True)
+        crashed.refresh_from_db()
+        self.assertEqual(crashed.status, Job.Status.FAILED)
+        self.assertFalse((jobs.files_dir() / crashed.params["path"]).exists())
+
+        # Its worker died on the last attempt.
+        lost = jobs.enqueue(
+            "import", user=self.user, max_attempts=1, kind="clients", path=jobs.save_upload(upload)
+        )
+        now = timezone.now()
+        self.assertEqual(jobs.claim(1, now=now), [lost.pk])
+        self.assertTrue((jobs.files_dir() / lost.params["path"]).exists())
+        jobs.claim(1, now=now + jobs.visibility_timeout() * 2)
+        self.assertFalse((jobs.files_dir() / lost.params["path"]).exists())
+
+    def test_failed_job_is_retried_with_backoff_then_fails(self):
+        self.add_task("boom", lambda context: 1 / 0)
+        job = jobs.enqueue("boom", max_attempts=2)
+        start = timezone.now()
+        with self.assertLogs("crm.jobs", "ERROR"):
+            jobs.work(concurrency=0, once=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.Status.QUEUED, 1))
+        self.assertIn("ZeroDivisionError", job.error)
+        self.assertGreaterEqual(job.run_after, start + timedelta(seconds=30))
+        self.assertEqual(jobs.claim(1), [])
+
+        self.assertEqual(jobs.claim(1, now=job.run_after), [job.pk])
+        with self.assertLogs("crm.jobs", "ERROR"):
+            self.assertEqual(jobs.run_job(job.pk), Job.Status.FAILED)
+        job.refresh_from_db()
+        self.assertEqual((job.attempts, job.locked_until), (2, None))
+        self.assertIsNotNone(job.finished_at)
+        with self.assertRaises(ValueError):
+            jobs.enqueue("no-such-kind")
+
+    def test_expired_lease_is_taken_over(self):
+        self.add_task("noop", lambda context: context.progress(step=1) or "done")
+        job = jobs.enqueue("noop", max_attempts=2)
+        now = timezone.now()
+        self.assertEqual(jobs.claim(5, now=now), [job.pk])
+        # Leased: another worker does not see it until the lease runs out.
+        self.assertEqual(jobs.claim(5, now=now), [])
+        later = now + jobs.visibility_timeout() + timedelta(seconds=1)
+        self.assertEqual(jobs.claim(5, now=later), [job.pk])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.Status.RUNNING, 2))
+
+        # The first attempt's late writes are ignored.
+        stale = jobs.JobContext(Job(pk=job.pk, attempts=1))
+        stale.progress(late=True)
+        self.assertEqual(jobs.run_job(job.pk), Job.Status.SUCCEEDED)
+        job.refresh_from_db()
+        self.assertEqual((job.result, job.progress), ("done", {"step": 1}))
+
+        dead = jobs.enqueue("noop", max_attempts=1)
+        self.assertEqual(jobs.claim(5, now=later), [dead.pk])
+        self.assertEqual(jobs.claim(5, now=later + jobs.visibility_timeout() * 2), [])
+        dead.refresh_from_db()
+        self.assertEqual(dead.status, Job.Status.FAILED)
+
+    def test_large_delete_goes_to_the_worker(self):
+        Invoice.objects.bulk_create(
+            Invoice(number=f"BULK-{index}", project=self.project, user=self.user, amount=1)
+            for index in range(bulk.DELETE_CHUNK_SIZE)
+        )
+        response = self.client.post(reverse("client-delete", args=[self.acme.pk]), follow=True)
+        self.assertContains(response, "Client queued for deletion.")
+        self.assertTrue(Client.objects.filter(pk=self.acme.pk).exists())
+        jobs.work(concurrency=0, once=True)
+        self.assertFalse(Client.objects.filter(pk=self.acme.pk).exists())
+        job = Job.objects.get(kind="delete_client")
+        self.assertEqual(job.result["crm.Invoice"], bulk.DELETE_CHUNK_SIZE + 1)
+        self.assertEqual(job.progress["crm.Client"], 1)
+
+    def test_delete_counts_contact_logs_towards_the_chunk(self):
+        # One invoice and a chunk of contact logs: more than one chunk in all.
+        ContactLog.objects.bulk_create(
+            ContactLog(user=self.user, client=self.acme, project=self.project, notes="Call")
+            for _ in range(bulk.DELETE_CHUNK_SIZE)
+        )
+        response = self.client.post(reverse("project-delete", args=[self.project.pk]), follow=True)
+        self.assertContains(response, "Project queued for deletion.")
+        self.assertTrue(Project.objects.filter(pk=self.project.pk).exists())
+        self.assertFalse(bulk.more_than_a_chunk(ContactLog.objects.all()))
+
+    def test_commands_queue_and_run_jobs(self):
+        out = StringIO()
+        call_command("refresh_snapshots", "--background", stdout=out)
+        call_command("mark_overdue_invoices", "--background", stdout=out)
+        call_command("delete_crm", "project", str(self.project.pk), "--background", stdout=out)
+        self.assertEqual(out.getvalue().count("Queued job"), 3)
+        self.assertTrue(Project.objects.filter(pk=self.project.pk).exists())
+        out = StringIO()
+        call_command("run_worker", "--concurrency", "0", "--once", stdout=out)
+        self.assertIn("Ran 3 job(s).", out.getvalue())
+        self.assertEqual(
+            set(Job.objects.values_list("status", flat=True)), {Job.Status.SUCCEEDED}
+        )
+        self.assertFalse(Project.objects.filter(pk=self.project.pk).exists())
+
+
+class JobPoolTests(TransactionTestCase):
+    """
+    Jobs run by the spawned worker processes. Those cannot open the
+    in-memory test database, so the tests run on a file copy of it.
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="alice", password="pass1234")
+        self.acme = Client.objects.create(user=self.user, name="Acme", email="a@acme.com")
+        project = Project.objects.create(user=self.user, client=self.acme, name="Site", amount=1)
+        Invoice.objects.create(
+            number="INV-1", project=project, amount=300, due_date=date(2024, 1, 1)
+        )
+        self.globex = Client.objects.create(user=self.user, name="Globex", email="g@globex.com")
+        project = Project.objects.create(user=self.user, client=self.globex, name="App", amount=1)
+        Invoice.objects.create(number="INV-2", project=project, amount=50)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        memory = connections[DEFAULT_DB_ALIAS]
+        memory.ensure_connection()
+        path = os.path.join(directory.name, "db.sqlite3")
+        copy = sqlite3.connect(path)
+        try:
+            memory.connection.backup(copy)
+        finally:
+            copy.close()
+        connections[DEFAULT_DB_ALIAS] = memory.__class__(
+            {**memory.settings_dict, "NAME": path}, DEFAULT_DB_ALIAS
+        )
+        self.addCleanup(connections.__setitem__, DEFAULT_DB_ALIAS, memory)
+        self.addCleanup(lambda: connections[DEFAULT_DB_ALIAS].close())
+        self.client.force_login(self.user)
+
+    def test_pool_runs_jobs_and_pages_see_their_writes(self):
+        url = reverse("invoice-list")
+        etag = self.client.get(url)["ETag"]
+        jobs.enqueue("mark_overdue_invoices", as_of="2024-06-01")
+        jobs.enqueue("delete_client", user=self.user, pk=self.globex.pk, chunk_size=1)
+        jobs.enqueue("delete_client", user=self.user, pk=0)
+
+        out = StringIO()
+        call_command("run_worker", "--concurrency", "2", "--once", stdout=out)
+        self.assertIn("Ran 3 job(s).", out.getvalue())
+        self.assertEqual(
+            list(Job.objects.values_list("status", flat=True)), [Job.Status.SUCCEEDED] * 3
+        )
+        self.assertEqual(Job.objects.get(kind="mark_overdue_invoices").result["invoices"], 1)
+        self.assertEqual(list(Client.objects.values_list("name", flat=True)), ["Acme"])
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        [invoice] = response.context["invoices"]
+        self.assertEqual(invoice.payment_status, Invoice.PaymentStatus.OVERDUE)
+
+
+@override_settings(CRM_QUERY_BUDGETS_STRICT=True)
+class InvoiceNumberingTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="alice", password="pass1234")
+        acme = Client.objects.create(user=self.user, name="Acme", email="old@example.com")
+        self.project = Project.objects.create(user=self.user, client=acme, name="Site", amount=1)
+        self.prefix = f"INV-{self.user.pk}-"
+
+    def test_blank_numbers_come_from_the_users_sequence(self):
+        self.client.force_login(self.user)
+        data = {"number": "", "project": self.project.pk, "amount": "10", "payment_status": "pending"}
+        data["issue_date"] = "2024-01-01"
+        self.client.post(reverse("invoice-create"), data)
+        # Typed by hand, so the sequence steps over it.
+        Invoice.objects.create(number=f"{self.prefix}00002", project=self.project, amount=1)
+        self.client.post(reverse("invoice-create"), data)
+        self.assertEqual(
+            sorted(Invoice.objects.values_list("number", flat=True)),
+            [f"{self.prefix}00001", f"{self.prefix}00002", f"{self.prefix}00003"],
+        )
+        self.assertEqual(InvoiceSequence.objects.get(user=self.user).last_number, 3)
+
+    def test_rolled_back_numbers_are_reused(self):
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                next_invoice_numbers(self.user.pk, 5)
+                raise ValueError
+        self.assertEqual(
+            next_invoice_numbers(self.user.pk, 2), [f"{self.prefix}00001", f"{self.prefix}00002"]
+        )
+
+    def test_custom_prefix_and_format(self):
+        next_invoice_number(self.user.pk)
+        InvoiceSequence.objects.filter(user=self.user).update(
+            prefix="ACME/", number_format="{prefix}{number:04d}"
+        )
+        self.assertEqual(next_invoice_number(self.user.pk), "ACME/0002")
+        for bad in ("{prefix}", "{prefix}{nope}", "{number"):
+            with self.assertRaises(ValidationError):
+                validate_number_format(bad)
+
+    def test_import_reserves_a_block_for_blank_numbers(self):
+        report = import_csv(
+            "invoices",
+            self.user,
+            StringIO(
+                "number,client_email,project,amount,payment_status,issue_date,due_date\n"
+                ",old@example.com,Site,1,,,\n"
+                "MANUAL,old@example.com,Site,1,,,\n"
+                ",old@example.com,Site,1,,,\n"
+            ),
+        )
+        self.assertEqual(report.created, 3)
+        self.assertEqual(
+            sorted(Invoice.objects.values_list("number", flat=True)),
+            [f"{self.prefix}00001", f"{self.prefix}00002", "MANUAL"],
+        )
+
+
+class InvoiceNumberingStressTests(TransactionTestCase):
+    """
+    Concurrent writers on a database file in WAL mode: the in-memory test
+    database cannot make a writer wait for another's lock.
+    """
+
+    ALIAS = "numbering_stress"
+    THREADS = 8
+    ROUNDS = 25
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        connections.settings[self.ALIAS] = {
+            **connections.settings[DEFAULT_DB_ALIAS],
+            "NAME": os.path.join(directory.name, "stress.sqlite3"),
+        }
+        self.addCleanup(connections.settings.pop, self.ALIAS)
+        self.addCleanup(connections[self.ALIAS].close)
+        pragmas = override_settings(CRM_SQLITE_PRAGMAS={"journal_mode": "WAL", "busy_timeout": 30_000})
+        pragmas.enable()
+        self.addCleanup(pragmas.disable)
+        call_command("migrate", database=self.ALIAS, verbosity=0)
+        self.user = get_user_model().objects.db_manager(self.ALIAS).create_user(username="alice")
+
+    def writer(self, worker, committed, errors):
+        rng = random.Random(worker)
+        try:
+            for _ in range(self.ROUNDS):
+                try:
+                    with transaction.atomic(using=self.ALIAS):
+                        numbers = next_invoice_numbers(
+                            self.user.pk, rng.choice([1, 1, 4]), using=self.ALIAS
+                        )
+                        if rng.random() < 0.2:
+                            raise ValueError("roll back")
+                except ValueError:
+                    continue
+                committed.extend(numbers)
+        except Exception as error:
+            errors.append(error)
+        finally:
+            connections[self.ALIAS].close()
+
+    def test_concurrent_writers_get_gap_free_unique_numbers(self):
+        with connections[self.ALIAS].cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            self.assertEqual(cursor.fetchone()[0], "wal")
+        committed, errors = [], []
+        threads = [
+            threading.Thread(target=self.writer, args=(worker, committed, errors))
+            for worker in range(self.THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        prefix = f"INV-{self.user.pk}-"
+        self.assertEqual(errors, [])
+        self.assertGreater(len(committed), self.THREADS * self.ROUNDS // 2)
+        self.assertEqual(
+            sorted(committed), [f"{prefix}{value:05d}" for value in range(1, len(committed) + 1)]
+        )
+        sequence = InvoiceSequence.objects.using(self.ALIAS).get(user_id=self.user.pk)
+        self.assertEqual(sequence.last_number, len(committed))
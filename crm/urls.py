@@ -1,12 +1,39 @@
-from django.urls import path
+from django.conf import settings
+from django.urls import include, path
+
+from . import async_views, views
+
+
+def read_view(name):
+    """
+    The async implementation of a list or detail page when ``CRM_ASYNC_VIEWS``
+    is on (for ASGI deployments), otherwise the sync one.
+    """
+    if getattr(settings, "CRM_ASYNC_VIEWS", False):
+        return getattr(async_views, f"Async{name}").as_view()
+    return getattr(views, name).as_view()
 
-from . import views
 
 urlpatterns = [
-    path("", views.HomeRedirectView.as_view(), name="home"),
-    path("clients/", views.ClientListView.as_view(), name="client-list"),
+    path("", views.DashboardView.as_view(), name="home"),
+    path("clients/", read_view("ClientListView"), name="client-list"),
     path("clients/create/", views.ClientCreateView.as_view(), name="client-create"),
-    path("clients/<int:pk>/", views.ClientDetailView.as_view(), name="client-detail"),
+    path("clients/<int:pk>/", read_view("ClientDetailView"), name="client-detail"),
+    path(
+        "clients/<int:pk>/projects/",
+        views.ClientProjectsView.as_view(),
+        name="client-projects",
+    ),
+    path(
+        "clients/<int:pk>/invoices/",
+        views.ClientInvoicesView.as_view(),
+        name="client-invoices",
+    ),
+    path(
+        "clients/<int:pk>/logs/",
+        views.ClientContactLogsView.as_view(),
+        name="client-contact-logs",
+    ),
     path("clients/<int:pk>/edit/", views.ClientUpdateView.as_view(), name="client-update"),
     path("clients/<int:pk>/delete/", views.ClientDeleteView.as_view(), name="client-delete"),
     path(
@@ -14,14 +41,24 @@ urlpatterns = [
         views.ContactLogCreateView.as_view(),
         name="contactlog-create",
     ),
-    path("projects/", views.ProjectListView.as_view(), name="project-list"),
+    path("projects/", read_view("ProjectListView"), name="project-list"),
+    path("projects/bulk/", views.ProjectBulkView.as_view(), name="project-bulk"),
     path("projects/create/", views.ProjectCreateView.as_view(), name="project-create"),
-    path("projects/<int:pk>/", views.ProjectDetailView.as_view(), name="project-detail"),
+    path("projects/<int:pk>/", read_view("ProjectDetailView"), name="project-detail"),
     path("projects/<int:pk>/edit/", views.ProjectUpdateView.as_view(), name="project-update"),
     path("projects/<int:pk>/delete/", views.ProjectDeleteView.as_view(), name="project-delete"),
-    path("invoices/", views.InvoiceListView.as_view(), name="invoice-list"),
+    path("invoices/", read_view("InvoiceListView"), name="invoice-list"),
+    path("invoices/bulk/", views.InvoiceBulkView.as_view(), name="invoice-bulk"),
     path("invoices/create/", views.InvoiceCreateView.as_view(), name="invoice-create"),
-    path("invoices/<int:pk>/", views.InvoiceDetailView.as_view(), name="invoice-detail"),
+    path("invoices/<int:pk>/", read_view("InvoiceDetailView"), name="invoice-detail"),
     path("invoices/<int:pk>/edit/", views.InvoiceUpdateView.as_view(), name="invoice-update"),
     path("invoices/<int:pk>/delete/", views.InvoiceDeleteView.as_view(), name="invoice-delete"),
+    path("reports/", views.ReportView.as_view(), name="reports"),
+    path("search/", views.SearchView.as_view(), name="search"),
+    path("export/<str:kind>/", views.ExportView.as_view(), name="export"),
+    path("import/", views.ImportView.as_view(), name="import"),
+    path("jobs/", views.JobListView.as_view(), name="job-list"),
+    path("jobs/<int:pk>/download/", views.JobDownloadView.as_view(), name="job-download"),
+    path("stats/", views.RequestStatsView.as_view(), name="request-stats"),
+    path("api/", include("crm.api_urls")),
 ]
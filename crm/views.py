@@ -1,48 +1,108 @@
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Count, Q
+from django.shortcuts import get_object_or_404, redirect
+from django.core.exceptions import PermissionDenied
+from django.db.models.functions import Coalesce
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
 from django.urls import reverse, reverse_lazy
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
 from django.views.generic import (
     CreateView,
     DeleteView,
     DetailView,
     ListView,
-    RedirectView,
+    FormView,
+    TemplateView,
     UpdateView,
+    View,
 )
 
-from .forms import ClientForm, ContactLogForm, InvoiceForm, ProjectForm
-from .models import Client, ContactLog, Invoice, Project
+from . import jobs, reports, search
+from .bulk import (
+    INVOICE_ACTIONS,
+    PROJECT_ACTIONS,
+    delete_client,
+    delete_project,
+    more_than_a_chunk,
+)
+from .cache import cached_for_user
+from .conditional import ConditionalGetMixin
+from .exports import EXPORTS, FORMATS, export_lines
+from .filters import filter_clients, filter_invoices, filter_projects
+from .forms import (
+    BulkActionForm,
+    ClientForm,
+    ContactLogForm,
+    ImportForm,
+    InvoiceForm,
+    ProjectForm,
+)
+from .instrumentation import registry
+from .models import Client, ContactLog, Invoice, Job, Project
+from .pagination import KeysetPaginationMixin
+from .routers import ReplicaReadMixin
+
+
+class DashboardView(LoginRequiredMixin, ConditionalGetMixin, TemplateView):
+    template_name = "crm/dashboard.html"
+
+    def get_etag_parts(self):
+        # Overdue totals and the revenue window move with the date.
+        return [timezone.localdate()]
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        user = self.request.user
+        dashboard = cached_for_user(
+            user.pk, "dashboard", lambda: reports.dashboard(user), timezone.localdate()
+        )
+        context.update(dashboard)
+        return context
+
+
+class ReportView(LoginRequiredMixin, ConditionalGetMixin, ReplicaReadMixin, TemplateView):
+    """
+    The accounting report, read from the monthly snapshots; refreshing them
+    touches each affected user's change token, so the validators follow.
+    """
 
+    template_name = "crm/reports.html"
 
-class HomeRedirectView(LoginRequiredMixin, RedirectView):
-    pattern_name = "client-list"
+    def get_etag_parts(self):
+        # Without a year, the report covers the twelve months up to today.
+        return [self.request.get_full_path(), timezone.localdate()]
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update(reports.accounting_report(self.request.user, self.request.GET))
+        context["year"] = self.request.GET.get("year", "")
+        return context
 
-class ClientListView(LoginRequiredMixin, ListView):
+
+class ClientListView(
+    LoginRequiredMixin, ConditionalGetMixin, ReplicaReadMixin, KeysetPaginationMixin, ListView
+):
     model = Client
     template_name = "crm/client_list.html"
     context_object_name = "clients"
+    keyset_ordering = ("name", "pk")
 
     def get_queryset(self):
-        queryset = Client.objects.filter(user=self.request.user).prefetch_related(
-            "projects__invoices"
-        )
-        query = self.request.GET.get("q")
-        email = self.request.GET.get("email")
-        status = self.request.GET.get("status")
-        if query:
-            queryset = queryset.filter(
-                Q(name__icontains=query) | Q(company__icontains=query)
-            )
-        if email:
-            queryset = queryset.filter(email__icontains=email)
-        if status:
-            queryset = queryset.filter(projects__status=status)
+        queryset = filter_clients(Client.objects.filter(user=self.request.user), self.request.GET)
         return queryset.annotate(
-            project_count=Count("projects", distinct=True),
-            invoice_count=Count("projects__invoices", distinct=True),
-        ).order_by("name")
+            project_count=Coalesce("summary__project_count", 0),
+            invoice_count=Coalesce("summary__invoice_count", 0),
+        )
+
+    def paginate_queryset(self, queryset, page_size):
+        return cached_for_user(
+            self.request.user.pk,
+            "client-list",
+            lambda: super(ClientListView, self).paginate_queryset(queryset, page_size),
+            self.request.GET.urlencode(),
+            page_size,
+        )
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -55,30 +115,98 @@ class ClientListView(LoginRequiredMixin, ListView):
         return context
 
 
-class ClientDetailView(LoginRequiredMixin, DetailView):
+class ClientDetailView(LoginRequiredMixin, ConditionalGetMixin, ReplicaReadMixin, DetailView):
     model = Client
     template_name = "crm/client_detail.html"
     context_object_name = "client"
 
     def get_queryset(self):
-        return Client.objects.filter(user=self.request.user)
+        return Client.objects.filter(user=self.request.user).select_related("summary")
+
+
+class ClientSectionView(
+    LoginRequiredMixin, ConditionalGetMixin, ReplicaReadMixin, KeysetPaginationMixin, ListView
+):
+    """
+    One paginated section of the client detail page.
+
+    ``client_detail.html`` loads each section into the page with an
+    ``X-Fragment`` request, which gets just the section markup; opening the
+    URL directly renders it as a standalone page.
+    """
+
+    paginate_by = 10
+    url_name = None
+    fragment_template = None
+    section_title = None
+
+    def get_etag_parts(self):
+        return [self.request.get_full_path(), self.request.headers.get("X-Fragment", "")]
+
+    def get(self, request, *args, **kwargs):
+        # As on the detail page: someone else's client is not found, rather
+        # than shown with empty sections.
+        if not Client.objects.filter(user=request.user, pk=self.kwargs["pk"]).exists():
+            raise Http404("No client found matching the query.")
+        return super().get(request, *args, **kwargs)
+
+    def get_template_names(self):
+        if self.request.headers.get("X-Fragment"):
+            return [self.fragment_template]
+        return ["crm/client_section.html"]
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        client = self.object
-        context["projects"] = client.projects.filter(user=self.request.user).prefetch_related(
-            "invoices"
-        )
-        context["invoices"] = Invoice.objects.filter(
-            project__client=client, project__user=self.request.user
+        context["client_pk"] = self.kwargs["pk"]
+        context["page_url"] = reverse(self.url_name, args=[self.kwargs["pk"]])
+        context["fragment_template"] = self.fragment_template
+        context["section_title"] = self.section_title
+        return context
+
+    def render_to_response(self, context, **response_kwargs):
+        response = super().render_to_response(context, **response_kwargs)
+        patch_vary_headers(response, ["X-Fragment"])
+        return response
+
+
+class ClientProjectsView(ClientSectionView):
+    url_name = "client-projects"
+    context_object_name = "projects"
+    fragment_template = "crm/_client_projects.html"
+    section_title = "Projects"
+    keyset_ordering = ("-created_at", "-pk")
+
+    def get_queryset(self):
+        return Project.objects.filter(user=self.request.user, client_id=self.kwargs["pk"])
+
+
+class ClientInvoicesView(ClientSectionView):
+    url_name = "client-invoices"
+    context_object_name = "invoices"
+    fragment_template = "crm/_client_invoices.html"
+    section_title = "Invoices"
+    keyset_ordering = ("-issue_date", "-pk")
+
+    def get_queryset(self):
+        # An IN over the client's projects instead of a join keeps SQLite on
+        # the (user, issue_date) index without a join lookup per scanned row.
+        projects = Project.objects.filter(client_id=self.kwargs["pk"]).values("pk")
+        return Invoice.objects.filter(
+            user=self.request.user, project_id__in=projects
         ).select_related("project")
-        context["contact_logs"] = ContactLog.objects.filter(
-            client=client, user=self.request.user
+
+
+class ClientContactLogsView(ClientSectionView):
+    url_name = "client-contact-logs"
+    context_object_name = "contact_logs"
+    fragment_template = "crm/_client_contact_logs.html"
+    section_title = "Contact Log"
+    keyset_ordering = ("-contacted_at", "-pk")
+
+    def get_queryset(self):
+        return ContactLog.objects.filter(
+            user=self.request.user, client_id=self.kwargs["pk"]
         ).select_related("project")
-        context["contact_log_form"] = ContactLogForm(
-            user=self.request.user, initial={"client": client}
-        )
-        return context
 
 
 class ClientCreateView(LoginRequiredMixin, CreateView):
@@ -117,31 +245,84 @@ class ClientDeleteView(LoginRequiredMixin, DeleteView):
     def get_queryset(self):
         return Client.objects.filter(user=self.request.user)
 
-    def delete(self, request, *args, **kwargs):
-        messages.success(self.request, "Client deleted.")
-        return super().delete(request, *args, **kwargs)
+    def form_valid(self, form):
+        # Chunked, so a client with a long history never holds the write
+        # lock for the whole cascade; past one chunk of the rows it deletes
+        # it goes to the worker.
+        if more_than_a_chunk(
+            Invoice.objects.filter(project__client=self.object),
+            ContactLog.objects.filter(client=self.object),
+            Project.objects.filter(client=self.object),
+        ):
+            jobs.enqueue("delete_client", user=self.request.user, pk=self.object.pk)
+            messages.success(self.request, "Client queued for deletion.")
+        else:
+            delete_client(self.object)
+            messages.success(self.request, "Client deleted.")
+        return redirect(self.get_success_url())
+
+
+class BulkActionView(LoginRequiredMixin, FormView):
+    """
+    Apply one of ``actions`` to the rows ticked on a list page, or to every
+    row matching the list's filters, which the form passes on in its query
+    string. Each action is a set-based statement scoped to the user's rows.
+    """
+
+    http_method_names = ["post"]
+    form_class = BulkActionForm
+    model = None
+    filter_rows = None
+    actions = None
+    list_url_name = None
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs["actions"] = self.actions.values()
+        return kwargs
+
+    def get_success_url(self):
+        query = self.request.GET.urlencode()
+        return reverse(self.list_url_name) + (f"?{query}" if query else "")
+
+    def form_valid(self, form):
+        queryset = self.filter_rows(
+            self.model.objects.filter(user=self.request.user), self.request.GET
+        )
+        if not form.cleaned_data["select_all"]:
+            queryset = queryset.filter(pk__in=form.cleaned_data["ids"])
+        action = self.actions[form.cleaned_data["action"]]
+        count = action.apply(queryset)
+        messages.success(self.request, action.message.format(count=count))
+        return super().form_valid(form)
+
+    def form_invalid(self, form):
+        for error in form.errors.values():
+            messages.error(self.request, " ".join(error))
+        return redirect(self.get_success_url())
 
 
-class ProjectListView(LoginRequiredMixin, ListView):
+class ProjectListView(
+    LoginRequiredMixin, ConditionalGetMixin, ReplicaReadMixin, KeysetPaginationMixin, ListView
+):
     model = Project
     template_name = "crm/project_list.html"
     context_object_name = "projects"
+    keyset_ordering = ("-created_at", "-pk")
 
     def get_queryset(self):
         queryset = Project.objects.filter(user=self.request.user).select_related("client")
-        status = self.request.GET.get("status")
-        if status:
-            queryset = queryset.filter(status=status)
-        return queryset
+        return filter_projects(queryset, self.request.GET)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["statuses"] = Project.Status.choices
         context["selected_status"] = self.request.GET.get("status", "")
+        context["bulk_actions"] = PROJECT_ACTIONS.values()
         return context
 
 
-class ProjectDetailView(LoginRequiredMixin, DetailView):
+class ProjectDetailView(LoginRequiredMixin, ConditionalGetMixin, ReplicaReadMixin, DetailView):
     model = Project
     template_name = "crm/project_detail.html"
     context_object_name = "project"
@@ -205,39 +386,56 @@ class ProjectDeleteView(LoginRequiredMixin, DeleteView):
     def get_queryset(self):
         return Project.objects.filter(user=self.request.user)
 
-    def delete(self, request, *args, **kwargs):
-        messages.success(self.request, "Project deleted.")
-        return super().delete(request, *args, **kwargs)
+    def form_valid(self, form):
+        # Its invoices are deleted and its contact logs detached.
+        if more_than_a_chunk(
+            Invoice.objects.filter(project=self.object),
+            ContactLog.objects.filter(project=self.object),
+        ):
+            jobs.enqueue("delete_project", user=self.request.user, pk=self.object.pk)
+            messages.success(self.request, "Project queued for deletion.")
+        else:
+            delete_project(self.object)
+            messages.success(self.request, "Project deleted.")
+        return redirect(self.get_success_url())
+
+
+class ProjectBulkView(BulkActionView):
+    model = Project
+    filter_rows = staticmethod(filter_projects)
+    actions = PROJECT_ACTIONS
+    list_url_name = "project-list"
 
 
-class InvoiceListView(LoginRequiredMixin, ListView):
+class InvoiceListView(
+    LoginRequiredMixin, ConditionalGetMixin, ReplicaReadMixin, KeysetPaginationMixin, ListView
+):
     model = Invoice
     template_name = "crm/invoice_list.html"
     context_object_name = "invoices"
+    keyset_ordering = ("-issue_date", "-pk")
 
     def get_queryset(self):
-        queryset = Invoice.objects.filter(project__user=self.request.user).select_related(
+        queryset = Invoice.objects.filter(user=self.request.user).select_related(
             "project", "project__client"
         )
-        status = self.request.GET.get("payment_status")
-        if status:
-            queryset = queryset.filter(payment_status=status)
-        return queryset
+        return filter_invoices(queryset, self.request.GET)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["payment_statuses"] = Invoice.PaymentStatus.choices
         context["selected_status"] = self.request.GET.get("payment_status", "")
+        context["bulk_actions"] = INVOICE_ACTIONS.values()
         return context
 
 
-class InvoiceDetailView(LoginRequiredMixin, DetailView):
+class InvoiceDetailView(LoginRequiredMixin, ConditionalGetMixin, ReplicaReadMixin, DetailView):
     model = Invoice
     template_name = "crm/invoice_detail.html"
     context_object_name = "invoice"
 
     def get_queryset(self):
-        return Invoice.objects.filter(project__user=self.request.user).select_related(
+        return Invoice.objects.filter(user=self.request.user).select_related(
             "project", "project__client"
         )
 
@@ -256,7 +454,7 @@ class InvoiceCreateView(LoginRequiredMixin, CreateView):
 
     def form_valid(self, form):
         project = form.cleaned_data.get("project")
-        if project.user != self.request.user:
+        if project.user_id != self.request.user.pk:
             messages.error(self.request, "You cannot create invoices for this project.")
             form.add_error("project", "Select one of your projects.")
             return self.form_invalid(form)
@@ -273,7 +471,7 @@ class InvoiceUpdateView(LoginRequiredMixin, UpdateView):
     template_name = "crm/invoice_form.html"
 
     def get_queryset(self):
-        return Invoice.objects.filter(project__user=self.request.user)
+        return Invoice.objects.filter(user=self.request.user)
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
@@ -282,7 +480,7 @@ class InvoiceUpdateView(LoginRequiredMixin, UpdateView):
 
     def form_valid(self, form):
         project = form.cleaned_data.get("project")
-        if project.user != self.request.user:
+        if project.user_id != self.request.user.pk:
             messages.error(self.request, "You cannot move invoices to another user's project.")
             form.add_error("project", "Select one of your projects.")
             return self.form_invalid(form)
@@ -299,11 +497,18 @@ class InvoiceDeleteView(LoginRequiredMixin, DeleteView):
     success_url = reverse_lazy("invoice-list")
 
     def get_queryset(self):
-        return Invoice.objects.filter(project__user=self.request.user)
+        return Invoice.objects.filter(user=self.request.user)
 
-    def delete(self, request, *args, **kwargs):
+    def form_valid(self, form):
         messages.success(self.request, "Invoice deleted.")
-        return super().delete(request, *args, **kwargs)
+        return super().form_valid(form)
+
+
+class InvoiceBulkView(BulkActionView):
+    model = Invoice
+    filter_rows = staticmethod(filter_invoices)
+    actions = INVOICE_ACTIONS
+    list_url_name = "invoice-list"
 
 
 class ContactLogCreateView(LoginRequiredMixin, CreateView):
@@ -340,3 +545,111 @@ class ContactLogCreateView(LoginRequiredMixin, CreateView):
     def get_success_url(self):
         client_id = self.object.client.pk
         return reverse("client-detail", args=[client_id])
+
+
+class SearchView(LoginRequiredMixin, TemplateView):
+    template_name = "crm/search.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        query = self.request.GET.get("q", "").strip()
+        kind = self.request.GET.get("kind", "")
+        hits = []
+        if query:
+            hits = search.search(self.request.user, query, kinds=[kind] if kind else None)
+        context.update(
+            {
+                "query": query,
+                "kind": kind,
+                "kinds": [(name, name.replace("_", " ").title()) for name in search.DOCUMENTS],
+                "hits": hits,
+            }
+        )
+        return context
+
+
+class ExportView(LoginRequiredMixin, ReplicaReadMixin, View):
+    """
+    ``GET`` streams the export; ``POST`` (with the same query string) queues
+    it as a job and links the file from the jobs page when it is written.
+    """
+
+    def get_format(self, kind):
+        fmt = self.request.GET.get("format", "csv")
+        if kind not in EXPORTS or fmt not in FORMATS:
+            raise Http404("Unknown export.")
+        return fmt
+
+    def get(self, request, kind):
+        fmt = self.get_format(kind)
+        content_type, extension = FORMATS[fmt]
+        response = StreamingHttpResponse(
+            export_lines(kind, request.user, fmt, request.GET, using=self.read_db),
+            content_type=content_type,
+        )
+        response["Content-Disposition"] = f'attachment; filename="{kind}.{extension}"'
+        return response
+
+    def post(self, request, kind):
+        fmt = self.get_format(kind)
+        query = {name: value for name, value in request.GET.items() if name != "format"}
+        jobs.enqueue("export", user=request.user, kind=kind, fmt=fmt, query=query)
+        messages.success(request, "Export queued.")
+        return redirect("job-list")
+
+
+class ImportView(LoginRequiredMixin, FormView):
+    form_class = ImportForm
+    template_name = "crm/import_form.html"
+
+    def form_valid(self, form):
+        kind = form.cleaned_data["kind"]
+        jobs.enqueue(
+            "import",
+            user=self.request.user,
+            # Running a half-finished import again would create its rows twice.
+            max_attempts=1,
+            kind=kind,
+            path=jobs.save_upload(form.cleaned_data["file"]),
+        )
+        messages.success(self.request, f"Import of {kind} queued.")
+        return redirect("job-list")
+
+
+class JobListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
+    """
+    The user's background jobs, newest first, with their progress and results.
+    """
+
+    model = Job
+    template_name = "crm/job_list.html"
+    context_object_name = "jobs"
+    keyset_ordering = ("-created_at", "-pk")
+
+    def get_queryset(self):
+        return Job.objects.filter(user=self.request.user)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["in_progress"] = any(not job.finished for job in context["jobs"])
+        return context
+
+
+class JobDownloadView(LoginRequiredMixin, View):
+    def get(self, request, pk):
+        job = get_object_or_404(
+            Job, pk=pk, user=request.user, kind="export", status=Job.Status.SUCCEEDED
+        )
+        if "path" not in job.result:
+            raise Http404("The export file has expired.")
+        path = jobs.files_dir() / job.result["path"]
+        if not path.exists():
+            raise Http404("The export file is gone.")
+        return FileResponse(open(path, "rb"), as_attachment=True, filename=job.result["filename"])
+
+
+class RequestStatsView(LoginRequiredMixin, View):
+    def get(self, request):
+        if not request.user.is_staff:
+            raise PermissionDenied
+        return JsonResponse(registry.snapshot())
@@ -0,0 +1,27 @@
+"""
+Entry points for the spawned processes of ``crm.jobs.work``.
+
+A spawned process imports this module to find the function it was sent,
+before any pool initializer runs, so it must not import models at the top:
+Django is set up first and ``crm.jobs`` imported inside the functions.
+"""
+
+import django
+from django.db import connections
+
+
+def start(databases):
+    # Spawned, not forked: each process sets Django up and opens its own
+    # connections instead of sharing the parent's, to the same databases.
+    django.setup()
+    for alias, name in databases.items():
+        connections[alias].settings_dict["NAME"] = name
+
+
+def run(job_id):
+    from .jobs import run_job
+
+    try:
+        return run_job(job_id)
+    finally:
+        connections.close_all()
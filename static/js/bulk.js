@@ -0,0 +1,19 @@
+// Bulk-action forms on the list pages: the header checkbox ticks every row
+// on the page, and deletes ask for confirmation before submitting.
+(function () {
+    document.querySelectorAll("form[data-bulk]").forEach(function (form) {
+        var toggle = form.querySelector("[data-select-page]");
+        if (toggle) {
+            toggle.addEventListener("change", function () {
+                form.querySelectorAll('input[name="ids"]').forEach(function (box) {
+                    box.checked = toggle.checked;
+                });
+            });
+        }
+        form.addEventListener("submit", function (event) {
+            if (form.elements.action.value === "delete" && !window.confirm("Delete the selected rows?")) {
+                event.preventDefault();
+            }
+        });
+    });
+})();
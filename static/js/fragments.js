@@ -0,0 +1,36 @@
+// Load the sections marked with data-fragment after the page renders (unless
+// the server already rendered them, marked data-loaded), and keep their
+// pagination links inside the section.
+(function () {
+    function load(container, url) {
+        fetch(url, { headers: { "X-Fragment": "1" }, credentials: "same-origin" })
+            .then(function (response) {
+                if (!response.ok) {
+                    throw new Error(response.statusText);
+                }
+                return response.text();
+            })
+            .then(function (html) {
+                container.innerHTML = html;
+                container.dataset.fragment = url;
+            })
+            .catch(function () {
+                container.classList.add("fragment-error");
+            });
+    }
+
+    document.querySelectorAll("[data-fragment]").forEach(function (container) {
+        container.addEventListener("click", function (event) {
+            var link = event.target.closest(".pagination a");
+            if (!link) {
+                return;
+            }
+            event.preventDefault();
+            var base = new URL(container.dataset.fragment, window.location.href);
+            load(container, new URL(link.getAttribute("href"), base).href);
+        });
+        if (!container.hasAttribute("data-loaded")) {
+            load(container, new URL(container.dataset.fragment, window.location.href).href);
+        }
+    });
+})();